@@ -1,16 +1,18 @@
 # agent initialization
 import json
 import asyncio
+from collections import Counter
 from typing import Literal, List
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
 from langchain.agents import create_agent
-from langchain_openai import ChatOpenAI
+from langchain.agents.structured_output import ToolStrategy
 from langchain_core.messages import HumanMessage
-from langchain_mcp_adapters.client import MultiServerMCPClient
-from src.observability import get_langfuse_handler
+from src.observability import get_callbacks
 
-from src.config import OPENAI_API_KEY, SILICON_FLOW_BASE_URL, JINA_API_KEY
-from src.agents.tools import search_knowledge_base
+from src.models import get_chat_model
+from src.agents.tools import search_knowledge_base, prefetch_knowledge_base
+from src.agents.mcp_tools import get_web_tools, web_tool_cache_stats
+from src.agents.json_repair import repair_json
 
 # --- Schemas ---
 class FactEvaluation(BaseModel):
@@ -31,6 +33,8 @@ TOOL USAGE RULES
 ====================
 
 1. You MUST call `search_knowledge_base` exactly ONCE as your first step.
+   If the message already contains "Knowledge base results", those ARE the result of that call:
+   do NOT call `search_knowledge_base` again and continue with step 2.
 2. After reviewing the retrieved content:
    - If the content clearly SUPPORTS the statement → verdict = "correct"
    - If the content clearly CONTRADICTS the statement → verdict = "wrong"
@@ -54,7 +58,8 @@ DEFINITIONS
 OUTPUT FORMAT
 ====================
 
-Return ONLY a valid JSON object that strictly matches this schema:
+Return your final answer through the `FactEvaluation` structured output tool.
+If you cannot call it, return ONLY a valid JSON object that strictly matches this schema:
 
 {FactEvaluation.model_json_schema()}
 
@@ -72,96 +77,122 @@ SOURCE DOCUMENT RULES
 Do NOT include markdown, explanations outside JSON, or multiple sources.
 """
 
+# How a fact's final answer can be obtained, from cheapest to most expensive
+PARSE_PATHS = ("structured", "repaired", "llm_reparse", "failed")
+
+def _parse_locally(content) -> FactEvaluation | None:
+    data = repair_json(content if isinstance(content, str) else json.dumps(content))
+    if data is None:
+        return None
+    try:
+        return FactEvaluation.model_validate(data)
+    except ValidationError:
+        return None
+
 # --- Agent Runner ---
-async def check_facts(facts_list: List[dict]):
+async def check_facts(facts_list: List[dict], stats: dict = None):
     """
-    Async function to run the agent over a list of facts.
+    Async function to run the agent over a list of facts. If `stats` is
+    given, it receives how many answers were parsed by each path
+    ("structured", "repaired", "llm_reparse" or "failed").
     """
-    # 2. Setup Client pointing to the REMOTE Jina server
-    # Note: We filter for 'search' and 'read' tags to save tokens
-    client = MultiServerMCPClient({
-        "jina": {
-            "transport": "streamable_http",
-            "url": "https://mcp.jina.ai/v1?include_tags=search,read",
-            "headers": {
-                "Authorization": f"Bearer {JINA_API_KEY}"
-            }
-        }
-    })
-
+    # 1. Retrieve the web search and read tools from the MCP server.
+    # The session is shared for the life of the event loop and tool
+    # results are cached on disk (see src/agents/mcp_tools.py)
+    print("Connecting to MCP tools...")
+    mcp_tools = await get_web_tools()
+    all_tools = [search_knowledge_base] + mcp_tools
+
+    # 2. Initialize your LLM
+    llm_model = get_chat_model(
+        temperature=0.2,
+        max_tokens=800,
+        # 429s are retried with backoff by the shared provider limiter
+        request_timeout=60
+    )
+
+    # 3. Create the agent (it returns a validated FactEvaluation directly)
+    agent = create_agent(
+        tools=all_tools,    
+        system_prompt=SYSTEM_PROMPT,
+        model=llm_model,
+        response_format=ToolStrategy(FactEvaluation),
+        name = "FactCheckerAgent",
+    )
+
+    callbacks = get_callbacks()
+
+    # How each fact's final answer was obtained in this call: "structured"
+    # (agent output), "repaired" (local JSON repair), "llm_reparse" (extra
+    # LLM call) or "failed". Local, so concurrent essays keep separate counts
+    parse_stats = Counter({path: 0 for path in PARSE_PATHS})
+
+    # 4. Pre-retrieve knowledge base context for every fact in one batch,
+    # so the agent can skip its `search_knowledge_base` round trip
+    statements = [fact["statement"] for fact in facts_list]
     try:
-        # 1. Retrieve the web search and read tools from the MCP server
-        print("Connecting to MCP tools...")
-        mcp_tools = await client.get_tools()
-        all_tools = [search_knowledge_base] + mcp_tools
-
-        # 2. Initialize your LLM
-        llm_model = ChatOpenAI(
-            model="deepseek-ai/DeepSeek-V3",
-            openai_api_key=OPENAI_API_KEY,
-            openai_api_base=SILICON_FLOW_BASE_URL, 
-            temperature=0.2,
-            max_tokens=800,
-            max_retries=10,  # <--- CRITICAL FIX: Retries aggressively on 429
-            request_timeout=60
-        )   
-
-        # 3. Create the agent
-        agent = create_agent(
-            tools=all_tools,    
-            system_prompt=SYSTEM_PROMPT,
-            model=llm_model,
-            name = "FactCheckerAgent",
-        )
-
-        callback = get_langfuse_handler()
-
-        # 5. Define Semaphore for Concurrency Control
-        # Allows only 3 facts to be processed at the same time
-        semaphore = asyncio.Semaphore(3)
-
-        async def process_single_fact(i: int, fact_data: dict):
-            """Helper function to process one fact under semaphore protection."""
-            statement = fact_data["statement"]
+        kb_contexts = await asyncio.to_thread(prefetch_knowledge_base, statements)
+    except Exception as e:
+        print(f"Knowledge base pre-retrieval failed, agents will search themselves: {e}")
+        kb_contexts = [None] * len(statements)
+
+    async def process_single_fact(i: int, fact_data: dict):
+        """Helper function to process one fact."""
+        statement = fact_data["statement"]
+        message = f"Evaluate this fact: {statement}"
+        if kb_contexts[i] is not None:
+            message += f"\n\nKnowledge base results (already retrieved with `search_knowledge_base`):\n{kb_contexts[i]}"
+        
+        try:
+            # Invoke agent
+            inputs = {"messages": [HumanMessage(content=message)]}
+            
+            response = await agent.ainvoke(
+                inputs, 
+                config={
+                    "callbacks": callbacks,
+                    "metadata": {"langfuse_tags": ["agentic-fact-checker"]}
+                }
+            )
             
-            async with semaphore:
-                try:
-                    # Invoke agent
-                    inputs = {"messages": [HumanMessage(content=f"Evaluate this fact: {statement}")]}
-                    
-                    response = await agent.ainvoke(
-                        inputs, 
-                        config={
-                            "callbacks": [callback],
-                            "metadata": {"langfuse_tags": ["agentic-fact-checker"]}
-                        }
-                    )
-                    
-                    # Parse structure
+            # Structured output first, then local JSON repair, and only
+            # as a last resort one more LLM call to re-parse the answer
+            final_eval = response.get("structured_response")
+            parse_path = "structured"
+            if final_eval is None:
+                content = response["messages"][-1].content
+                final_eval = _parse_locally(content)
+                parse_path = "repaired"
+                if final_eval is None:
+                    parse_path = "llm_reparse"
                     structured_llm = llm_model.with_structured_output(FactEvaluation)
-                    final_eval = await structured_llm.ainvoke(response["messages"][-1].content)
-                    
-                    print(f"Validated fact {i+1}: {final_eval.correctness_score}")
-                    return final_eval.model_dump()
-                    
-                except Exception as e:
-                    print(f"Error validating fact {i+1}: {e}")
-                    # Return a safe fallback so the whole batch doesn't crash
-                    return {
-                        "statement": statement,
-                        "correctness_score": "undetermined",
-                        "summary_description": f"Error during validation: {str(e)}",
-                        "source_document": ""
-                    }
-
-        # 6. Run tasks in parallel (controlled)
-        print(f"Starting fact check for {len(facts_list)} facts...")
-        
-        tasks = [process_single_fact(i, fact) for i, fact in enumerate(facts_list)]
-        results = await asyncio.gather(*tasks)
+                    final_eval = await structured_llm.ainvoke(content, config={"callbacks": callbacks})
+            parse_stats[parse_path] += 1
+            
+            print(f"Validated fact {i+1}: {final_eval.correctness_score}")
+            return final_eval.model_dump()
+            
+        except Exception as e:
+            parse_stats["failed"] += 1
+            print(f"Error validating fact {i+1}: {e}")
+            # Return a safe fallback so the whole batch doesn't crash
+            return {
+                "statement": statement,
+                "correctness_score": "undetermined",
+                "summary_description": f"Error during validation: {str(e)}",
+                "source_document": ""
+            }
 
-        return results
-        
-    finally:
-        # cleanup if needed, MultiServerMCPClient manages context usually
-        pass
\ No newline at end of file
+    # 6. Run tasks in parallel (paced by the shared provider limiter)
+    print(f"Starting fact check for {len(facts_list)} facts...")
+    tasks = [process_single_fact(i, fact) for i, fact in enumerate(facts_list)]
+    results = await asyncio.gather(*tasks)
+
+    print("📊 Fact output parsing: " + ", ".join(f"{path}={parse_stats[path]}" for path in PARSE_PATHS))
+    if stats is not None:
+        stats.update(parse_stats)
+    web_stats = web_tool_cache_stats()
+    if web_stats:
+        print(f"🌐 Web tool cache: {web_stats['hits']} hits / {web_stats['misses']} misses")
+
+    return results
\ No newline at end of file
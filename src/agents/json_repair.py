@@ -0,0 +1,82 @@
+# Local repair of almost-valid JSON emitted by LLMs
+import json
+import re
+from typing import Optional
+
+# Quote characters that may open a string, and the ones that may close it
+DOUBLE_QUOTES = {'"': '"', "“": "”“", "”": "”“"}
+SINGLE_QUOTES = {"'": "'", "‘": "’‘", "’": "’‘"}
+
+def _fix_code(code: str, single_quoted: bool) -> str:
+    # Applied to the text between string literals only
+    if not single_quoted:
+        code = code.replace("‘", "'").replace("’", "'")
+    code = re.sub(r",(\s*)([}\]])", r"\1\2", code)  # trailing commas
+    code = re.sub(r"\bTrue\b", "true", code)
+    code = re.sub(r"\bFalse\b", "false", code)
+    return re.sub(r"\bNone\b", "null", code)
+
+def _repair(body: str, single_quoted: bool = False) -> str:
+    """
+    Rewrites `body` outside its string literals (so the values are kept
+    as they are) and turns smart-quoted strings, and single-quoted ones
+    if `single_quoted`, into plain JSON strings.
+    """
+    openers = {**DOUBLE_QUOTES, **(SINGLE_QUOTES if single_quoted else {})}
+    out, code = [], []
+    i = 0
+    while i < len(body):
+        char = body[i]
+        if char not in openers:
+            code.append(char)
+            i += 1
+            continue
+
+        out.append(_fix_code("".join(code), single_quoted))
+        code = []
+        closers = openers[char]
+        text = []
+        i += 1
+        while i < len(body) and body[i] not in closers:
+            if body[i] == "\\" and i + 1 < len(body):
+                # \' is valid in Python strings but not in JSON
+                text.append("'" if body[i + 1] == "'" else body[i:i + 2])
+                i += 2
+                continue
+            # A plain double quote inside a string opened by another quote character
+            text.append('\\"' if body[i] == '"' else body[i])
+            i += 1
+        out.append('"' + "".join(text) + '"')
+        i += 1
+    out.append(_fix_code("".join(code), single_quoted))
+    return "".join(out)
+
+def _candidates(text: str):
+    # Strip markdown code fences and surrounding prose
+    text = re.sub(r"```(?:json)?", "", text).strip()
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        return
+    body = text[start:end + 1]
+    yield body
+
+    yield _repair(body)
+
+    if '"' not in body:
+        # Python-style dict with single quotes
+        yield _repair(body, single_quoted=True)
+
+def repair_json(text: str) -> Optional[dict]:
+    """
+    Extracts a JSON object from LLM output, fixing common issues (code
+    fences, prose around the object, smart quotes, trailing commas, Python
+    literals) outside string values. Returns None if nothing parseable is found.
+    """
+    for candidate in _candidates(text or ""):
+        try:
+            parsed = json.loads(candidate, strict=False)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(parsed, dict):
+            return parsed
+    return None
@@ -0,0 +1,189 @@
+# Process-lifetime Jina MCP session with cached web search / page read tools
+import asyncio
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import weakref
+from contextlib import AsyncExitStack
+from typing import List, Optional
+from urllib.parse import urlsplit, urlunsplit
+from langchain_core.tools import BaseTool
+from langchain_mcp_adapters.client import MultiServerMCPClient
+from langchain_mcp_adapters.tools import load_mcp_tools
+from mcp.types import CallToolResult
+from src.config import JINA_API_KEY, JINA_MCP_URL, WEB_TOOL_CACHE_PATH, WEB_TOOL_CACHE_TTL_HOURS
+
+class WebToolCache:
+    """
+    Results of MCP tool calls stored in a single SQLite file. Entries are
+    keyed by tool name and normalized arguments and expire after `ttl_s`.
+    """
+
+    def __init__(self, path, ttl_s: float):
+        self.path = path
+        self.ttl_s = ttl_s
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS web_tool_cache ("
+            "key TEXT PRIMARY KEY, tool TEXT NOT NULL, value TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM web_tool_cache WHERE key = ? AND created_at > ?",
+                (key, time.time() - self.ttl_s),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return row[0]
+
+    def put(self, key: str, tool: str, value: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO web_tool_cache (key, tool, value, created_at) VALUES (?, ?, ?, ?)",
+                (key, tool, value, time.time()),
+            )
+            # Drop expired entries while we are writing anyway
+            self._conn.execute("DELETE FROM web_tool_cache WHERE created_at <= ?", (time.time() - self.ttl_s,))
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM web_tool_cache").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_web_tool_cache() -> Optional[WebToolCache]:
+    """
+    Returns the shared web tool cache, or None when WEB_TOOL_CACHE_TTL_HOURS is 0.
+    """
+    global _cache
+    if WEB_TOOL_CACHE_TTL_HOURS <= 0:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = WebToolCache(WEB_TOOL_CACHE_PATH, WEB_TOOL_CACHE_TTL_HOURS * 3600)
+    return _cache
+
+def web_tool_cache_stats() -> dict:
+    """
+    Hit/miss counters of the shared cache (empty if it was never used).
+    """
+    return _cache.stats() if _cache is not None else {}
+
+# --- Cache keys ---
+def _normalize_url(url: str) -> str:
+    parts = urlsplit(url.strip())
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, parts.query, ""))
+
+def _normalize_argument(value):
+    if isinstance(value, str):
+        if re.match(r"https?://", value.strip(), re.IGNORECASE):
+            return _normalize_url(value)
+        return re.sub(r"\s+", " ", value).strip().lower()
+    if isinstance(value, list):
+        return [_normalize_argument(item) for item in value]
+    return value
+
+def cache_key(tool: str, arguments: dict) -> str:
+    """
+    Same search query (ignoring case and spacing) or same URL (ignoring
+    scheme/host case, trailing slash and fragment) gives the same key.
+    """
+    normalized = {name: _normalize_argument(value) for name, value in arguments.items()}
+    payload = json.dumps([tool, normalized], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+async def _cached_tool_call(request, handler):
+    # Tool interceptor: answers from the cache, or calls the server and
+    # stores successful results
+    cache = get_web_tool_cache()
+    if cache is None:
+        return await handler(request)
+    key = cache_key(request.name, request.args)
+    cached = await asyncio.to_thread(cache.get, key)
+    if cached is not None:
+        return CallToolResult.model_validate_json(cached)
+    result = await handler(request)
+    if isinstance(result, CallToolResult) and not result.isError:
+        await asyncio.to_thread(cache.put, key, request.name, result.model_dump_json())
+    return result
+
+# --- Session ---
+class _MCPSession:
+    """
+    One MCP session kept open by a background task of the event loop, so
+    every `check_facts` call on that loop reuses the connection and tools.
+    The task owns the AsyncExitStack because the transport's task groups
+    must be entered and exited by the same task.
+    """
+
+    def __init__(self):
+        loop = asyncio.get_running_loop()
+        self.tools = loop.create_future()
+        self._stop = asyncio.Event()
+        self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        headers = {"Authorization": f"Bearer {JINA_API_KEY}"} if JINA_API_KEY else None
+        client = MultiServerMCPClient({
+            "jina": {
+                "transport": "streamable_http",
+                "url": JINA_MCP_URL,
+                "headers": headers,
+            }
+        })
+        try:
+            async with AsyncExitStack() as stack:
+                session = await stack.enter_async_context(client.session("jina"))
+                tools = await load_mcp_tools(session, tool_interceptors=[_cached_tool_call], server_name="jina")
+                self.tools.set_result(tools)
+                await self._stop.wait()
+        except BaseException as e:
+            if not self.tools.done():
+                self.tools.set_exception(e if isinstance(e, Exception) else RuntimeError("MCP session cancelled"))
+            if not isinstance(e, Exception):
+                raise
+
+    async def close(self):
+        self._stop.set()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+_sessions = weakref.WeakKeyDictionary()
+
+async def get_web_tools() -> List[BaseTool]:
+    """
+    Returns the (cached) MCP web tools, connecting on the first call of the
+    running event loop. A failed connection is retried on the next call.
+    """
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None:
+        session = _sessions[loop] = _MCPSession()
+    try:
+        return await asyncio.shield(session.tools)
+    except Exception:
+        if _sessions.get(loop) is session:
+            del _sessions[loop]
+        raise
+
+async def close_web_tools():
+    """
+    Closes the MCP session of the running event loop, if any.
+    """
+    session = _sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None:
+        await session.close()
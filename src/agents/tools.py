@@ -1,14 +1,58 @@
 # Web search and crawler implementations for agents.
+import threading
+from typing import List
 from langchain.tools import tool
-from src.database.vector_ops import setup_knowledge_base
+from src.config import KB_TOP_K, KB_SCORE_THRESHOLD
 
-# Initialize retriever once
-retriever = setup_knowledge_base()
+# The retriever is created on first use (or by `warm`) rather than at
+# import time, so importing the pipeline never opens Chroma.
+_retriever = None
+_retriever_ready = False
+_retriever_lock = threading.Lock()
 
-@tool 
-def search_knowledge_base(query: str) -> str:
-    """Search the internal knowledge base of relevant essay documents."""
+def get_retriever():
+    """
+    Returns the knowledge-base retriever, building it on the first call.
+    Safe to call from several threads; the build only happens once.
+    """
+    global _retriever, _retriever_ready
+    if not _retriever_ready:
+        with _retriever_lock:
+            if not _retriever_ready:
+                from src.database.vector_ops import setup_knowledge_base
+                _retriever = setup_knowledge_base()
+                _retriever_ready = True
+    return _retriever
+
+def warm():
+    """
+    Builds the retriever ahead of its first query. Meant to be started in
+    a background thread while other stages run.
+    """
+    get_retriever()
+
+def _format_results(texts: List[str]) -> str:
+    from src.database.vector_ops import NO_RESULTS
+    return "\n\n".join(texts) if texts else NO_RESULTS
+
+@tool
+def search_knowledge_base(query: str, k: int = KB_TOP_K, score_threshold: float = KB_SCORE_THRESHOLD) -> str:
+    """
+    Search the internal knowledge base of relevant essay documents.
+    Returns the `k` best passages; raise `score_threshold` (0-1) to drop weak matches.
+    """
+    retriever = get_retriever()
     if not retriever:
         return "Knowledge base is empty."
-    docs = retriever.invoke(query)
-    return "\n\n".join([d.page_content for d in docs])
\ No newline at end of file
+    return _format_results(retriever.search(query, k, score_threshold))
+
+def prefetch_knowledge_base(queries: List[str], k: int = None, score_threshold: float = None) -> List[str]:
+    """
+    Runs `search_knowledge_base` for many queries at once: all queries are
+    embedded in one batched request and Chroma is queried in bulk.
+    Returns one result string per query, formatted like the tool's output.
+    """
+    retriever = get_retriever()
+    if not retriever:
+        return ["Knowledge base is empty."] * len(queries)
+    return [_format_results(texts) for texts in retriever.search_many(queries, k, score_threshold)]
@@ -0,0 +1,98 @@
+# Batch entry point: grades a directory of essays against a shared question and rubric
+import argparse
+import asyncio
+import time
+from datetime import datetime
+from pathlib import Path
+from src.config import (
+    QUESTION_PDF_PATH,
+    RUBRIC_PDF_PATH,
+    BATCH_OUTPUT_DIR,
+    MAX_CONCURRENT_ESSAYS,
+    MAX_CONCURRENT_LLM_REQUESTS,
+    COST_CURRENCY
+)
+from src.limits import configure_request_limiter
+from src.main import PipelinePaths, grade_essay, failed_stages
+
+# Written into an essay's output folder once every stage has succeeded
+DONE_MARKER = ".done"
+
+async def grade_directory(
+    essay_dir,
+    question_pdf=QUESTION_PDF_PATH,
+    rubric_pdf=RUBRIC_PDF_PATH,
+    output_dir=BATCH_OUTPUT_DIR,
+    max_concurrent_essays: int = MAX_CONCURRENT_ESSAYS,
+    max_llm_requests: int = MAX_CONCURRENT_LLM_REQUESTS,
+):
+    """
+    Grades every PDF in `essay_dir`, writing each essay's outputs to
+    `output_dir/<essay name>/`. Essays that already have a DONE_MARKER
+    are skipped, so an interrupted run can simply be restarted.
+    """
+    configure_request_limiter(max_llm_requests)
+    output_dir = Path(output_dir)
+
+    essays = sorted(Path(essay_dir).glob("*.pdf"))
+    pending = [essay for essay in essays if not (output_dir / essay.stem / DONE_MARKER).exists()]
+    print(f"📚 {len(essays)} essays found, {len(essays) - len(pending)} already graded, {len(pending)} to grade.")
+
+    semaphore = asyncio.Semaphore(max_concurrent_essays)
+    costs = []
+
+    async def grade_one(essay_pdf: Path) -> bool:
+        async with semaphore:
+            essay_output_dir = output_dir / essay_pdf.stem
+            essay_output_dir.mkdir(parents=True, exist_ok=True)
+            paths = PipelinePaths.for_output_dir(essay_pdf, question_pdf, rubric_pdf, essay_output_dir)
+            try:
+                results, timings = await grade_essay(paths)
+            except Exception as e:
+                print(f"❌ Error grading {essay_pdf.name}: {e}")
+                return False
+
+            # Left unmarked so a restarted batch retries it (successful stages are reused)
+            failed = failed_stages(results, timings)
+            if failed:
+                print(f"❌ Grading {essay_pdf.name} incomplete, failed stages: {', '.join(failed)}")
+                return False
+
+            costs.append(results["run_profile"].summary()["total"]["cost"])
+            (essay_output_dir / DONE_MARKER).write_text(datetime.now().isoformat(), encoding="utf-8")
+            print(f"✅ Graded {essay_pdf.name}")
+            return True
+
+    start = time.perf_counter()
+    outcomes = await asyncio.gather(*[grade_one(essay) for essay in pending])
+    elapsed = time.perf_counter() - start
+
+    graded = sum(outcomes)
+    throughput = graded / (elapsed / 60) if elapsed > 0 else 0.0
+    print(f"\n📊 Graded {graded}/{len(pending)} essays in {elapsed:.1f}s ({throughput:.2f} essays/min, "
+          f"estimated cost {sum(costs):.4f} {COST_CURRENCY})")
+    return {"graded": graded, "failed": len(pending) - graded, "skipped": len(essays) - len(pending),
+            "elapsed_s": round(elapsed, 3), "essays_per_minute": round(throughput, 3),
+            "cost": round(sum(costs), 6)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Grade a directory of essay PDFs.")
+    parser.add_argument("essay_dir", help="Directory containing the essay PDFs")
+    parser.add_argument("--question", default=QUESTION_PDF_PATH, help="Shared essay question PDF")
+    parser.add_argument("--rubric", default=RUBRIC_PDF_PATH, help="Shared rubric PDF")
+    parser.add_argument("--output-dir", default=BATCH_OUTPUT_DIR, help="Where per-essay folders are written")
+    parser.add_argument("--max-essays", type=int, default=MAX_CONCURRENT_ESSAYS, help="Essays graded at the same time")
+    parser.add_argument("--max-llm-requests", type=int, default=MAX_CONCURRENT_LLM_REQUESTS, help="Global cap on in-flight LLM requests")
+    args = parser.parse_args()
+
+    asyncio.run(grade_directory(
+        args.essay_dir,
+        question_pdf=args.question,
+        rubric_pdf=args.rubric,
+        output_dir=args.output_dir,
+        max_concurrent_essays=args.max_essays,
+        max_llm_requests=args.max_llm_requests,
+    ))
+
+if __name__ == "__main__":
+    main()
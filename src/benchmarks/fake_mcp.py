@@ -0,0 +1,61 @@
+# Local stand-in for the Jina MCP server (web search and page read tools)
+import argparse
+import hashlib
+from mcp.server.fastmcp import FastMCP
+from starlette.responses import JSONResponse
+from src.benchmarks.faults import Faults
+
+def build_server(host: str = "127.0.0.1", port: int = 8765, faults: Faults = None) -> FastMCP:
+    """
+    MCP server exposing `search_web` and `read_url` with deterministic
+    fake content, so the fact checker can run without network access.
+    `faults` adds latency and fails calls as rate limited.
+    Start it and set JINA_MCP_URL=http://<host>:<port>/mcp.
+    """
+    server = FastMCP("fake-jina", host=host, port=port)
+    faults = faults or Faults()
+
+    async def apply_faults(tool: str):
+        if await faults.apply(tool):
+            # Reported to the client as a failed tool call
+            raise RuntimeError("429 Too Many Requests (injected by the fake server)")
+
+    @server.custom_route("/stats", methods=["GET"])
+    async def stats(request):
+        return JSONResponse(dict(faults.stats))
+
+    @server.tool()
+    async def search_web(query: str, num: int = 5) -> str:
+        """Search the web and return result titles, URLs and snippets."""
+        await apply_faults("search_web")
+        digest = hashlib.sha256(query.encode("utf-8")).hexdigest()[:8]
+        return "\n\n".join(
+            f"[{i + 1}] Result {i + 1} for: {query}\nURL: https://example.com/{digest}/{i + 1}\n"
+            f"Snippet: This page discusses {query}."
+            for i in range(num)
+        )
+
+    @server.tool()
+    async def read_url(url: str) -> str:
+        """Read a web page and return its content as markdown."""
+        await apply_faults("read_url")
+        return f"# {url}\n\nFake page content for {url}."
+
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the Jina MCP server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every tool call")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random ± seconds around the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of tool calls failed as rate limited")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for jitter and failures")
+    args = parser.parse_args()
+
+    faults = Faults(args.latency, args.jitter, args.error_rate, args.seed)
+    print(f"Fake MCP server on http://{args.host}:{args.port}/mcp")
+    build_server(args.host, args.port, faults).run(transport="streamable-http")
+
+if __name__ == "__main__":
+    main()
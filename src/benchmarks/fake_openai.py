@@ -0,0 +1,254 @@
+# Local stand-in for the OpenAI-compatible SiliconFlow API (chat, structured output, embeddings)
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import math
+import random
+import re
+import struct
+import time
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+from src.benchmarks.faults import Faults
+
+# Tools the fake model calls before answering; every other tool is treated
+# as the structured output tool (e.g. the fact checker's FactEvaluation)
+ACTION_TOOLS = ("search_knowledge_base", "search_web", "read_url")
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+")
+
+def _count_tokens(text: str) -> int:
+    # ~4 characters per token, like the provider limiter's estimate
+    return max(1, len(text) // 4)
+
+def _message_text(message: dict) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content
+
+def _sentences(text: str) -> list:
+    sentences = [s.strip() for s in SENTENCE_PATTERN.split(text) if len(s.strip()) > 20]
+    return sentences or ["The essay makes a claim."]
+
+class _SchemaFaker:
+    """
+    Builds a deterministic instance of a JSON schema. Strings are sentences
+    of the request's user text, so extracted quotes are found in the essay;
+    all fields of one array item use the same sentence.
+    """
+
+    def __init__(self, schema: dict, text: str):
+        self.defs = {**schema.get("$defs", {}), **schema.get("definitions", {})}
+        self.sentences = _sentences(text)
+
+    def _resolve(self, schema: dict) -> dict:
+        while "$ref" in schema:
+            schema = self.defs[schema["$ref"].split("/")[-1]]
+        for key in ("anyOf", "oneOf"):
+            if key in schema:
+                options = [option for option in schema[key] if option.get("type") != "null"]
+                schema = self._resolve(options[0] if options else schema[key][0])
+        return schema
+
+    def build(self, schema: dict, index: int = 0, depth: int = 0):
+        schema = self._resolve(schema)
+        if "const" in schema:
+            return schema["const"]
+        if "enum" in schema:
+            return schema["enum"][index % len(schema["enum"])]
+
+        kind = schema.get("type", "object" if "properties" in schema else "string")
+        if isinstance(kind, list):
+            kind = next((k for k in kind if k != "null"), "null")
+
+        if kind == "object":
+            return {name: self.build(prop, index, depth + 1) for name, prop in schema.get("properties", {}).items()}
+        if kind == "array":
+            items = self._resolve(schema.get("items", {}))
+            if items.get("type") == "object" or "properties" in items:
+                # Top-level lists (facts, grammar issues, ...) grow with the input
+                count = max(1, min(len(self.sentences) // 3, 20)) if depth <= 1 else 2
+            else:
+                count = 2
+            count = max(schema.get("minItems", 0), min(count, schema.get("maxItems", count)))
+            return [self.build(items, index + i, depth + 1) for i in range(count)]
+        if kind == "integer":
+            low, high = schema.get("minimum", 1), schema.get("maximum", 10)
+            return low + index % (high - low + 1)
+        if kind == "number":
+            low, high = schema.get("minimum", 0.0), schema.get("maximum", 1.0)
+            return low + (high - low) * ((index % 10) / 10)
+        if kind == "boolean":
+            return False
+        if kind == "null":
+            return None
+        return self.sentences[index % len(self.sentences)]
+
+def _fake_report(words: int) -> str:
+    lines = ["# Academic Assessment Report", "", "## Scorecard", ""]
+    body = ("The essay addresses the question with adequate evidence and a generally clear structure, "
+            "although several claims would benefit from stronger support. ").split()
+    text = " ".join(body[i % len(body)] for i in range(words))
+    return "\n".join(lines) + text + "\n\n**Overall: Band 6**\n"
+
+def _vector(text: str, dimensions: int) -> list:
+    seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big")
+    rng = random.Random(seed)
+    vector = [rng.gauss(0, 1) for _ in range(dimensions)]
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+def _rate_limited() -> JSONResponse:
+    return JSONResponse(
+        {"error": {"message": "Rate limit exceeded (injected by the fake server)",
+                   "type": "rate_limit_exceeded", "code": "rate_limit_exceeded"}},
+        status_code=429,
+        headers={"Retry-After": "0"},
+    )
+
+def _answered_by_knowledge_base(text: str) -> bool:
+    # The fact checker sends pre-retrieved knowledge base results; the web
+    # is searched unless they contain the statement itself
+    statement, found, results = text.partition("Knowledge base results")
+    return bool(found) and statement.replace("Evaluate this fact:", "").strip() in results
+
+def _completion_message(body: dict) -> tuple:
+    """
+    Returns (content, tool_calls) answering a chat request: a tool call when
+    tools are offered, JSON for a json_schema response format, else a report.
+    """
+    messages = body.get("messages", [])
+    user_text = "\n".join(_message_text(m) for m in messages if m.get("role") == "user")
+    tools = body.get("tools") or []
+
+    if tools:
+        names = [tool["function"]["name"] for tool in tools]
+        called = any(message.get("role") == "tool" for message in messages)
+        if not called and "search_web" in names and not _answered_by_knowledge_base(user_text):
+            query = _sentences(user_text.replace("Evaluate this fact:", ""))[0][:200]
+            name, arguments = "search_web", {"query": query}
+        else:
+            choice = body.get("tool_choice")
+            name = choice["function"]["name"] if isinstance(choice, dict) else \
+                next((n for n in reversed(names) if n not in ACTION_TOOLS), names[-1])
+            schema = next(tool["function"].get("parameters", {}) for tool in tools if tool["function"]["name"] == name)
+            arguments = _SchemaFaker(schema, user_text).build(schema)
+        call_id = "call_" + hashlib.sha256(f"{name}{arguments}".encode("utf-8")).hexdigest()[:12]
+        return None, [{"id": call_id, "type": "function",
+                       "function": {"name": name, "arguments": json.dumps(arguments)}}]
+
+    response_format = body.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        schema = response_format["json_schema"]["schema"]
+        return json.dumps(_SchemaFaker(schema, user_text).build(schema)), None
+    if response_format.get("type") == "json_object":
+        return "{}", None
+    return None, None
+
+def build_app(faults: Faults = None, report_words: int = 400, stream_chunk_words: int = 8,
+              stream_delay_s: float = 0.0, dimensions: int = 256) -> Starlette:
+    """
+    OpenAI-compatible app serving /v1/chat/completions (plain, streamed,
+    tool calls and json_schema structured output) and /v1/embeddings with
+    deterministic fake content. `faults` adds latency and injected 429s.
+    Start it and set SILICON_FLOW_BASE_URL=http://<host>:<port>/v1.
+    """
+    faults = faults or Faults()
+
+    async def chat(request: Request):
+        body = await request.json()
+        if await faults.apply("chat"):
+            return _rate_limited()
+
+        content, tool_calls = _completion_message(body)
+        if content is None and tool_calls is None:
+            content = _fake_report(report_words)
+        prompt_tokens = sum(_count_tokens(_message_text(m)) for m in body.get("messages", []))
+        completion_tokens = _count_tokens(content or json.dumps(tool_calls))
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens}
+        finish_reason = "tool_calls" if tool_calls else "stop"
+        base = {"id": "chatcmpl-fake", "created": int(time.time()), "model": body.get("model", "fake")}
+
+        if not body.get("stream"):
+            message = {"role": "assistant", "content": content}
+            if tool_calls:
+                message["tool_calls"] = tool_calls
+            return JSONResponse({**base, "object": "chat.completion", "usage": usage,
+                                 "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}]})
+
+        async def events():
+            def chunk(delta, finish=None):
+                data = {**base, "object": "chat.completion.chunk",
+                        "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+                return f"data: {json.dumps(data)}\n\n"
+
+            yield chunk({"role": "assistant", "content": ""})
+            if tool_calls:
+                yield chunk({"tool_calls": [{"index": i, **call} for i, call in enumerate(tool_calls)]})
+            else:
+                words = content.split(" ")
+                for i in range(0, len(words), stream_chunk_words):
+                    if stream_delay_s:
+                        await asyncio.sleep(stream_delay_s)
+                    text = " ".join(words[i:i + stream_chunk_words])
+                    yield chunk({"content": text if i == 0 else " " + text})
+            yield chunk({}, finish_reason)
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield f"data: {json.dumps({**base, 'object': 'chat.completion.chunk', 'choices': [], 'usage': usage})}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    async def embeddings(request: Request):
+        body = await request.json()
+        if await faults.apply("embeddings"):
+            return _rate_limited()
+
+        inputs = body["input"]
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        data = []
+        for i, item in enumerate(inputs):
+            text = item if isinstance(item, str) else " ".join(map(str, item))
+            vector = _vector(text, body.get("dimensions") or dimensions)
+            if body.get("encoding_format") == "base64":
+                vector = base64.b64encode(struct.pack(f"<{len(vector)}f", *vector)).decode("ascii")
+            data.append({"object": "embedding", "index": i, "embedding": vector})
+        tokens = sum(_count_tokens(str(item)) for item in inputs)
+        return JSONResponse({"object": "list", "data": data, "model": body.get("model", "fake"),
+                             "usage": {"prompt_tokens": tokens, "total_tokens": tokens}})
+
+    async def stats(request: Request):
+        return JSONResponse(dict(faults.stats))
+
+    return Starlette(routes=[
+        Route("/v1/chat/completions", chat, methods=["POST"]),
+        Route("/v1/embeddings", embeddings, methods=["POST"]),
+        Route("/stats", stats, methods=["GET"]),
+    ])
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the OpenAI-compatible LLM API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8790)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random ± seconds around the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with a 429")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for jitter and 429s")
+    parser.add_argument("--stream-delay", type=float, default=0.0, help="Seconds between streamed chunks")
+    parser.add_argument("--report-words", type=int, default=400, help="Length of the generated report")
+    args = parser.parse_args()
+
+    faults = Faults(args.latency, args.jitter, args.error_rate, args.seed)
+    app = build_app(faults, report_words=args.report_words, stream_delay_s=args.stream_delay)
+    print(f"Fake OpenAI-compatible API on http://{args.host}:{args.port}/v1")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+# Latency, jitter and rate-limit injection shared by the fake servers
+import asyncio
+import random
+import threading
+from collections import Counter
+
+class Faults:
+    """
+    Adds `latency_s` (± up to `jitter_s`) to every request and fails a
+    fraction `error_rate` of them as rate limited. A fixed `seed` makes
+    the sequence of delays and failures repeatable.
+    """
+
+    def __init__(self, latency_s: float = 0.0, jitter_s: float = 0.0, error_rate: float = 0.0, seed: int = None):
+        self.latency_s = latency_s
+        self.jitter_s = jitter_s
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = Counter()
+
+    def _draw(self) -> tuple:
+        with self._lock:
+            jitter = self._random.uniform(-self.jitter_s, self.jitter_s) if self.jitter_s else 0.0
+            failed = self._random.random() < self.error_rate
+        return max(0.0, self.latency_s + jitter), failed
+
+    async def apply(self, route: str) -> bool:
+        """
+        Sleeps for this request's latency. Returns True if the request
+        should be answered with a rate-limit error.
+        """
+        delay, failed = self._draw()
+        await asyncio.sleep(delay)
+        with self._lock:
+            self.stats[route] += 1
+            if failed:
+                self.stats[f"{route}_429"] += 1
+        return failed
@@ -0,0 +1,301 @@
+# Offline pipeline benchmark: runs stages and whole essays against the local fake servers
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+import httpx
+from src.benchmarks.synthetic import (
+    make_essay, make_reference, make_facts, write_pdf, QUESTION_TEXT, RUBRIC_TEXT
+)
+
+# src.config cannot be imported before configure_environment() has run
+BASE_DIR = Path(__file__).resolve().parents[2]
+SCENARIOS = ("knowledge_base", "extract_facts", "check_facts", "pipeline")
+FACTS_PER_PAGE = 5
+
+def percentile(values: list, q: float) -> float:
+    """Linearly interpolated percentile (q in 0-100)."""
+    values = sorted(values)
+    if len(values) == 1:
+        return values[0]
+    position = (len(values) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+def summarize(scenario: str, size: int, durations: list, units: int, unit: str, wall_s: float = None) -> dict:
+    """
+    Latency percentiles of one scenario at one size, and its throughput in
+    `unit`s per second (over `wall_s`, or the summed durations).
+    """
+    wall_s = wall_s if wall_s is not None else sum(durations)
+    return {
+        "scenario": scenario,
+        "size_pages": size,
+        "runs": len(durations),
+        "p50_s": round(percentile(durations, 50), 3),
+        "p95_s": round(percentile(durations, 95), 3),
+        "mean_s": round(statistics.mean(durations), 3),
+        "throughput": round(units / wall_s, 3) if wall_s > 0 else None,
+        "unit": f"{unit}/s",
+    }
+
+# --- Fake services ---
+def _start_server(module: str, host: str, port: int, options: list, verbose: bool) -> subprocess.Popen:
+    output = None if verbose else subprocess.DEVNULL
+    process = subprocess.Popen(
+        [sys.executable, "-m", module, "--host", host, "--port", str(port), *map(str, options)],
+        cwd=BASE_DIR, stdout=output, stderr=output,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{module} exited with code {process.returncode}")
+        try:
+            httpx.get(f"http://{host}:{port}/stats", timeout=1)
+            return process
+        except httpx.TransportError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"{module} did not start on port {port}")
+
+def start_fake_services(args) -> dict:
+    """
+    Starts the fake OpenAI-compatible API and MCP server as subprocesses.
+    They must not run in this process: the pipeline forks PDF-parsing
+    workers, which would inherit the servers' sockets and keep connections
+    the servers closed half open (clients then hang until they time out).
+    """
+    faults = ["--jitter", args.jitter, "--seed", args.seed]
+    return {
+        "llm_url": f"http://{args.host}:{args.llm_port}/v1",
+        "mcp_url": f"http://{args.host}:{args.mcp_port}/mcp",
+        "stats_urls": {"llm": f"http://{args.host}:{args.llm_port}/stats",
+                       "mcp": f"http://{args.host}:{args.mcp_port}/stats"},
+        "processes": [
+            _start_server("src.benchmarks.fake_openai", args.host, args.llm_port, faults + [
+                "--latency", args.latency, "--error-rate", args.error_rate,
+                "--stream-delay", args.stream_delay, "--report-words", args.report_words,
+            ], args.verbose),
+            _start_server("src.benchmarks.fake_mcp", args.host, args.mcp_port, faults + [
+                "--latency", args.mcp_latency, "--error-rate", args.mcp_error_rate,
+            ], args.verbose),
+        ],
+    }
+
+def stop_fake_services(services: dict) -> dict:
+    """Stops the fake servers; returns their request and injected-error counts."""
+    requests = {}
+    for name, url in services["stats_urls"].items():
+        try:
+            requests[name] = httpx.get(url, timeout=5).json()
+        except httpx.HTTPError:
+            requests[name] = None
+    for process in services["processes"]:
+        process.terminate()
+        process.wait()
+    return requests
+
+def configure_environment(work_dir: Path, llm_url: str, mcp_url: str, llm_cache: bool):
+    """
+    Points the pipeline at the fake services and a scratch data directory.
+    Must run before anything under src (other than src.benchmarks) is
+    imported, because src.config reads the environment at import time.
+    """
+    os.environ.update({
+        "ESSAY_CHECKER_DATA_DIR": str(work_dir),
+        "SILICON_FLOW_BASE_URL": llm_url,
+        "JINA_MCP_URL": mcp_url,
+        "OPENAI_API_KEY": "benchmark",
+        "LLM_CACHE_ENABLED": "true" if llm_cache else "false",
+        "WEB_TOOL_CACHE_TTL_HOURS": "0",
+        # No tracing to Langfuse from benchmark runs
+        "LANGFUSE_PUBLIC_KEY": "",
+        "LANGFUSE_SECRET_KEY": "",
+    })
+
+# --- Scenarios ---
+# Every run uses freshly generated text (new seed), so no cache hides the work being measured
+def _write_essay(directory: Path, pages: int, seed: int) -> Path:
+    path = directory / f"essay_{pages}p_{seed}.pdf"
+    write_pdf(path, make_essay(pages, seed))
+    return path
+
+async def bench_knowledge_base(work_dir: Path, size: int, runs: int, kb_files: int) -> dict:
+    from src.database.vector_ops import setup_knowledge_base
+    kb_dir = work_dir / "knowledge_base"
+    durations = []
+    for run in range(runs):
+        for i in range(kb_files):
+            write_pdf(kb_dir / f"reference_{i}.pdf", make_reference(size, seed=1000 * size + 100 * run + i))
+        start = time.perf_counter()
+        await asyncio.to_thread(setup_knowledge_base)
+        durations.append(time.perf_counter() - start)
+    return summarize("knowledge_base", size, durations, runs * kb_files * size, "pages")
+
+async def bench_extract_facts(inputs_dir: Path, size: int, runs: int) -> dict:
+    from src.ingestion.pdf_loader import aload_pdf
+    from src.ingestion.extractor import aextract_facts_from_docs
+    durations = []
+    for run in range(runs):
+        docs = await aload_pdf(_write_essay(inputs_dir, size, 2000 + run))
+        # The pipeline's path: page packs sent concurrently on this loop
+        start = time.perf_counter()
+        await aextract_facts_from_docs(docs)
+        durations.append(time.perf_counter() - start)
+    return summarize("extract_facts", size, durations, runs * size, "pages")
+
+async def bench_check_facts(size: int, runs: int) -> dict:
+    from src.agents.factory import check_facts
+    durations = []
+    count = size * FACTS_PER_PAGE
+    for run in range(runs):
+        facts = make_facts(count, seed=3000 * size + run)
+        start = time.perf_counter()
+        await check_facts(facts)
+        durations.append(time.perf_counter() - start)
+    return summarize("check_facts", size, durations, runs * count, "facts")
+
+async def bench_pipeline(work_dir: Path, inputs: dict, size: int, runs: int, concurrency: int) -> dict:
+    from src.main import PipelinePaths, grade_essay
+    durations = []
+
+    async def grade(run: int):
+        essay_pdf = _write_essay(inputs["dir"], size, 4000 + run)
+        paths = PipelinePaths.for_output_dir(essay_pdf, inputs["question"], inputs["rubric"],
+                                             work_dir / "runs" / essay_pdf.stem)
+        Path(paths.final_report).parent.mkdir(parents=True, exist_ok=True)
+        start = time.perf_counter()
+        # Every stage runs; checkpoints from an earlier benchmark are ignored
+        await grade_essay(paths, reuse=False)
+        durations.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for first in range(0, runs, concurrency):
+        await asyncio.gather(*[grade(run) for run in range(first, min(first + concurrency, runs))])
+    wall_s = time.perf_counter() - start
+    return summarize("pipeline", size, durations, runs, "essays", wall_s)
+
+async def run_benchmark(work_dir: Path, scenarios: list, sizes: list, runs: int,
+                        kb_files: int = 3, concurrency: int = 1, verbose: bool = False) -> list:
+    """
+    Runs each scenario at each essay size (in pages) `runs` times and
+    returns one summary per (scenario, size). The pipeline's own output is
+    hidden unless `verbose`.
+    """
+    from src.agents.mcp_tools import close_web_tools
+    inputs_dir = work_dir / "inputs"
+    inputs_dir.mkdir(parents=True, exist_ok=True)
+    (work_dir / "knowledge_base").mkdir(parents=True, exist_ok=True)
+    inputs = {"dir": inputs_dir, "question": inputs_dir / "question.pdf", "rubric": inputs_dir / "rubric.pdf"}
+    write_pdf(inputs["question"], QUESTION_TEXT)
+    write_pdf(inputs["rubric"], RUBRIC_TEXT)
+    # The fact checker and the pipeline need a knowledge base to search
+    write_pdf(work_dir / "knowledge_base" / "reference_0.pdf", make_reference(2, seed=0))
+
+    results = []
+    try:
+        for scenario in scenarios:
+            for size in sizes:
+                with contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO()):
+                    if scenario == "knowledge_base":
+                        result = await bench_knowledge_base(work_dir, size, runs, kb_files)
+                    elif scenario == "extract_facts":
+                        result = await bench_extract_facts(inputs_dir, size, runs)
+                    elif scenario == "check_facts":
+                        result = await bench_check_facts(size, runs)
+                    else:
+                        result = await bench_pipeline(work_dir, inputs, size, runs, concurrency)
+                print_result(result)
+                results.append(result)
+    finally:
+        await close_web_tools()
+    return results
+
+# --- Reporting ---
+def print_result(result: dict):
+    print(f"  {result['scenario']:<15} {result['size_pages']:>4}p  runs={result['runs']:<3} "
+          f"p50={result['p50_s']:>7.3f}s  p95={result['p95_s']:>7.3f}s  "
+          f"{result['throughput']:>8.2f} {result['unit']}")
+
+def compare(results: list, baseline: list):
+    """Prints the change of every result against a saved baseline run."""
+    previous = {(r["scenario"], r["size_pages"]): r for r in baseline}
+    print("\n📊 Against baseline:")
+    for result in results:
+        before = previous.get((result["scenario"], result["size_pages"]))
+        if before is None:
+            continue
+        changes = []
+        for key in ("p50_s", "p95_s", "throughput"):
+            if before[key]:
+                changes.append(f"{key} {100 * (result[key] - before[key]) / before[key]:+.1f}%")
+        print(f"  {result['scenario']:<15} {result['size_pages']:>4}p  " + "  ".join(changes))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline offline against local fake LLM and MCP servers.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"Comma-separated, from: {', '.join(SCENARIOS)}")
+    parser.add_argument("--sizes", default="1,4,12", help="Comma-separated essay sizes in pages")
+    parser.add_argument("--runs", type=int, default=3, help="Runs per scenario and size")
+    parser.add_argument("--kb-files", type=int, default=3, help="Knowledge-base PDFs (of --sizes pages) per knowledge_base run")
+    parser.add_argument("--concurrency", type=int, default=1, help="Essays graded at the same time in the pipeline scenario")
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds per LLM/embedding request")
+    parser.add_argument("--jitter", type=float, default=0.05, help="Random ± seconds around every latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of LLM/embedding requests answered with a 429")
+    parser.add_argument("--mcp-latency", type=float, default=0.3, help="Seconds per web tool call")
+    parser.add_argument("--mcp-error-rate", type=float, default=0.0, help="Fraction of web tool calls failed as rate limited")
+    parser.add_argument("--stream-delay", type=float, default=0.02, help="Seconds between streamed report chunks")
+    parser.add_argument("--report-words", type=int, default=400, help="Length of the fake final report")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for jitter and injected errors")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--llm-port", type=int, default=8790)
+    parser.add_argument("--mcp-port", type=int, default=8791)
+    parser.add_argument("--llm-cache", action="store_true", help="Keep the LLM response cache on (off by default)")
+    parser.add_argument("--work-dir", default=None, help="Scratch data directory (default: a temporary one, removed afterwards)")
+    parser.add_argument("--output", default=None, help="Write the results as JSON to this file")
+    parser.add_argument("--compare", default=None, help="Baseline results JSON to compare against")
+    parser.add_argument("--verbose", action="store_true", help="Show the pipeline's own output")
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    work_dir = Path(args.work_dir) if args.work_dir else Path(tempfile.mkdtemp(prefix="essay-bench-"))
+    services = start_fake_services(args)
+    configure_environment(work_dir, services["llm_url"], services["mcp_url"], args.llm_cache)
+
+    print(f"⏱️ Benchmarking {', '.join(scenarios)} at {args.sizes} pages, {args.runs} runs each "
+          f"(latency {args.latency}s ± {args.jitter}s, 429 rate {args.error_rate})")
+    start = time.perf_counter()
+    try:
+        results = asyncio.run(run_benchmark(work_dir, scenarios, sizes, args.runs,
+                                            args.kb_files, args.concurrency, args.verbose))
+    finally:
+        requests = stop_fake_services(services)
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"🔁 Fake server requests: {json.dumps(requests)}")
+    print(f"(benchmark took {time.perf_counter() - start:.1f}s)")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results, "requests": requests}, f, indent=2)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(results, json.load(f)["results"])
+
+if __name__ == "__main__":
+    main()
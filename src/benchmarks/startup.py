@@ -0,0 +1,57 @@
+# Start-up benchmark: import time of src.main vs. time to warm the retriever
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from src.config import BASE_DIR
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import src.main; print(time.perf_counter() - t)"
+WARM_SNIPPET = (
+    "import time; import src.main; from src.agents.tools import warm; "
+    "t = time.perf_counter(); warm(); print(time.perf_counter() - t)"
+)
+
+def _time_in_subprocess(snippet: str) -> float:
+    # A fresh interpreter each time, so nothing is already imported or cached
+    output = subprocess.run(
+        [sys.executable, "-c", snippet],
+        cwd=BASE_DIR, capture_output=True, text=True, check=True,
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+def run_startup_benchmark(runs: int = 5, include_warm: bool = True) -> dict:
+    """
+    Measures `import src.main` in fresh interpreters and, separately, the
+    time `warm()` needs to open the knowledge base.
+    """
+    import_times = [_time_in_subprocess(IMPORT_SNIPPET) for _ in range(runs)]
+    result = {
+        "runs": runs,
+        "import_median_s": round(statistics.median(import_times), 3),
+        "import_max_s": round(max(import_times), 3),
+    }
+    if include_warm:
+        result["warm_s"] = round(_time_in_subprocess(WARM_SNIPPET), 3)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure start-up time of the pipeline.")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to time the import in")
+    parser.add_argument("--max-import-s", type=float, default=None, help="Fail if the median import time exceeds this")
+    parser.add_argument("--skip-warm", action="store_true", help="Do not time the knowledge-base warm-up")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    result = run_startup_benchmark(args.runs, include_warm=not args.skip_warm)
+    print(f"⏱️ import src.main: median {result['import_median_s']:.3f}s, max {result['import_max_s']:.3f}s over {args.runs} runs")
+    if "warm_s" in result:
+        print(f"⏱️ knowledge base warm(): {result['warm_s']:.3f}s")
+    print(f"(benchmark took {time.perf_counter() - start:.1f}s)")
+
+    if args.max_import_s is not None and result["import_median_s"] > args.max_import_s:
+        print(f"❌ Import time above {args.max_import_s:.3f}s")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# Synthetic essays, knowledge-base documents, questions and rubrics written as PDFs
+import random
+import textwrap
+
+SUBJECTS = [
+    "The Industrial Revolution", "The printing press", "The Roman Republic", "Photosynthesis",
+    "The Treaty of Westphalia", "The steam engine", "The Silk Road", "Penicillin",
+    "The Great Depression", "Plate tectonics", "The Renaissance", "The telegraph",
+]
+VERBS = [
+    "began in", "was introduced in", "reached its peak in", "was first described in",
+    "transformed Europe in", "spread to Asia in", "was widely adopted in", "declined after",
+]
+CLAIMS = [
+    "Historians broadly agree that this shaped the economy of the following century.",
+    "It is often argued that this was the single most important change of its era.",
+    "Critics point out that the evidence for this view is limited.",
+    "As a result, literacy and trade increased across the region.",
+    "This development was closely tied to changes in agriculture and population.",
+    "However, its effects were uneven and took decades to appear.",
+]
+HEADINGS = ["Introduction", "Background", "Discussion", "Analysis", "Counterarguments", "Conclusion"]
+
+# About one page of text in the PDFs written below
+WORDS_PER_PAGE = 330
+
+def _fact(rng: random.Random) -> str:
+    return f"{rng.choice(SUBJECTS)} {rng.choice(VERBS)} {rng.randint(1200, 1990)}."
+
+def make_facts(count: int, seed: int = 0) -> list:
+    """Fact dicts shaped like the extractor's output."""
+    rng = random.Random(seed)
+    facts = []
+    for i in range(count):
+        statement = _fact(rng)
+        facts.append({"statement": statement, "source_quote": statement, "page_number": i // 5 + 1})
+    return facts
+
+def make_essay(pages: int, seed: int = 0) -> str:
+    """
+    An essay of about `pages` pages: numbered sections of paragraphs that
+    mix dated factual claims with argument sentences.
+    """
+    rng = random.Random(seed)
+    paragraphs, words = [], 0
+    section = 0
+    while words < pages * WORDS_PER_PAGE:
+        if words >= section * WORDS_PER_PAGE * 1.5:
+            heading = HEADINGS[min(section, len(HEADINGS) - 1)]
+            paragraphs.append(f"{section + 1}. {heading}")
+            section += 1
+        sentences = [_fact(rng) if rng.random() < 0.4 else rng.choice(CLAIMS) for _ in range(rng.randint(4, 7))]
+        paragraph = " ".join(sentences)
+        paragraphs.append(paragraph)
+        words += len(paragraph.split())
+    return "\n\n".join(paragraphs)
+
+def make_reference(pages: int, seed: int = 0) -> str:
+    """A knowledge-base document of about `pages` pages of factual statements."""
+    rng = random.Random(seed)
+    sentences, words = [], 0
+    while words < pages * WORDS_PER_PAGE:
+        sentence = _fact(rng)
+        sentences.append(sentence)
+        words += len(sentence.split())
+    return "\n\n".join(" ".join(sentences[i:i + 6]) for i in range(0, len(sentences), 6))
+
+QUESTION_TEXT = "Essay question: To what extent did technological change drive social change in Europe? Discuss with evidence."
+
+RUBRIC_TEXT = "\n\n".join([
+    "Marking Rubric",
+    "Task Response (40%): Band 7: fully addresses all parts of the question. Band 5: addresses the question only partly.",
+    "Coherence and Cohesion (20%): Band 7: logically organised with clear progression. Band 5: some organisation but lacks progression.",
+    "Language (20%): Band 7: varied vocabulary with few errors. Band 5: limited range with noticeable errors.",
+    "Evidence and Referencing (20%): Band 7: accurate, well-cited evidence. Band 5: some evidence, citations inconsistent.",
+])
+
+def _escape(line: str) -> str:
+    line = line.encode("latin-1", "replace").decode("latin-1")
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def write_pdf(path, text: str, lines_per_page: int = 48, width: int = 95):
+    """
+    Writes `text` as a plain PDF (Helvetica, wrapped at `width` characters)
+    that PyPDFLoader can read back, without any PDF library.
+    """
+    lines = []
+    for paragraph in text.split("\n\n"):
+        lines.extend(textwrap.wrap(paragraph, width) or [""])
+        lines.append("")
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]]
+
+    # 1: catalog, 2: page tree, 3: font, then a page and its content stream per page
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        ("<< /Type /Pages /Kids [%s] /Count %d >>" % (
+            " ".join(f"{4 + 2 * i} 0 R" for i in range(len(pages))), len(pages))).encode("ascii"),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, page_lines in enumerate(pages):
+        stream = "BT /F1 10 Tf 14 TL 50 790 Td " + " ".join(f"({_escape(line)}) Tj T*" for line in page_lines) + " ET"
+        stream = stream.encode("latin-1")
+        objects.append((
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>"
+        ).encode("ascii"))
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    output += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+
+    with open(path, "wb") as f:
+        f.write(output)
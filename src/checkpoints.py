@@ -0,0 +1,130 @@
+# Stage checkpoints: reuse a stage's saved output while its inputs and code are unchanged
+import hashlib
+import importlib.util
+import inspect
+import json
+import os
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from src import config as settings
+from src.config import LLM_MODEL
+from src.ingestion.pdf_loader import file_sha256
+from src.tokens import get_encoding
+
+MANIFEST_NAME = "manifest.json"
+
+def _jsonable(value):
+    # Documents and other pydantic models
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    return str(value)
+
+def content_hash(value) -> str:
+    """SHA-256 of a value's canonical JSON form."""
+    data = json.dumps(value, sort_keys=True, ensure_ascii=False, default=_jsonable)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+@lru_cache(maxsize=None)
+def _module_hash(module: str) -> str:
+    with open(importlib.util.find_spec(module).origin, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def code_version(stage) -> str:
+    """
+    Hash of the stage function, the source of the modules listed in its
+    `code`, and the chat model, so editing e.g. the judge prompt
+    invalidates only the stages that use it.
+    """
+    parts = [inspect.getsource(stage.run), LLM_MODEL]
+    parts += [f"{module}:{_module_hash(module)}" for module in stage.code]
+    if "src.tokens" in stage.code:
+        # Token counts (and so section and pack splits) depend on the encoding actually loaded
+        parts.append(f"encoding:{get_encoding().name}")
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+def _write_json_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+class Checkpoints:
+    """
+    Saved outputs of the stages of one essay's run, with a manifest that
+    records, per stage, the content hash of every input, the code
+    version, the settings it depends on and the hash of the output.
+
+    A stage is reused when its fingerprint (inputs + code + settings)
+    matches the manifest and its output file still exists. Inputs are hashed by
+    content, so a recomputed stage only invalidates its downstream
+    stages if its output actually changed. Outputs that are None, or
+    whose stage reports `failed` in its metrics, are not saved.
+    `reuse=False` recomputes everything; stages named in `force` are
+    always recomputed.
+    """
+
+    def __init__(self, directory, reuse: bool = True, force=()):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.reuse = reuse
+        self.force = set(force)
+        self.manifest_path = self.directory / MANIFEST_NAME
+        self.manifest = {"stages": {}}
+        if self.manifest_path.exists():
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                self.manifest = json.load(f)
+        # Content hashes of this run's stage outputs, computed when first needed
+        self._hashes = {}
+
+    def _value_hash(self, name: str, value) -> str:
+        if name not in self._hashes:
+            self._hashes[name] = content_hash(value)
+        return self._hashes[name]
+
+    def entry_for(self, stage, results: dict) -> dict:
+        """The manifest entry this stage would have for the current inputs."""
+        inputs = {dep: self._value_hash(dep, results[dep]) for dep in stage.inputs if dep != "paths"}
+        paths = results.get("paths")
+        for field in stage.reads:
+            inputs[field] = file_sha256(getattr(paths, field))
+        code = code_version(stage)
+        config = {name: getattr(settings, name) for name in stage.config}
+        return {
+            "fingerprint": content_hash({"inputs": inputs, "code": code, "config": config}),
+            "inputs": inputs,
+            "code_version": code,
+            "config": config,
+        }
+
+    def _output_path(self, name: str) -> Path:
+        return self.directory / f"{name}.json"
+
+    def load(self, stage, entry: dict, paths):
+        """
+        Returns (True, output) if the stage's saved output can be reused,
+        else (False, None).
+        """
+        saved = self.manifest["stages"].get(stage.name)
+        if (not self.reuse or stage.name in self.force or saved is None
+                or saved["fingerprint"] != entry["fingerprint"]
+                or not Path(getattr(paths, stage.output)).exists()
+                or not self._output_path(stage.name).exists()):
+            return False, None
+        with open(self._output_path(stage.name), "r", encoding="utf-8") as f:
+            output = json.load(f)
+        self._hashes[stage.name] = saved["output_hash"]
+        return True, output
+
+    def save(self, stage, entry: dict, output, metrics: dict = None):
+        self._hashes[stage.name] = content_hash(output)
+        if output is None or (metrics or {}).get("failed"):
+            self.manifest["stages"].pop(stage.name, None)
+        else:
+            _write_json_atomic(self._output_path(stage.name), output)
+            self.manifest["stages"][stage.name] = {
+                **entry,
+                "output_hash": self._hashes[stage.name],
+                "completed_at": datetime.now().isoformat(timespec="seconds"),
+            }
+        _write_json_atomic(self.manifest_path, self.manifest)
@@ -11,10 +11,13 @@ load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 SILICON_FLOW_BASE_URL = os.getenv("SILICON_FLOW_BASE_URL", "https://api.siliconflow.cn/v1")
 JINA_API_KEY = os.getenv("JINA_API_KEY")
+# Point this at a local MCP server (e.g. src/benchmarks/fake_mcp.py) to test offline
+JINA_MCP_URL = os.getenv("JINA_MCP_URL", "https://mcp.jina.ai/v1?include_tags=search,read")
 
 # Base Paths
 BASE_DIR = Path(__file__).resolve().parent.parent
-DATA_DIR = BASE_DIR / "data"
+# Benchmarks point this at a scratch directory so the real data and caches are untouched
+DATA_DIR = Path(os.getenv("ESSAY_CHECKER_DATA_DIR", BASE_DIR / "data"))
 
 # Input/Raw Paths
 RAW_DIR = DATA_DIR / "raw"
@@ -25,6 +28,8 @@ RUBRIC_PDF_PATH = RAW_DIR / "essay_rubric.pdf"
 # Knowledge Base Paths
 KB_DIR = DATA_DIR / "knowledge_base"
 VECTOR_DB_PATH = DATA_DIR / "chroma_db"
+KB_MANIFEST_PATH = VECTOR_DB_PATH / "kb_manifest.json"
+BM25_INDEX_PATH = VECTOR_DB_PATH / "bm25_index.json"
 
 # Output/Processed Paths
 PROCESSED_DIR = DATA_DIR / "processed"
@@ -33,11 +38,111 @@ RUBRICS_JSON_PATH = PROCESSED_DIR / "extracted_rubrics.json"
 FACT_CHECK_OUTPUT_PATH = PROCESSED_DIR / "fact_checking_output.json"
 LOGIC_OUTPUT_PATH = PROCESSED_DIR / "logic_analysis_output.json"
 LANGUAGE_OUTPUT_PATH = PROCESSED_DIR / "language_analysis_output.json"
+STAGE_TIMINGS_PATH = PROCESSED_DIR / "stage_timings.json"
 FINAL_REPORT_PATH = DATA_DIR / "final_report/final_report.md"
+RUN_PROFILE_PATH = DATA_DIR / "final_report/run_profile.jsonl"
+# Saved stage outputs and their input hashes, for incremental re-grading
+CHECKPOINT_DIR = PROCESSED_DIR / "checkpoints"
+BATCH_OUTPUT_DIR = DATA_DIR / "batch"
+SERVICE_OUTPUT_DIR = DATA_DIR / "service"
+
+# Cache Paths
+CACHE_DIR = DATA_DIR / "cache"
+LLM_CACHE_PATH = CACHE_DIR / "llm_cache.sqlite3"
+RUBRIC_STORE_DIR = CACHE_DIR / "rubrics"
+EMBEDDING_CACHE_DIR = CACHE_DIR / "embeddings"
+WEB_TOOL_CACHE_PATH = CACHE_DIR / "web_tools.sqlite3"
+PDF_CACHE_DIR = CACHE_DIR / "pdf"
 
 # Create directories if they don't exist
 PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
 (DATA_DIR / "final_report").mkdir(parents=True, exist_ok=True)
+CACHE_DIR.mkdir(parents=True, exist_ok=True)
+VECTOR_DB_PATH.mkdir(parents=True, exist_ok=True)
+RUBRIC_STORE_DIR.mkdir(parents=True, exist_ok=True)
+PDF_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+
+# LLM response cache (set LLM_CACHE_ENABLED=false to bypass it)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_MAX_MB = int(os.getenv("LLM_CACHE_MAX_MB", "256"))
+
+# Embedding cache (number of vectors kept on disk)
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+
+# Web search / page read cache for the MCP tools (0 disables it)
+WEB_TOOL_CACHE_TTL_HOURS = float(os.getenv("WEB_TOOL_CACHE_TTL_HOURS", "168"))
+
+# Concurrency
+FACT_EXTRACTION_CONCURRENCY = int(os.getenv("FACT_EXTRACTION_CONCURRENCY", "5"))
+MAX_CONCURRENT_LLM_REQUESTS = int(os.getenv("MAX_CONCURRENT_LLM_REQUESTS", "8"))
+MAX_CONCURRENT_ESSAYS = int(os.getenv("MAX_CONCURRENT_ESSAYS", "4"))
+
+# Grading service (src/service.py): essays graded at once and submissions allowed to wait
+SERVICE_WORKERS = int(os.getenv("SERVICE_WORKERS", str(MAX_CONCURRENT_ESSAYS)))
+SERVICE_QUEUE_SIZE = int(os.getenv("SERVICE_QUEUE_SIZE", "100"))
+# Seconds a finished job stays queryable before it is forgotten (its output folder is kept)
+SERVICE_JOB_TTL_S = float(os.getenv("SERVICE_JOB_TTL_S", "3600"))
+
+# Provider-wide LLM rate limits (requests/min, tokens/min, in-flight ceiling and starting point)
+LLM_PROVIDER_LIMITS = {
+    "siliconflow": {
+        "rpm": int(os.getenv("SILICON_FLOW_RPM", "1000")),
+        "tpm": int(os.getenv("SILICON_FLOW_TPM", "100000")),
+        "ceiling": MAX_CONCURRENT_LLM_REQUESTS,
+        "initial": int(os.getenv("SILICON_FLOW_INITIAL_CONCURRENCY", "3")),
+    },
+}
+# Retries on 429 / timeouts, done by the limiter rather than the OpenAI client
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "6"))
+
+# Shared chat models and their pooled HTTP connections
+LLM_MODEL = os.getenv("LLM_MODEL", "deepseek-ai/DeepSeek-V3")
+LLM_POOL_MAX_CONNECTIONS = int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "20"))
+LLM_POOL_MAX_KEEPALIVE = int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "10"))
+LLM_POOL_KEEPALIVE_EXPIRY = float(os.getenv("LLM_POOL_KEEPALIVE_EXPIRY", "60"))
+
+# Essay, question and rubric PDFs are parsed in this many worker processes
+PDF_PARSE_WORKERS = int(os.getenv("PDF_PARSE_WORKERS", str(min(3, os.cpu_count() or 1))))
+# Parsed PDFs kept in memory, and the size of their on-disk cache
+PDF_MEMORY_CACHE_ENTRIES = int(os.getenv("PDF_MEMORY_CACHE_ENTRIES", "32"))
+PDF_CACHE_MAX_MB = int(os.getenv("PDF_CACHE_MAX_MB", "256"))
+
+# Knowledge base ingestion
+KB_PARSE_WORKERS = int(os.getenv("KB_PARSE_WORKERS", str(os.cpu_count() or 1)))
+KB_EMBED_CONCURRENCY = int(os.getenv("KB_EMBED_CONCURRENCY", "4"))
+KB_EMBED_BATCH_SIZE = int(os.getenv("KB_EMBED_BATCH_SIZE", "64"))
+KB_UPSERT_BATCH_SIZE = int(os.getenv("KB_UPSERT_BATCH_SIZE", "512"))
+
+# Knowledge base retrieval: "hybrid" (BM25 + vectors, fused), "dense" or "lexical" (no embedding call)
+KB_RETRIEVAL_MODE = os.getenv("KB_RETRIEVAL_MODE", "hybrid")
+KB_TOP_K = int(os.getenv("KB_TOP_K", "2"))
+# Minimum relevance (0-1) of a chunk in the list it was found in; 0 keeps everything
+KB_SCORE_THRESHOLD = float(os.getenv("KB_SCORE_THRESHOLD", "0"))
+# Candidates taken from each list before fusion
+KB_FUSION_CANDIDATES = int(os.getenv("KB_FUSION_CANDIDATES", "10"))
+# Hybrid search answers from BM25 alone when the query embedding takes longer than this
+KB_DENSE_TIMEOUT_S = float(os.getenv("KB_DENSE_TIMEOUT_S", "10"))
+
+# Fact extraction packing (tokens of essay text per LLM request)
+FACT_PACK_TARGET_TOKENS = int(os.getenv("FACT_PACK_TARGET_TOKENS", "1500"))
+FACT_PACK_MAX_TOKENS = int(os.getenv("FACT_PACK_MAX_TOKENS", "3000"))
+
+# Long essays are analyzed section by section (map-reduce) above this size
+ESSAY_SECTION_MAX_TOKENS = int(os.getenv("ESSAY_SECTION_MAX_TOKENS", "3000"))
+
+# Final report judge input (logic, fact, language reports and rubric)
+JUDGE_PAYLOAD_TOKEN_BUDGET = int(os.getenv("JUDGE_PAYLOAD_TOKEN_BUDGET", "6000"))
+JUDGE_GRAMMAR_EXAMPLES_PER_TYPE = int(os.getenv("JUDGE_GRAMMAR_EXAMPLES_PER_TYPE", "3"))
+
+# Facts whose statements are at least this similar are verified once
+FACT_DEDUP_THRESHOLD = float(os.getenv("FACT_DEDUP_THRESHOLD", "0.85"))
+
+# Prices per million (input, output) tokens for cost estimates in run profiles
+COST_CURRENCY = os.getenv("COST_CURRENCY", "CNY")
+MODEL_PRICES_PER_MTOK = {
+    "deepseek-ai/DeepSeek-V3": (2.0, 8.0),
+    "BAAI/bge-m3": (0.0, 0.0),
+}
 
 # Langfuse Config
 LANGFUSE_PUBLIC_KEY = os.getenv("LANGFUSE_PUBLIC_KEY")
@@ -0,0 +1,124 @@
+# Lexical (BM25) index of the knowledge-base chunks and reciprocal-rank fusion with dense results
+import heapq
+import json
+import math
+import os
+import re
+from collections import Counter
+from typing import List
+
+# Words and numbers; years and figures stay whole tokens ("1848", "3.5")
+TOKEN_PATTERN = re.compile(r"\d+(?:[.,]\d+)*|\w+")
+# Bumped when tokenize() changes, so indexes saved with older tokens are rebuilt
+TOKENIZER_VERSION = 2
+
+def tokenize(text: str) -> List[str]:
+    # Thousands separators are dropped as in src/ingestion/dedup.py: "1,000" -> "1000"
+    text = re.sub(r"(?<=\d),(?=\d{3})", "", text.lower())
+    return TOKEN_PATTERN.findall(text)
+
+class BM25Index:
+    """
+    Okapi BM25 over the same chunks (and chunk ids) as the Chroma
+    collection, stored as an inverted index in one JSON file:
+    {"docs": {id: {"text": ..., "length": ...}}, "postings": {term: {id: tf}}}.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.docs = {}
+        self.postings = {}
+        self._total_length = 0
+
+    @classmethod
+    def load(cls, path):
+        """
+        Returns the saved index, or None if there is none (or it is
+        unreadable, or was built with another tokenizer version).
+        """
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("tokenizer") != TOKENIZER_VERSION:
+            return None
+        index = cls(data["k1"], data["b"])
+        index.docs = data["docs"]
+        index.postings = data["postings"]
+        index._total_length = sum(doc["length"] for doc in index.docs.values())
+        return index
+
+    def save(self, path):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"tokenizer": TOKENIZER_VERSION, "k1": self.k1, "b": self.b, "docs": self.docs, "postings": self.postings}, f)
+        os.replace(tmp_path, path)
+
+    def ids(self) -> set:
+        return set(self.docs)
+
+    def add(self, ids: List[str], texts: List[str]):
+        """Adds (or replaces) chunks."""
+        self.remove([chunk_id for chunk_id in ids if chunk_id in self.docs])
+        for chunk_id, text in zip(ids, texts):
+            counts = Counter(tokenize(text))
+            length = sum(counts.values())
+            self.docs[chunk_id] = {"text": text, "length": length}
+            self._total_length += length
+            for term, tf in counts.items():
+                self.postings.setdefault(term, {})[chunk_id] = tf
+
+    def remove(self, ids: List[str]):
+        for chunk_id in ids:
+            doc = self.docs.pop(chunk_id, None)
+            if doc is None:
+                continue
+            self._total_length -= doc["length"]
+            for term in set(tokenize(doc["text"])):
+                postings = self.postings.get(term)
+                if postings is not None:
+                    postings.pop(chunk_id, None)
+                    if not postings:
+                        del self.postings[term]
+
+    def text(self, chunk_id: str) -> str:
+        return self.docs[chunk_id]["text"]
+
+    def _idf(self, term: str) -> float:
+        df = len(self.postings.get(term, ()))
+        return math.log(1 + (len(self.docs) - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, k: int) -> List[tuple]:
+        """
+        Returns up to `k` (chunk id, relevance) pairs, best first. Chunks
+        are ranked by BM25; the relevance (0-1) is the idf-weighted share
+        of the query's terms the chunk contains, for score thresholds.
+        """
+        terms = set(tokenize(query))
+        if not terms or not self.docs:
+            return []
+        average_length = self._total_length / len(self.docs)
+        scores, matched = {}, {}
+        total_idf = 0.0
+        for term in terms:
+            idf = self._idf(term)
+            total_idf += idf
+            for chunk_id, tf in self.postings.get(term, {}).items():
+                norm = self.k1 * (1 - self.b + self.b * self.docs[chunk_id]["length"] / average_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+                matched[chunk_id] = matched.get(chunk_id, 0.0) + idf
+        best = heapq.nlargest(k, scores, key=scores.get)
+        return [(chunk_id, matched[chunk_id] / total_idf) for chunk_id in best]
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int, rrf_k: int = 60) -> List[str]:
+    """
+    Merges ranked id lists: each id scores sum(1 / (rrf_k + rank)) over
+    the lists it appears in. Returns the top `k` ids.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(scores, key=lambda chunk_id: -scores[chunk_id])[:k]
@@ -0,0 +1,266 @@
+# Persistent content-hash -> vector cache for embeddings
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import List
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from src.config import EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_MAX_ENTRIES
+from src.observability import record_call
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+INITIAL_CAPACITY = 1024
+
+class EmbeddingCache:
+    """
+    Vectors live in one memory-mapped float32 file (one row per text);
+    a small SQLite index maps content hashes to rows and tracks last use.
+    When `max_entries` is reached the least recently used rows are reused.
+
+    Several processes (e.g. the service and a CLI run) can share the
+    directory: rows are allocated from state kept in SQLite (a high-water
+    mark and a table of freed rows) while holding an exclusive lock on
+    the `lock` file, and lookups hold a shared lock, so no two texts are
+    given the same row.
+    """
+
+    def __init__(self, directory, max_entries: int):
+        directory.mkdir(parents=True, exist_ok=True)
+        self.vectors_path = directory / "vectors.f32"
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._lock_file = open(directory / "lock", "a+b")
+        self._conn = sqlite3.connect(str(directory / "index.sqlite3"), check_same_thread=False, timeout=30)
+        self._vectors = None
+        self.dim = None
+        self.capacity = 0
+        with self._lock, self._file_lock(fcntl.LOCK_EX if fcntl else None):
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS vectors (key TEXT PRIMARY KEY, row INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS vectors_last_used ON vectors (last_used)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS free_rows (row INTEGER PRIMARY KEY)")
+            self._check_file()
+            self._migrate()
+            self._conn.commit()
+            self._remap()
+
+    @contextmanager
+    def _file_lock(self, mode):
+        # No cross-process lock where fcntl is unavailable (Windows)
+        if mode is None:
+            yield
+            return
+        fcntl.flock(self._lock_file, mode)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _meta(self) -> dict:
+        return dict(self._conn.execute("SELECT name, value FROM meta").fetchall())
+
+    def _set_meta(self, name: str, value: int):
+        self._conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, value))
+
+    def _reset(self):
+        self._conn.execute("DELETE FROM vectors")
+        self._conn.execute("DELETE FROM free_rows")
+        self._conn.execute("DELETE FROM meta")
+        if self.vectors_path.exists():
+            self.vectors_path.unlink()
+
+    def _check_file(self):
+        # The vector file must match the recorded dimension and capacity
+        meta = self._meta()
+        dim, capacity = meta.get("dim"), meta.get("capacity", 0)
+        size = self.vectors_path.stat().st_size if self.vectors_path.exists() else 0
+        if dim and size != capacity * dim * 4:
+            print(f"⚠️ Embedding cache file does not match its index ({size} bytes for {capacity}x{dim}), resetting it.")
+            self._reset()
+
+    def _migrate(self):
+        # Caches written before the allocation state moved into SQLite
+        meta = self._meta()
+        if meta.get("dim") and "next_row" not in meta:
+            used = {row for (row,) in self._conn.execute("SELECT row FROM vectors")}
+            next_row = max(used, default=-1) + 1
+            self._conn.executemany("INSERT OR IGNORE INTO free_rows (row) VALUES (?)",
+                                   [(row,) for row in range(next_row) if row not in used])
+            self._set_meta("next_row", next_row)
+
+    def _remap(self):
+        # Another process may have grown the file since it was last mapped
+        meta = self._meta()
+        dim, capacity = meta.get("dim"), meta.get("capacity", 0)
+        if dim and capacity and (self._vectors is None or capacity != self.capacity or dim != self.dim):
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(capacity, dim))
+        self.dim, self.capacity = dim, capacity
+
+    def _grow(self, capacity: int):
+        # Extend the file, then re-map it with the new shape
+        if self._vectors is not None:
+            self._vectors.flush()
+        with open(self.vectors_path, "ab") as f:
+            f.truncate(capacity * self.dim * 4)
+        self._set_meta("capacity", capacity)
+        self._remap()
+
+    def _take_row(self) -> int:
+        row = self._conn.execute("SELECT MIN(row) FROM free_rows").fetchone()[0]
+        if row is not None:
+            self._conn.execute("DELETE FROM free_rows WHERE row = ?", (row,))
+            return row
+        next_row = self._meta().get("next_row", 0)
+        if next_row >= self.capacity and self.capacity < self.max_entries:
+            self._grow(min(max(self.capacity * 2, INITIAL_CAPACITY), self.max_entries))
+        if next_row < self.capacity:
+            self._set_meta("next_row", next_row + 1)
+            return next_row
+        # Full: free the least recently used tenth of the rows
+        rows = self._conn.execute(
+            "SELECT key, row FROM vectors ORDER BY last_used LIMIT ?", (max(1, self.max_entries // 10),)
+        ).fetchall()
+        self._conn.executemany("DELETE FROM vectors WHERE key = ?", [(key,) for key, _ in rows])
+        self._conn.executemany("INSERT INTO free_rows (row) VALUES (?)", [(row,) for _, row in rows])
+        return self._take_row()
+
+    def get_many(self, keys: List[str]) -> dict:
+        if not keys:
+            return {}
+        found = {}
+        with self._lock, self._file_lock(fcntl.LOCK_SH if fcntl else None):
+            self._remap()
+            if self._vectors is None:
+                self.misses += len(set(keys))
+                return {}
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                for key, row in self._conn.execute(f"SELECT key, row FROM vectors WHERE key IN ({placeholders})", batch):
+                    found[key] = self._vectors[row].tolist()
+            now = time.time()
+            self._conn.executemany("UPDATE vectors SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+            self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(set(keys)) - len(found)
+        return found
+
+    def put_many(self, items: dict):
+        if not items:
+            return
+        with self._lock, self._file_lock(fcntl.LOCK_EX if fcntl else None):
+            self._remap()
+            dim = len(next(iter(items.values())))
+            if self.dim is None:
+                self.dim = dim
+                self._set_meta("dim", dim)
+            elif dim != self.dim:
+                print(f"⚠️ Not caching {dim}-dimensional embeddings in a {self.dim}-dimensional cache.")
+                return
+            now = time.time()
+            for key, vector in items.items():
+                existing = self._conn.execute("SELECT row FROM vectors WHERE key = ?", (key,)).fetchone()
+                row = existing[0] if existing else self._take_row()
+                self._vectors[row] = np.asarray(vector, dtype=np.float32)
+                self._conn.execute("INSERT OR REPLACE INTO vectors (key, row, last_used) VALUES (?, ?, ?)", (key, row, now))
+            self._vectors.flush()
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an Embeddings model so every text is embedded at most once.
+    Keys are a hash of the model name and the exact text, so documents
+    and queries share entries.
+    """
+
+    def __init__(self, underlying: Embeddings, cache: EmbeddingCache, model_name: str):
+        self.underlying = underlying
+        self.cache = cache
+        self.model_name = model_name
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\x00{text}".encode("utf-8")).hexdigest()
+
+    def _split(self, texts: List[str]):
+        keys = [self._key(text) for text in texts]
+        found = self.cache.get_many(keys)
+        # Each distinct missing text is embedded once
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        return keys, found, missing
+
+    def _record(self, start: float, texts: List[str], missing: dict):
+        # Token count estimated at ~4 characters per token
+        record_call("embedding", self.model_name, start, texts=len(texts),
+                    cache_hits=len(texts) - len(missing),
+                    prompt_tokens=sum(len(text) for text in missing.values()) // 4)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        start = time.perf_counter()
+        keys, found, missing = self._split(texts)
+        if missing:
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            new = dict(zip(missing.keys(), vectors))
+            self.cache.put_many(new)
+            found.update(new)
+        self._record(start, texts, missing)
+        return [found[key] for key in keys]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        start = time.perf_counter()
+        # Cache lookups and writes are blocking SQLite/memmap I/O, kept off the event loop
+        keys, found, missing = await asyncio.to_thread(self._split, texts)
+        if missing:
+            vectors = await self.underlying.aembed_documents(list(missing.values()))
+            new = dict(zip(missing.keys(), vectors))
+            await asyncio.to_thread(self.cache.put_many, new)
+            found.update(new)
+        self._record(start, texts, missing)
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        start = time.perf_counter()
+        key = self._key(text)
+        found = self.cache.get_many([key])
+        missing = {} if key in found else {key: text}
+        if missing:
+            found[key] = self.underlying.embed_query(text)
+            self.cache.put_many({key: found[key]})
+        self._record(start, [text], missing)
+        return found[key]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        start = time.perf_counter()
+        key = self._key(text)
+        found = await asyncio.to_thread(self.cache.get_many, [key])
+        missing = {} if key in found else {key: text}
+        if missing:
+            found[key] = await self.underlying.aembed_query(text)
+            await asyncio.to_thread(self.cache.put_many, {key: found[key]})
+        self._record(start, [text], missing)
+        return found[key]
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_embedding_cache() -> EmbeddingCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache(EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_MAX_ENTRIES)
+    return _cache
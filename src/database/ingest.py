@@ -0,0 +1,127 @@
+# Parallel knowledge-base ingestion: multi-process PDF parsing + concurrent embedding batches
+import argparse
+import asyncio
+import hashlib
+import time
+from concurrent.futures import ProcessPoolExecutor
+from langchain_community.document_loaders import PyPDFLoader
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from src.config import (
+    KB_DIR,
+    KB_PARSE_WORKERS,
+    KB_EMBED_CONCURRENCY,
+    KB_EMBED_BATCH_SIZE,
+    KB_UPSERT_BATCH_SIZE
+)
+
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 50
+
+def get_text_splitter():
+    return RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+
+# Bumped when the id format changes, so existing stores are re-indexed once
+CHUNK_ID_VERSION = 2
+
+def chunk_ids_for(name: str, digest: str, count: int) -> list:
+    # Deterministic ids so re-embedding a file overwrites its own chunks. The
+    # name is part of the id: identical PDFs under two names own separate chunks
+    name_hash = hashlib.sha256(name.encode("utf-8")).hexdigest()[:8]
+    return [f"{digest[:16]}-{name_hash}-{i:05d}" for i in range(count)]
+
+def _parse_pdf(name: str, path: str) -> tuple:
+    # Runs in a worker process, so it must stay a top-level function
+    return name, PyPDFLoader(path).load()
+
+async def ingest_files(vectorstore, embeddings, files: dict,
+                       max_workers: int = KB_PARSE_WORKERS,
+                       max_in_flight: int = KB_EMBED_CONCURRENCY,
+                       embed_batch_size: int = KB_EMBED_BATCH_SIZE,
+                       upsert_batch_size: int = KB_UPSERT_BATCH_SIZE,
+                       lexical_index=None) -> dict:
+    """
+    Parses `files` ({file name in KB_DIR: sha256}) across a process pool and
+    streams their splits into concurrent embedding requests, at most
+    `max_in_flight` at a time. Embedded chunks are written to Chroma in bulk
+    upserts as they arrive, and the same splits are added to `lexical_index`
+    (a BM25Index) if given. Returns the chunk ids per file plus throughput stats.
+    """
+    loop = asyncio.get_running_loop()
+    text_splitter = get_text_splitter()
+    collection = vectorstore._collection
+    semaphore = asyncio.Semaphore(max_in_flight)
+    write_lock = asyncio.Lock()
+    pending_rows = {"ids": [], "embeddings": [], "documents": [], "metadatas": []}
+    chunk_ids, embed_tasks = {}, []
+    stats = {"files": len(files), "pages": 0, "chunks": 0}
+
+    async def flush(force: bool = False):
+        async with write_lock:
+            if not pending_rows["ids"] or (not force and len(pending_rows["ids"]) < upsert_batch_size):
+                return
+            rows = {key: values[:] for key, values in pending_rows.items()}
+            for values in pending_rows.values():
+                values.clear()
+            await asyncio.to_thread(collection.upsert, **rows)
+
+    async def embed_batch(ids: list, splits: list):
+        texts = [split.page_content for split in splits]
+        async with semaphore:
+            vectors = await embeddings.aembed_documents(texts)
+        pending_rows["ids"].extend(ids)
+        pending_rows["embeddings"].extend(vectors)
+        pending_rows["documents"].extend(texts)
+        pending_rows["metadatas"].extend(split.metadata for split in splits)
+        await flush()
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        parse_jobs = [
+            loop.run_in_executor(pool, _parse_pdf, name, str(KB_DIR / name)) for name in files
+        ]
+        for parsed in asyncio.as_completed(parse_jobs):
+            name, pages = await parsed
+            splits = text_splitter.split_documents(pages)
+            ids = chunk_ids_for(name, files[name], len(splits))
+            chunk_ids[name] = ids
+            if lexical_index is not None:
+                lexical_index.add(ids, [split.page_content for split in splits])
+            stats["pages"] += len(pages)
+            stats["chunks"] += len(splits)
+            print(f"Parsed {name}: {len(pages)} pages, {len(splits)} chunks")
+
+            for i in range(0, len(splits), embed_batch_size):
+                embed_tasks.append(asyncio.create_task(
+                    embed_batch(ids[i:i + embed_batch_size], splits[i:i + embed_batch_size])
+                ))
+
+    await asyncio.gather(*embed_tasks)
+    await flush(force=True)
+
+    elapsed = time.perf_counter() - start
+    stats["elapsed_s"] = round(elapsed, 3)
+    stats["pages_per_s"] = round(stats["pages"] / elapsed, 2) if elapsed > 0 else 0.0
+    stats["chunks_per_s"] = round(stats["chunks"] / elapsed, 2) if elapsed > 0 else 0.0
+    return {"chunk_ids": chunk_ids, "stats": stats}
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or refresh the knowledge-base index.")
+    parser.add_argument("--rebuild", action="store_true", help="Drop the index and re-embed every PDF")
+    args = parser.parse_args()
+
+    from src.database.vector_ops import open_vectorstore, refresh_knowledge_base, reset_knowledge_base
+
+    vectorstore = open_vectorstore()
+    if args.rebuild:
+        vectorstore = reset_knowledge_base(vectorstore)
+
+    summary, _ = refresh_knowledge_base(vectorstore)
+    stats = summary.get("ingest")
+    if stats:
+        print(f"📊 {stats['files']} files, {stats['pages']} pages, {stats['chunks']} chunks in {stats['elapsed_s']:.1f}s "
+              f"({stats['pages_per_s']:.1f} pages/s, {stats['chunks_per_s']:.1f} chunks/s)")
+    else:
+        print("📊 Knowledge Base already up to date.")
+
+if __name__ == "__main__":
+    main()
@@ -1,54 +1,290 @@
 #Enbedding and querying logic for vector DB
+import asyncio
+import contextvars
+import json
 import os
-from langchain_community.document_loaders import PyPDFLoader, DirectoryLoader
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List
 from langchain_openai import OpenAIEmbeddings
 from langchain_chroma import Chroma
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from src.config import OPENAI_API_KEY, SILICON_FLOW_BASE_URL, VECTOR_DB_PATH, KB_DIR
+from src.config import (
+    OPENAI_API_KEY,
+    SILICON_FLOW_BASE_URL,
+    VECTOR_DB_PATH,
+    KB_DIR,
+    KB_MANIFEST_PATH,
+    BM25_INDEX_PATH,
+    KB_RETRIEVAL_MODE,
+    KB_TOP_K,
+    KB_SCORE_THRESHOLD,
+    KB_FUSION_CANDIDATES,
+    KB_DENSE_TIMEOUT_S
+)
+from src.database.bm25 import BM25Index, reciprocal_rank_fusion
+from src.database.embedding_cache import CachedEmbeddings, get_embedding_cache
+from src.database.ingest import CHUNK_SIZE, CHUNK_OVERLAP, CHUNK_ID_VERSION, ingest_files
+from src.ingestion.pdf_loader import file_sha256
 
-def setup_knowledge_base():
-    """
-    Ingests PDFs from the knowledge base directory, splits them, 
-    and returns a retriever. Uses persistent storage.
-    """
-    
+COLLECTION_NAME = "essay_kb"
+EMBEDDING_MODEL = "BAAI/bge-m3"
+
+def get_embeddings(request_timeout: float = None, max_retries: int = 2):
     # define embeddings model
     # SiliconFlow hosts open-source embedding models that can be used with LangChain
     embeddings = OpenAIEmbeddings(
-        model="BAAI/bge-m3",
+        model=EMBEDDING_MODEL,
         api_key=OPENAI_API_KEY,
         base_url=SILICON_FLOW_BASE_URL,
         # Crucial for SiliconFlow/Local providers to avoid dimension errors
         check_embedding_ctx_length=False,
-        chunk_size=64
+        chunk_size=64,
+        request_timeout=request_timeout,
+        max_retries=max_retries
     )
+    # Identical chunk text and repeated queries are only embedded once
+    return CachedEmbeddings(embeddings, get_embedding_cache(), EMBEDDING_MODEL)
+
+# --- Manifest ---
+# {"chunking": {...}, "files": {"<file name>": {"sha256": ..., "chunk_ids": [...]}}}
+def _chunking_params() -> dict:
+    return {"chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP, "chunk_ids": CHUNK_ID_VERSION}
+
+def load_manifest():
+    if not KB_MANIFEST_PATH.exists():
+        return None
+    with open(KB_MANIFEST_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_manifest(manifest: dict):
+    tmp_path = f"{KB_MANIFEST_PATH}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, KB_MANIFEST_PATH)
+
+def _manifest_from_store(vectorstore) -> dict:
+    """
+    Rebuilds a manifest for a store created before manifests existed, by
+    grouping the stored chunk ids by their source file. Files are assumed
+    unchanged since they were embedded.
+    """
+    files = {}
+    stored = vectorstore.get(include=["metadatas"])
+    for chunk_id, metadata in zip(stored["ids"], stored["metadatas"]):
+        name = Path((metadata or {}).get("source", "")).name
+        files.setdefault(name, {"sha256": None, "chunk_ids": []})["chunk_ids"].append(chunk_id)
+
+    for name, entry in files.items():
+        path = KB_DIR / name
+        if path.exists():
+            entry["sha256"] = file_sha256(path)
+    return {"chunking": _chunking_params(), "files": files}
+
+def diff_knowledge_base(manifest: dict) -> tuple:
+    """
+    Compares the PDFs in KB_DIR against the manifest.
+    Returns (files to embed as {name: sha256}, names of removed files).
+    """
+    current = {path.name: file_sha256(path) for path in sorted(KB_DIR.glob("*.pdf"))}
+    known = manifest["files"]
+    rechunk = manifest.get("chunking") != _chunking_params()
+
+    to_embed = {
+        name: digest for name, digest in current.items()
+        if rechunk or name not in known or known[name]["sha256"] != digest
+    }
+    removed = [name for name in known if name not in current]
+    return to_embed, removed
+
+# --- Knowledge Base ---
+def open_vectorstore():
+    return Chroma(
+        persist_directory=str(VECTOR_DB_PATH),
+        embedding_function=get_embeddings(),
+        collection_name=COLLECTION_NAME)
+
+def reset_knowledge_base(vectorstore):
+    """
+    Drops the collection and its manifest; returns a fresh, empty store.
+    """
+    print("Dropping existing Knowledge Base...")
+    vectorstore.delete_collection()
+    for path in (KB_MANIFEST_PATH, BM25_INDEX_PATH):
+        if path.exists():
+            path.unlink()
+    return open_vectorstore()
+
+def _sync_lexical_index(vectorstore, lexical_index: BM25Index, files: dict) -> bool:
+    """
+    Makes the BM25 index hold exactly the manifest's chunks, copying
+    missing ones from Chroma (e.g. for a store built before the index
+    existed). Returns True if the index changed.
+    """
+    expected = {chunk_id for entry in files.values() for chunk_id in entry["chunk_ids"]}
+    indexed = lexical_index.ids()
+    missing, stale = expected - indexed, indexed - expected
+    if missing:
+        stored = vectorstore.get(ids=sorted(missing), include=["documents"])
+        lexical_index.add(stored["ids"], stored["documents"])
+    lexical_index.remove(sorted(stale))
+    return bool(missing or stale)
+
+async def _ingest_with_own_client(vectorstore, files: dict, lexical_index: BM25Index) -> dict:
+    # A client of its own, closed before its loop ends, so none of its
+    # connections outlive the loop (the store's client is left untouched)
+    embeddings = get_embeddings()
+    try:
+        return await ingest_files(vectorstore, embeddings, files, lexical_index=lexical_index)
+    finally:
+        await embeddings.underlying.async_client._client.close()
+
+def _run_ingest(vectorstore, files: dict, lexical_index: BM25Index) -> dict:
+    # On a dedicated loop in a worker thread, so a refresh also works from a
+    # thread that is already running a loop; the context keeps the run profile
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="kb-ingest") as pool:
+        coroutine = _ingest_with_own_client(vectorstore, files, lexical_index)
+        return pool.submit(contextvars.copy_context().run, asyncio.run, coroutine).result()
 
-    if os.path.exists(VECTOR_DB_PATH) and os.listdir(VECTOR_DB_PATH):
-        print("Loading existing Vector Store...")
-        vectorstore = Chroma(
-            persist_directory=str(VECTOR_DB_PATH),
-            embedding_function=embeddings,
-            collection_name="essay_kb")
-    else:
-        print("Creating new Knowledge Base from documents...")
-        # load knowledge base documents
-        loader = DirectoryLoader(str(KB_DIR), glob="./*.pdf", loader_cls=PyPDFLoader)
-        docs = loader.load()
-        
-        if not docs:
-            print("Warning: No documents found in Knowledge Base folder.")
+def refresh_knowledge_base(vectorstore) -> tuple:
+    """
+    Brings the vector store and the BM25 index in line with KB_DIR:
+    embeds only new or changed PDFs and deletes the chunks of removed ones.
+    Returns the summary and the BM25 index.
+    """
+    manifest = load_manifest()
+    if manifest is None:
+        manifest = _manifest_from_store(vectorstore)
+    lexical_index = BM25Index.load(BM25_INDEX_PATH)
+    lexical_changed = lexical_index is None
+    lexical_index = lexical_index or BM25Index()
+
+    to_embed, removed = diff_knowledge_base(manifest)
+    files = manifest["files"]
+
+    for name in removed:
+        print(f"Removing {name} from Knowledge Base...")
+        if files[name]["chunk_ids"]:
+            vectorstore.delete(ids=files[name]["chunk_ids"])
+            lexical_index.remove(files[name]["chunk_ids"])
+        del files[name]
+
+    for name in to_embed:
+        old_ids = files.get(name, {}).get("chunk_ids", [])
+        if old_ids:
+            vectorstore.delete(ids=old_ids)
+            lexical_index.remove(old_ids)
+
+    summary = {"embedded": sorted(to_embed), "removed": removed}
+    if to_embed:
+        print(f"Embedding {len(to_embed)} files into Knowledge Base...")
+        ingested = _run_ingest(vectorstore, to_embed, lexical_index)
+        for name, digest in to_embed.items():
+            files[name] = {"sha256": digest, "chunk_ids": ingested["chunk_ids"][name]}
+        summary["ingest"] = ingested["stats"]
+
+    manifest["chunking"] = _chunking_params()
+    save_manifest(manifest)
+    if _sync_lexical_index(vectorstore, lexical_index, files) or lexical_changed or to_embed or removed:
+        lexical_index.save(BM25_INDEX_PATH)
+
+    summary["unchanged"] = len(files) - len(to_embed)
+    if to_embed or removed:
+        print(f"Knowledge Base refreshed: {len(to_embed)} embedded, {len(removed)} removed, {summary['unchanged']} unchanged.")
+    return summary, lexical_index
+
+# --- Retrieval ---
+RETRIEVAL_MODES = ("hybrid", "dense", "lexical")
+NO_RESULTS = "No relevant passages found in the knowledge base."
+
+class KnowledgeBaseRetriever:
+    """
+    Searches the knowledge base with BM25 ("lexical"), vector similarity
+    ("dense"), or both merged by reciprocal-rank fusion ("hybrid"). BM25
+    catches the exact names, numbers and years fact claims are made of.
+    In hybrid mode a query embedding that fails or takes longer than
+    KB_DENSE_TIMEOUT_S falls back to the BM25 results alone; the timeout
+    is set on the HTTP client, so a stalled request is aborted rather
+    than left running.
+    """
+
+    def __init__(self, vectorstore, lexical_index: BM25Index, mode: str = KB_RETRIEVAL_MODE,
+                 k: int = KB_TOP_K, score_threshold: float = KB_SCORE_THRESHOLD):
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode {mode!r}, expected one of {RETRIEVAL_MODES}")
+        self.vectorstore = vectorstore
+        self.lexical_index = lexical_index
+        self.mode = mode
+        self.k = k
+        self.score_threshold = score_threshold
+        # Same model and embedding cache, but one attempt bounded by the timeout
+        self.query_embeddings = (get_embeddings(request_timeout=KB_DENSE_TIMEOUT_S, max_retries=0)
+                                 if mode == "hybrid" else vectorstore.embeddings)
+
+    def _dense(self, queries: List[str], n: int) -> List[dict]:
+        # One batched embedding request and one bulk Chroma query for all queries
+        vectors = self.query_embeddings.embed_documents(queries)
+        results = self.vectorstore._collection.query(
+            query_embeddings=vectors, n_results=n, include=["documents", "distances"],
+        )
+        relevance = self.vectorstore._select_relevance_score_fn()
+        return [
+            {chunk_id: (text, relevance(distance)) for chunk_id, text, distance in zip(ids, texts, distances)}
+            for ids, texts, distances in zip(results["ids"], results["documents"], results["distances"])
+        ]
+
+    def _dense_or_none(self, queries: List[str], n: int):
+        if self.mode == "dense":
+            return self._dense(queries, n)
+        try:
+            return self._dense(queries, n)
+        except Exception as e:
+            print(f"Dense retrieval unavailable ({type(e).__name__}: {e}), using BM25 results only.")
             return None
 
-        # split documents
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-        splits = text_splitter.split_documents(docs)
-        
-        vectorstore = Chroma.from_documents(
-                documents=splits, 
-                embedding=embeddings,
-                collection_name="essay_kb",
-                persist_directory=str(VECTOR_DB_PATH)
-            )
-
-    retriever = vectorstore.as_retriever(search_kwargs={"k": 2})
-    return retriever
\ No newline at end of file
+    def search_many(self, queries: List[str], k: int = None, score_threshold: float = None) -> List[List[str]]:
+        """
+        Returns the texts of the `k` best chunks for each query. With a
+        positive `score_threshold`, chunks below that relevance (0-1) in
+        the list they were found in are dropped before fusion.
+        """
+        if not queries:
+            return []
+        k = k or self.k
+        threshold = self.score_threshold if score_threshold is None else score_threshold
+        # Dense relevance can be negative for far-off chunks, so 0 must not filter
+        keep = (lambda score: score >= threshold) if threshold > 0 else (lambda score: True)
+        n = max(k, KB_FUSION_CANDIDATES) if self.mode == "hybrid" else k
+        dense = None if self.mode == "lexical" else self._dense_or_none(queries, n)
+
+        results = []
+        for i, query in enumerate(queries):
+            texts, rankings = {}, []
+            if dense is not None:
+                hits = [(chunk_id, text) for chunk_id, (text, score) in dense[i].items() if keep(score)]
+                texts.update(hits)
+                rankings.append([chunk_id for chunk_id, _ in hits])
+            if self.mode != "dense":
+                hits = [chunk_id for chunk_id, score in self.lexical_index.search(query, n) if keep(score)]
+                texts.update((chunk_id, self.lexical_index.text(chunk_id)) for chunk_id in hits)
+                rankings.append(hits)
+            results.append([texts[chunk_id] for chunk_id in reciprocal_rank_fusion(rankings, k)])
+        return results
+
+    def search(self, query: str, k: int = None, score_threshold: float = None) -> List[str]:
+        return self.search_many([query], k, score_threshold)[0]
+
+def setup_knowledge_base():
+    """
+    Opens the persistent vector store, embeds any new or changed PDFs
+    from the knowledge base directory, and returns a KnowledgeBaseRetriever.
+    """
+    print("Loading Vector Store...")
+    vectorstore = open_vectorstore()
+
+    _, lexical_index = refresh_knowledge_base(vectorstore)
+
+    if not load_manifest()["files"]:
+        print("Warning: No documents found in Knowledge Base folder.")
+        return None
+
+    return KnowledgeBaseRetriever(vectorstore, lexical_index)
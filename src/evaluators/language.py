@@ -1,10 +1,10 @@
 # Language and grammar scoring
 from typing import List
 from pydantic import BaseModel, Field
-from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
-from src.observability import get_langfuse_handler
-from src.config import OPENAI_API_KEY, SILICON_FLOW_BASE_URL
+from src.observability import get_callbacks
+from src.models import get_chat_model
+from src.evaluators.sections import split_sections, label_section, weighted_score, unique, most_common, successful_sections
 
 # --- Schemas ---
 class GrammarError(BaseModel):
@@ -32,16 +32,8 @@ class LanguageAnalysisResult(BaseModel):
     summary_critique: str = Field(..., description="A concise summary of linguistic quality.")
 
 # --- Logic ---
-def check_language(essay_text: str):
-
-    callback = get_langfuse_handler()
-
-    llm = ChatOpenAI(
-        model="deepseek-ai/DeepSeek-V3",
-        openai_api_key=OPENAI_API_KEY,
-        openai_api_base=SILICON_FLOW_BASE_URL,
-        temperature=0
-    )
+def _build_language_chain():
+    llm = get_chat_model(temperature=0)
     structured_llm = llm.with_structured_output(LanguageAnalysisResult)
 
     system_prompt = """
@@ -55,16 +47,81 @@ def check_language(essay_text: str):
         ("human", "Here is the student's essay:\n\n{text}")
     ])
 
-    chain = prompt | structured_llm
-    
-    print("Analyzing Language...")
+    return prompt | structured_llm
+
+def _language_inputs(essay_text: str):
+    sections = split_sections(essay_text)
+    return sections, [{"text": label_section(section, i, len(sections))} for i, section in enumerate(sections)]
+
+def _merge_language(results: List[dict], weights: List[int]) -> dict:
+    """
+    Combines per-section analyses without another LLM call: grammar issues
+    and word lists are concatenated, scores are token-weighted means, and
+    the tone and written feedback are taken from the largest section.
+    """
+    largest = max(range(len(results)), key=lambda i: weights[i])
+    vocabularies = [result["vocabulary"] for result in results]
+    structures = [result["structure"] for result in results]
+    return {
+        "grammar_issues": [issue for result in results for issue in result["grammar_issues"]],
+        "vocabulary": {
+            "score": weighted_score([v["score"] for v in vocabularies], weights),
+            "repetitive_words": unique([word for v in vocabularies for word in v["repetitive_words"]]),
+            "advanced_words_used": unique([word for v in vocabularies for word in v["advanced_words_used"]]),
+            "feedback": vocabularies[largest]["feedback"],
+        },
+        "structure": {
+            "sentence_variety_score": weighted_score([s["sentence_variety_score"] for s in structures], weights),
+            "flow_issues": unique([issue for s in structures for issue in s["flow_issues"]]),
+            "feedback": structures[largest]["feedback"],
+        },
+        "overall_tone": most_common([result["overall_tone"] for result in results], weights),
+        "summary_critique": results[largest]["summary_critique"],
+    }
+
+def _language_config() -> dict:
+    return {"callbacks": get_callbacks(),
+            "metadata": {"langfuse_tags": ["language-analysis"]}}
+
+def check_language(essay_text: str, stats: dict = None):
+    """
+    Essays longer than ESSAY_SECTION_MAX_TOKENS are analyzed section by
+    section (concurrently) and merged deterministically. Sections that
+    fail are left out of the merge and counted in `stats["failed_sections"]`
+    if `stats` is given.
+    """
+    chain = _build_language_chain()
+    sections, inputs = _language_inputs(essay_text)
+
+    print("Analyzing Language..." if len(sections) == 1 else f"Analyzing Language in {len(sections)} sections...")
+    try:
+        if len(sections) == 1:
+            return chain.invoke(inputs[0], config=_language_config()).model_dump()
+
+        results, weights, _ = successful_sections(
+            sections, chain.batch(inputs, config=_language_config(), return_exceptions=True), "language analysis", stats
+        )
+        return _merge_language(results, weights) if results else None
+    except Exception as e:
+        print(f"Error during language analysis: {e}")
+        return None
+
+async def acheck_language(essay_text: str, stats: dict = None):
+    """
+    Async variant of `check_language` so it can overlap with other stages.
+    """
+    chain = _build_language_chain()
+    sections, inputs = _language_inputs(essay_text)
+
+    print("Analyzing Language..." if len(sections) == 1 else f"Analyzing Language in {len(sections)} sections...")
     try:
-        result = chain.invoke({"text": essay_text}, 
-                              config={
-                                  "callbacks": [callback], 
-                                  "metadata": {"langfuse_tags": ["language-analysis"]},
-                                  })
-        return result.model_dump()
+        if len(sections) == 1:
+            return (await chain.ainvoke(inputs[0], config=_language_config())).model_dump()
+
+        results, weights, _ = successful_sections(
+            sections, await chain.abatch(inputs, config=_language_config(), return_exceptions=True), "language analysis", stats
+        )
+        return _merge_language(results, weights) if results else None
     except Exception as e:
         print(f"Error during language analysis: {e}")
-        return None
\ No newline at end of file
+        return None
@@ -1,10 +1,11 @@
 # Logic scoring 
-from typing import List
+import json
+from typing import List, Optional
 from pydantic import BaseModel, Field
-from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
-from src.observability import get_langfuse_handler
-from src.config import OPENAI_API_KEY, SILICON_FLOW_BASE_URL
+from src.observability import get_callbacks
+from src.models import get_chat_model
+from src.evaluators.sections import split_sections, label_section, weighted_score, unique, successful_sections
 
 # --- Schemas ---
 class LogicalFallacy(BaseModel):
@@ -19,8 +20,9 @@ class RelevanceAnalysis(BaseModel):
     missing_key_points: List[str] = Field(..., description="List of key concepts missing.")
 
 class StructureAnalysis(BaseModel):
-    has_clear_intro: bool = Field(..., description="Does it have a distinct introduction?")
-    has_clear_conclusion: bool = Field(..., description="Does it have a distinct conclusion?")
+    # None in merged results when the first / last section could not be analyzed
+    has_clear_intro: Optional[bool] = Field(..., description="Does it have a distinct introduction?")
+    has_clear_conclusion: Optional[bool] = Field(..., description="Does it have a distinct conclusion?")
     flow_score: int = Field(..., description="Score 1-10.")
     structural_weaknesses: List[str] = Field(..., description="List of specific structural issues.")
 
@@ -31,17 +33,13 @@ class LogicAnalysisResult(BaseModel):
     argument_strength_score: int = Field(..., description="Score 1-10 on overall persuasiveness.")
     summary_critique: str = Field(..., description="A concise summary of the logical quality.")
 
-# --- Logic ---
-def check_logic(essay_text: str, essay_question: str):
-
-    callback = get_langfuse_handler()
+class LogicReduceResult(BaseModel):
+    relevance: RelevanceAnalysis = Field(..., description="Analysis of how well the whole essay answers the prompt.")
+    summary_critique: str = Field(..., description="A concise summary of the logical quality of the whole essay.")
 
-    llm = ChatOpenAI(
-        model="deepseek-ai/DeepSeek-V3",
-        openai_api_key=OPENAI_API_KEY,
-        openai_api_base=SILICON_FLOW_BASE_URL,
-        temperature=0
-    )
+# --- Logic ---
+def _build_logic_chain():
+    llm = get_chat_model(temperature=0)
     structured_llm = llm.with_structured_output(LogicAnalysisResult)
 
     system_prompt = """
@@ -54,17 +52,137 @@ def check_logic(essay_text: str, essay_question: str):
         ("human", "Essay Question: {question}\n\nStudent Essay Content:\n{essay_content}")
     ])
 
-    chain = prompt | structured_llm
-    
-    print(f"Analyzing Logic...")
+    return prompt | structured_llm
+
+def _build_logic_reduce_chain():
+    llm = get_chat_model(temperature=0)
+    structured_llm = llm.with_structured_output(LogicReduceResult)
+
+    system_prompt = """
+    You are a strict Essay Editor and Logic Expert.
+    A long essay was analyzed excerpt by excerpt. Using the findings for every excerpt, judge the **Relevance** of the whole essay against the provided Question and summarize its logical quality.
+    """
+
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", system_prompt),
+        ("human", "Essay Question: {question}\n\nFindings per excerpt:\n{section_findings}")
+    ])
+
+    return prompt | structured_llm
+
+def _logic_inputs(essay_text: str, essay_question: str):
+    sections = split_sections(essay_text)
+    inputs = [
+        {"question": essay_question, "essay_content": label_section(section, i, len(sections))}
+        for i, section in enumerate(sections)
+    ]
+    return sections, inputs
+
+def _reduce_inputs(essay_question: str, results: List[dict], indices: List[int]) -> dict:
+    findings = [
+        {"excerpt": i + 1, "relevance": result["relevance"], "summary_critique": result["summary_critique"]}
+        for i, result in zip(indices, results)
+    ]
+    return {"question": essay_question, "section_findings": json.dumps(findings, indent=2)}
+
+def _merge_logic(results: List[dict], weights: List[int], indices: List[int], section_count: int,
+                 reduced: Optional[LogicReduceResult]) -> dict:
+    """
+    Combines the analyses of the sections that succeeded (`indices` of
+    `section_count`): lists are concatenated, scores are token-weighted
+    means, the introduction is judged on the first section and the
+    conclusion on the last, or None if that section's analysis failed.
+    Relevance and the summary come from the reduce call; without it they
+    are derived from the sections.
+    """
+    if reduced is not None:
+        relevance = reduced.relevance.model_dump()
+        summary_critique = reduced.summary_critique
+    else:
+        relevances = [result["relevance"] for result in results]
+        relevance = {
+            "is_off_topic": all(r["is_off_topic"] for r in relevances),
+            "score": weighted_score([r["score"] for r in relevances], weights),
+            "thesis_alignment": relevances[0]["thesis_alignment"],
+            # A point is only missing if no section covers it
+            "missing_key_points": [
+                point for point in unique(relevances[0]["missing_key_points"])
+                if all(point.lower() in map(str.lower, r["missing_key_points"]) for r in relevances)
+            ],
+        }
+        summary_critique = " ".join(result["summary_critique"] for result in results)
+
+    structures = [result["structure"] for result in results]
+    return {
+        "relevance": relevance,
+        "structure": {
+            "has_clear_intro": structures[0]["has_clear_intro"] if indices[0] == 0 else None,
+            "has_clear_conclusion": structures[-1]["has_clear_conclusion"] if indices[-1] == section_count - 1 else None,
+            "flow_score": weighted_score([s["flow_score"] for s in structures], weights),
+            "structural_weaknesses": unique([w for s in structures for w in s["structural_weaknesses"]]),
+        },
+        "identified_fallacies": [fallacy for result in results for fallacy in result["identified_fallacies"]],
+        "argument_strength_score": weighted_score([result["argument_strength_score"] for result in results], weights),
+        "summary_critique": summary_critique,
+    }
+
+def _logic_config() -> dict:
+    return {"callbacks": get_callbacks(),
+            "metadata": {"langfuse_tags": ["logic-analysis"]}}
+
+def check_logic(essay_text: str, essay_question: str, stats: dict = None):
+    """
+    Essays longer than ESSAY_SECTION_MAX_TOKENS are analyzed section by
+    section (concurrently) and merged; one extra call judges relevance.
+    Sections that fail are left out of the merge and counted in
+    `stats["failed_sections"]` if `stats` is given.
+    """
+    chain = _build_logic_chain()
+    sections, inputs = _logic_inputs(essay_text, essay_question)
+
+    print(f"Analyzing Logic..." if len(sections) == 1 else f"Analyzing Logic in {len(sections)} sections...")
+    try:
+        if len(sections) == 1:
+            return chain.invoke(inputs[0], config=_logic_config()).model_dump()
+
+        results, weights, indices = successful_sections(
+            sections, chain.batch(inputs, config=_logic_config(), return_exceptions=True), "logic analysis", stats
+        )
+        if not results:
+            return None
+        try:
+            reduced = _build_logic_reduce_chain().invoke(_reduce_inputs(essay_question, results, indices), config=_logic_config())
+        except Exception as e:
+            print(f"Error during logic relevance reduce, using section results: {e}")
+            reduced = None
+        return _merge_logic(results, weights, indices, len(sections), reduced)
+    except Exception as e:
+        print(f"Error during logic analysis: {e}")
+        return None
+
+async def acheck_logic(essay_text: str, essay_question: str, stats: dict = None):
+    """
+    Async variant of `check_logic` so it can overlap with other stages.
+    """
+    chain = _build_logic_chain()
+    sections, inputs = _logic_inputs(essay_text, essay_question)
+
+    print(f"Analyzing Logic..." if len(sections) == 1 else f"Analyzing Logic in {len(sections)} sections...")
     try:
-        result = chain.invoke({
-            "question": essay_question, 
-            "essay_content": essay_text}, 
-            config={"callbacks": [callback], 
-                    "metadata": {"langfuse_tags": ["logic-analysis"]}
-                    })
-        return result.model_dump()
+        if len(sections) == 1:
+            return (await chain.ainvoke(inputs[0], config=_logic_config())).model_dump()
+
+        results, weights, indices = successful_sections(
+            sections, await chain.abatch(inputs, config=_logic_config(), return_exceptions=True), "logic analysis", stats
+        )
+        if not results:
+            return None
+        try:
+            reduced = await _build_logic_reduce_chain().ainvoke(_reduce_inputs(essay_question, results, indices), config=_logic_config())
+        except Exception as e:
+            print(f"Error during logic relevance reduce, using section results: {e}")
+            reduced = None
+        return _merge_logic(results, weights, indices, len(sections), reduced)
     except Exception as e:
         print(f"Error during logic analysis: {e}")
-        return None
\ No newline at end of file
+        return None
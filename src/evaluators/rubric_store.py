@@ -0,0 +1,93 @@
+# Reuse extracted rubrics and question text across essays, keyed by PDF hash
+import asyncio
+import hashlib
+import json
+import os
+from pathlib import Path
+from src.config import RUBRIC_STORE_DIR, LLM_MODEL
+from src.evaluators import rubrics
+from src.evaluators.rubrics import aextract_rubric_data, extract_rubric_data
+from src.ingestion.pdf_loader import file_sha256, load_pdf_as_text, aload_pdf_as_text
+
+# Part of every key: editing the extraction prompt/schema or changing the
+# model makes stored rubrics stale
+EXTRACTOR_VERSION = hashlib.sha256(
+    Path(rubrics.__file__).read_bytes() + LLM_MODEL.encode("utf-8")
+).hexdigest()[:12]
+
+def _rubric_key(rubric_pdf_path) -> str:
+    return f"{file_sha256(rubric_pdf_path)}_{EXTRACTOR_VERSION}"
+
+# In-memory layer on top of the files in RUBRIC_STORE_DIR
+_rubrics = {}
+_inflight = {}
+
+def _write_atomic(path, text: str):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+def _load_rubric(digest: str):
+    if digest in _rubrics:
+        return _rubrics[digest]
+    path = RUBRIC_STORE_DIR / f"rubric_{digest}.json"
+    if path.exists():
+        with open(path, "r", encoding="utf-8") as f:
+            _rubrics[digest] = json.load(f)
+        return _rubrics[digest]
+    return None
+
+def _save_rubric(digest: str, rubric_data: dict):
+    # Failed extractions (None) are not stored so the next essay retries
+    if rubric_data is None:
+        return
+    _rubrics[digest] = rubric_data
+    _write_atomic(RUBRIC_STORE_DIR / f"rubric_{digest}.json", json.dumps(rubric_data, indent=2))
+
+def get_rubric_data(rubric_pdf_path):
+    """
+    Returns the extracted rubric for this PDF, running `extract_rubric_data`
+    only the first time a given rubric file is seen.
+    """
+    digest = _rubric_key(rubric_pdf_path)
+    rubric_data = _load_rubric(digest)
+    if rubric_data is None:
+        rubric_data = extract_rubric_data(load_pdf_as_text(rubric_pdf_path))
+        _save_rubric(digest, rubric_data)
+    else:
+        print(f"Reusing stored rubric {digest[:12]}")
+    return rubric_data
+
+async def aget_rubric_data(rubric_pdf_path):
+    """
+    Async variant of `get_rubric_data`. Concurrent callers for the same
+    rubric share a single extraction.
+    """
+    digest = await asyncio.to_thread(_rubric_key, rubric_pdf_path)
+    rubric_data = _load_rubric(digest)
+    if rubric_data is not None:
+        print(f"Reusing stored rubric {digest[:12]}")
+        return rubric_data
+
+    if digest not in _inflight:
+        async def extract():
+            try:
+                rubric_text = await aload_pdf_as_text(rubric_pdf_path)
+                rubric_data = await aextract_rubric_data(rubric_text)
+                _save_rubric(digest, rubric_data)
+                return rubric_data
+            finally:
+                _inflight.pop(digest, None)
+        _inflight[digest] = asyncio.ensure_future(extract())
+    return await asyncio.shield(_inflight[digest])
+
+def get_question_text(question_pdf_path) -> str:
+    """
+    Returns the parsed text of the essay question. Parsed PDFs are cached
+    by file hash, so each distinct question PDF is only parsed once.
+    """
+    return load_pdf_as_text(question_pdf_path)
+
+async def aget_question_text(question_pdf_path) -> str:
+    return await aload_pdf_as_text(question_pdf_path)
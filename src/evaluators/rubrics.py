@@ -1,10 +1,9 @@
 # Rubric extraction logic
 from typing import List, Optional
 from pydantic import BaseModel, Field
-from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
-from src.observability import get_langfuse_handler
-from src.config import OPENAI_API_KEY, SILICON_FLOW_BASE_URL
+from src.observability import get_callbacks
+from src.models import get_chat_model
 
 # --- Schemas ---
 class PerformanceLevel(BaseModel):
@@ -33,16 +32,8 @@ class RubricExtractionResult(BaseModel):
     criteria: List[AssessmentCriterion]
 
 # --- Logic ---
-def extract_rubric_data(rubric_text: str):
-
-    callback = get_langfuse_handler()
-
-    llm = ChatOpenAI(
-        model="deepseek-ai/DeepSeek-V3",
-        openai_api_key=OPENAI_API_KEY,
-        openai_api_base=SILICON_FLOW_BASE_URL,
-        temperature=0
-    )
+def _build_rubric_chain():
+    llm = get_chat_model(temperature=0)
     structured_llm = llm.with_structured_output(RubricExtractionResult)
 
     system_prompt = """
@@ -60,15 +51,38 @@ def extract_rubric_data(rubric_text: str):
         ("human", "{text}")
     ])
 
-    chain = prompt | structured_llm
+    return prompt | structured_llm
+
+def extract_rubric_data(rubric_text: str):
+
+    callbacks = get_callbacks()
+    chain = _build_rubric_chain()
     
     print("Digitizing Rubric...")
     try:
         result = chain.invoke({"text": rubric_text},
-                              config={"callbacks": [callback],
+                              config={"callbacks": callbacks,
                                       "metadata": {"langfuse_tags": ["rubric-extraction"]},
                                       })
         return result.model_dump()
+    except Exception as e:
+        print(f"Error during rubric extraction: {e}")
+        return None
+
+async def aextract_rubric_data(rubric_text: str):
+    """
+    Async variant of `extract_rubric_data` so it can overlap with other stages.
+    """
+    callbacks = get_callbacks()
+    chain = _build_rubric_chain()
+
+    print("Digitizing Rubric...")
+    try:
+        result = await chain.ainvoke({"text": rubric_text},
+                                     config={"callbacks": callbacks,
+                                             "metadata": {"langfuse_tags": ["rubric-extraction"]},
+                                             })
+        return result.model_dump()
     except Exception as e:
         print(f"Error during rubric extraction: {e}")
         return None
\ No newline at end of file
@@ -0,0 +1,101 @@
+# Section splitting and deterministic merging for map-reduce essay analysis
+import re
+from collections import Counter
+from typing import List
+from src.config import ESSAY_SECTION_MAX_TOKENS
+from src.tokens import count_tokens, split_by_tokens
+
+# Markdown headings, numbered headings ("2. Method", "3.1 Results") and
+# lines naming a usual essay section. Plain short lines are not treated as
+# headings because PDF text wraps mid-sentence.
+HEADING_PATTERN = re.compile(
+    r"^(?:#{1,6}\s+\S.*"
+    r"|\d+(?:\.\d+)*\.?\s+[A-Z][^.!?]{0,80}"
+    r"|(?i:abstract|introduction|background|literature review|method(?:s|ology)?|results|discussion|"
+    r"conclusions?|references|bibliography)\b[^.!?]{0,40})$"
+)
+
+def _split_on_headings(text: str) -> List[str]:
+    sections, current = [], []
+    for line in text.splitlines():
+        if HEADING_PATTERN.match(line.strip()) and any(part.strip() for part in current):
+            sections.append("\n".join(current).strip())
+            current = []
+        current.append(line)
+    if any(part.strip() for part in current):
+        sections.append("\n".join(current).strip())
+    return sections
+
+def split_sections(text: str, max_tokens: int = ESSAY_SECTION_MAX_TOKENS) -> List[str]:
+    """
+    Splits an essay into sections of at most `max_tokens` for map-reduce
+    analysis. Essays that fit are returned whole, as one section. Longer
+    ones are cut at headings, neighbouring small sections are merged back
+    together, and sections that are still too long are split into token
+    windows at paragraph/sentence boundaries.
+    """
+    if count_tokens(text) <= max_tokens:
+        return [text]
+
+    pieces = []
+    for section in _split_on_headings(text):
+        pieces.extend(split_by_tokens(section, max_tokens))
+
+    sections, current, current_tokens = [], [], 0
+    for piece in pieces:
+        piece_tokens = count_tokens(piece)
+        if current and current_tokens + piece_tokens > max_tokens:
+            sections.append("\n\n".join(current))
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += piece_tokens
+    if current:
+        sections.append("\n\n".join(current))
+    return sections
+
+def label_section(section: str, index: int, total: int) -> str:
+    if total == 1:
+        return section
+    return f"[Excerpt {index + 1} of {total} of a longer essay]\n\n{section}"
+
+def weighted_score(scores: List[int], weights: List[int]) -> int:
+    """Mean of integer scores weighted by section size, rounded half up."""
+    total = sum(weights)
+    if not total:
+        return round(sum(scores) / len(scores)) if scores else 0
+    return int(sum(score * weight for score, weight in zip(scores, weights)) / total + 0.5)
+
+def unique(items: list) -> list:
+    """Items in first-seen order without duplicates (case-insensitive for strings)."""
+    seen, result = set(), []
+    for item in items:
+        key = item.lower().strip() if isinstance(item, str) else item
+        if key not in seen:
+            seen.add(key)
+            result.append(item)
+    return result
+
+def most_common(values: list, weights: List[int]):
+    """The value with the largest total weight; ties go to the earliest."""
+    totals = Counter()
+    for value, weight in zip(values, weights):
+        totals[value] += weight
+    best = max(totals.values())
+    return next(value for value in values if totals[value] == best)
+
+def successful_sections(sections: List[str], results: list, stage: str, stats: dict = None):
+    """
+    Pairs every section that was analyzed successfully with its result,
+    token weight and index. Failed sections are reported and skipped, and
+    counted in `stats["failed_sections"]` if `stats` is given.
+    Returns (results, weights, indices).
+    """
+    kept = []
+    for i, (section, result) in enumerate(zip(sections, results)):
+        if isinstance(result, Exception):
+            print(f"Error during {stage} of section {i + 1}/{len(sections)}: {result}")
+            continue
+        kept.append((result.model_dump(), count_tokens(section), i))
+    if stats is not None:
+        stats["failed_sections"] = len(sections) - len(kept)
+    return [result for result, _, _ in kept], [weight for _, weight, _ in kept], [i for _, _, i in kept]
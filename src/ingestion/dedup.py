@@ -0,0 +1,109 @@
+# Near-duplicate fact clustering before verification
+import hashlib
+import re
+from typing import List
+from src.config import FACT_DEDUP_THRESHOLD
+
+NUM_PERMUTATIONS = 64
+# Word bigrams, so swapped subjects ("Paris ... France" / "France ... Paris") differ
+SHINGLE_SIZE = 2
+NEGATION_PATTERN = re.compile(
+    r"\b(?:not|no|never|none|nor|neither|nobody|nothing|nowhere|without|cannot)\b|n['’]t\b"
+)
+
+def normalize_statement(text: str) -> str:
+    text = re.sub(r"\s*%", " percent", text.lower())
+    text = re.sub(r"(?<=\d),(?=\d{3})", "", text)  # 1,000 -> 1000
+    text = re.sub(r"[^\w\s.]", " ", text)
+    text = re.sub(r"(?<!\d)\.|\.(?!\d)", " ", text)  # keep decimal points only
+    return re.sub(r"\s+", " ", text).strip()
+
+def _numbers(normalized: str) -> set:
+    return set(re.findall(r"\d+(?:\.\d+)?", normalized))
+
+def _negations(statement: str) -> list:
+    # Read from the raw text, since normalization splits "wasn't" apart
+    return sorted(re.sub(r"n['’]t\b", "n't", match) for match in NEGATION_PATTERN.findall(statement.lower()))
+
+def _shingles(normalized: str) -> set:
+    words = normalized.split()
+    if len(words) <= SHINGLE_SIZE:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+def _minhash(shingles: set) -> List[int]:
+    # One seeded 64-bit hash per permutation; stable across processes
+    return [
+        min(
+            int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8, salt=seed.to_bytes(8, "little")).digest(), "little")
+            for shingle in shingles
+        )
+        for seed in range(NUM_PERMUTATIONS)
+    ]
+
+def _similarity(a: List[int], b: List[int]) -> float:
+    # Fraction of equal MinHash values estimates the Jaccard similarity
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERMUTATIONS
+
+def cluster_facts(facts: List[dict], threshold: float = FACT_DEDUP_THRESHOLD) -> List[List[int]]:
+    """
+    Groups facts whose statements are identical after normalization or
+    whose estimated word-bigram Jaccard similarity is at least `threshold`.
+    Statements citing different numbers or negations ("not", "never",
+    "wasn't", ...) are never grouped, since they make different claims. Returns groups of indices into `facts`, ordered by
+    first occurrence.
+    """
+    normalized = [normalize_statement(fact["statement"]) for fact in facts]
+    numbers = [_numbers(text) for text in normalized]
+    negations = [_negations(fact["statement"]) for fact in facts]
+    signatures = [_minhash(_shingles(text)) for text in normalized]
+    parent = list(range(len(facts)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i in range(len(facts)):
+        for j in range(i + 1, len(facts)):
+            if numbers[i] != numbers[j] or negations[i] != negations[j]:
+                continue
+            if normalized[i] == normalized[j] or _similarity(signatures[i], signatures[j]) >= threshold:
+                root_i, root_j = find(i), find(j)
+                if root_i != root_j:
+                    parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    groups = {}
+    for i in range(len(facts)):
+        groups.setdefault(find(i), []).append(i)
+    return sorted(groups.values(), key=lambda group: group[0])
+
+def deduplicate_facts(facts: List[dict], threshold: float = FACT_DEDUP_THRESHOLD) -> dict:
+    """
+    Picks the first fact of every near-duplicate group as the one to verify.
+    Returns {"representatives": [...], "groups": [[fact indices], ...], "removed": n}.
+    """
+    groups = cluster_facts(facts, threshold)
+    return {
+        "representatives": [facts[group[0]] for group in groups],
+        "groups": groups,
+        "removed": len(facts) - len(groups),
+    }
+
+def fan_out_verdicts(facts: List[dict], groups: List[List[int]], verdicts: List[dict]) -> List[dict]:
+    """
+    Copies each representative's verdict to every member of its group,
+    keeping each member's own statement, source_quote and page_number.
+    Results are returned in the original fact order.
+    """
+    results = [None] * len(facts)
+    for group, verdict in zip(groups, verdicts):
+        for i in group:
+            results[i] = {
+                **verdict,
+                "statement": facts[i]["statement"],
+                "source_quote": facts[i].get("source_quote", ""),
+                "page_number": facts[i].get("page_number"),
+            }
+    return results
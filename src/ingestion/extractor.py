@@ -1,22 +1,25 @@
-# Fact Extractor 
+# Fact Extractor
+import asyncio
 from typing import List
 from pydantic import BaseModel, Field
-from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
-from src.config import OPENAI_API_KEY, SILICON_FLOW_BASE_URL
+from src.models import get_chat_model
+from src.observability import get_callbacks
+from src.config import FACT_EXTRACTION_CONCURRENCY
+from src.ingestion.packer import pack_pages, resolve_page_number
 
 # --- Pydantic Schemas ---
 class FactsInfo(BaseModel):
     statement: str = Field(
-            ..., 
+            ...,
             description="The factual claim made by the student."
         )
     source_quote: str = Field(
-            ..., 
+            ...,
             description="The exact sentence or phrase from the essay where this fact is mentioned."
         )
     page_number: int = Field(
-            ..., 
+            ...,
             description="The page number where this fact was found."
         )
 
@@ -24,26 +27,19 @@ class FactExtraction(BaseModel):
     facts: List[FactsInfo]
 
 # --- Main Logic ---
-def extract_facts_from_docs(docs: list, callbacks=None):
-    """
-    Extracts facts from essay content and outputs a list of dictionaries.
-    """
+def _build_extraction_chain():
     # Setup the Model (DeepSeek via OpenAI API) ---
-    llm = ChatOpenAI(
-        model="deepseek-ai/DeepSeek-V3",
-        openai_api_key=OPENAI_API_KEY,
-        openai_api_base=SILICON_FLOW_BASE_URL,
-        temperature=0  # Keep it 0 for consistent analysis
-    )
+    llm = get_chat_model(temperature=0)  # Keep it 0 for consistent analysis
 
     # Bind the schema to the model
     structured_llm = llm.with_structured_output(FactExtraction)
 
     system_prompt = """
-    You are an expert fact-checker. 
+    You are an expert fact-checker.
     Extract every distinct factual claim made in the text provided.
     Ignore opinions or transitional phrases.
     For every fact, you must provide the exact quote from the text.
+    The text is split into pages marked like [Page 3]; report the page each quote comes from.
     """
 
     prompt = ChatPromptTemplate.from_messages([
@@ -51,34 +47,84 @@ def extract_facts_from_docs(docs: list, callbacks=None):
         ("human", "{text}")
     ])
 
-    extraction_chain = prompt | structured_llm
-    
+    return prompt | structured_llm
+
+def _facts_with_page_number(result, pack) -> list:
+    # We attach the page number manually here.
+    facts = []
+    if result and result.facts:
+        for fact in result.facts:
+            fact_dict = fact.model_dump() # Updated from .dict()
+            fact_dict['page_number'] = resolve_page_number(fact_dict, pack)
+            facts.append(fact_dict)
+    return facts
+
+def extract_facts_from_docs(docs: list, callbacks=None, stats: dict = None):
+    """
+    Extracts facts from essay content and outputs a list of dictionaries.
+    Packs whose request fails contribute no facts; if `stats` is given,
+    `stats["failed_packs"]` counts them.
+    """
+    extraction_chain = _build_extraction_chain()
+
     all_facts_with_metadata = []
+    failed_packs = 0
 
-    print(f"Processing {len(docs)} pages for fact extraction...")
+    # Merge small pages / split large ones (empty pages are dropped here)
+    packs = pack_pages(docs)
+    print(f"Processing {len(docs)} pages in {len(packs)} requests for fact extraction...")
 
-    for doc in docs:
-        page_num = doc.metadata.get('page', 0) + 1
-        page_content = doc.page_content
-        
-        # Skip empty pages to save API calls
-        if not page_content.strip():
-            continue
+    for pack in packs:
+        pages = pack.metadata["pages"]
 
         try:
             # We only send the text to the LLM
-            result = extraction_chain.invoke({"text": page_content}, config={"callbacks": callbacks})
-            print("Extracted facts from page", page_num, "out of", len(docs), "pages")
+            result = extraction_chain.invoke({"text": pack.page_content}, config={"callbacks": callbacks if callbacks is not None else get_callbacks()})
+            print("Extracted facts from pages", pages, "out of", len(docs), "pages")
 
-            # We attach the page number manually here.
-            if result and result.facts:
-                for fact in result.facts:
-                    fact_dict = fact.model_dump() # Updated from .dict()
-                    fact_dict['page_number'] = page_num
-                    all_facts_with_metadata.append(fact_dict)
-            print("Page", page_num, "has", len(result.facts), "facts")
+            page_facts = _facts_with_page_number(result, pack)
+            all_facts_with_metadata.extend(page_facts)
+            print("Pages", pages, "have", len(page_facts), "facts")
 
         except Exception as e:
-            print(f"Error on page {page_num}: {e}")
-            
-    return all_facts_with_metadata
\ No newline at end of file
+            failed_packs += 1
+            print(f"Error on pages {pages}: {e}")
+
+    if stats is not None:
+        stats["failed_packs"] = failed_packs
+    return all_facts_with_metadata
+
+async def aextract_facts_from_docs(docs: list, callbacks=None, max_concurrency: int = FACT_EXTRACTION_CONCURRENCY,
+                                   stats: dict = None):
+    """
+    Async variant of `extract_facts_from_docs` that sends up to
+    `max_concurrency` page packs to the LLM at once. Facts are returned in
+    page order; failed packs are counted in `stats` as in the sync variant.
+    """
+    extraction_chain = _build_extraction_chain()
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    # Merge small pages / split large ones (empty pages are dropped here)
+    packs = pack_pages(docs)
+    print(f"Processing {len(docs)} pages in {len(packs)} requests for fact extraction (concurrency={max_concurrency})...")
+
+    async def process_single_pack(pack):
+        # Returns None if the request failed
+        pages = pack.metadata["pages"]
+
+        async with semaphore:
+            try:
+                result = await extraction_chain.ainvoke({"text": pack.page_content}, config={"callbacks": callbacks if callbacks is not None else get_callbacks()})
+                page_facts = _facts_with_page_number(result, pack)
+                print("Pages", pages, "have", len(page_facts), "facts")
+                return page_facts
+            except Exception as e:
+                # One failing pack must not lose the facts of the others
+                print(f"Error on pages {pages}: {e}")
+                return None
+
+    # gather keeps results in the order of `packs`, which follow page order
+    per_page_facts = await asyncio.gather(*[process_single_pack(pack) for pack in packs])
+    if stats is not None:
+        stats["failed_packs"] = sum(1 for page_facts in per_page_facts if page_facts is None)
+    return [fact for page_facts in per_page_facts for fact in page_facts or []]
@@ -0,0 +1,74 @@
+# Token-aware page packing for fact extraction
+import re
+from typing import List
+from langchain_core.documents import Document
+from src.config import FACT_PACK_TARGET_TOKENS, FACT_PACK_MAX_TOKENS
+from src.tokens import count_tokens, split_by_tokens
+
+PAGE_MARKER = "[Page {page_number}]"
+
+def pack_pages(docs: list, target_tokens: int = FACT_PACK_TARGET_TOKENS, max_tokens: int = FACT_PACK_MAX_TOKENS) -> List[Document]:
+    """
+    Merges small consecutive pages and splits oversized ones so each
+    extraction request carries roughly `target_tokens` of essay text.
+
+    Every packed Document keeps its `(page_number, text)` segments in
+    `metadata["segments"]` so facts can be mapped back to their page.
+    """
+    packs = []
+    segments, pack_tokens = [], 0
+
+    def flush():
+        nonlocal segments, pack_tokens
+        if segments:
+            packs.append(_build_pack(segments))
+        segments, pack_tokens = [], 0
+
+    for doc in docs:
+        page_num = doc.metadata.get('page', 0) + 1
+        page_content = doc.page_content
+
+        # Skip empty pages to save API calls
+        if not page_content.strip():
+            continue
+
+        pieces = [page_content] if count_tokens(page_content) <= max_tokens else split_by_tokens(page_content, target_tokens)
+        for piece in pieces:
+            piece_tokens = count_tokens(piece)
+            if segments and pack_tokens + piece_tokens > target_tokens:
+                flush()
+            segments.append((page_num, piece))
+            pack_tokens += piece_tokens
+
+    flush()
+    return packs
+
+def _build_pack(segments: list) -> Document:
+    text = "\n\n".join(
+        f"{PAGE_MARKER.format(page_number=page_num)}\n{piece}" for page_num, piece in segments
+    )
+    pages = sorted({page_num for page_num, _ in segments})
+    return Document(page_content=text, metadata={"pages": pages, "segments": segments})
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+def resolve_page_number(fact: dict, pack: Document) -> int:
+    """
+    Finds the page a fact came from: first by locating its `source_quote`
+    in one of the pack's segments, then by trusting the page the LLM
+    reported if it belongs to the pack, and finally the pack's first page.
+    """
+    pages = pack.metadata["pages"]
+    if len(pages) == 1:
+        return pages[0]
+
+    quote = _normalize(fact.get("source_quote", ""))
+    if quote:
+        for page_num, piece in pack.metadata["segments"]:
+            if quote in _normalize(piece):
+                return page_num
+
+    if fact.get("page_number") in pages:
+        return fact["page_number"]
+    return pages[0]
@@ -1,23 +1,168 @@
 # PDF Processing logic
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
 from langchain_community.document_loaders import PyPDFLoader
+from langchain_core.documents import Document
+from src.config import PDF_CACHE_DIR, PDF_PARSE_WORKERS, PDF_MEMORY_CACHE_ENTRIES, PDF_CACHE_MAX_MB
+
+# Parsed pages by file hash (least recently used first), on top of the files in PDF_CACHE_DIR
+_pages = OrderedDict()
+_pages_lock = threading.Lock()
+_inflight = {}
+_pool = None
+_pool_lock = threading.Lock()
+
+def file_sha256(path) -> str:
+    """
+    Returns the SHA-256 hex digest of a file's bytes.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _parse_pages(pdf_path: str) -> list:
+    # Runs in a worker process, so it must stay a top-level function
+    return [(doc.page_content, doc.metadata) for doc in PyPDFLoader(pdf_path).load()]
+
+def _cache_path(digest: str):
+    return PDF_CACHE_DIR / f"pdf_{digest}.json"
+
+def _remember(digest: str, pages: list):
+    with _pages_lock:
+        _pages[digest] = pages
+        _pages.move_to_end(digest)
+        while len(_pages) > PDF_MEMORY_CACHE_ENTRIES:
+            _pages.popitem(last=False)
+
+def _load_cached(digest: str):
+    with _pages_lock:
+        if digest in _pages:
+            _pages.move_to_end(digest)
+            return _pages[digest]
+    path = _cache_path(digest)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            pages = [tuple(page) for page in json.load(f)]
+    except FileNotFoundError:
+        return None
+    # The modification time orders the files for eviction
+    os.utime(path)
+    _remember(digest, pages)
+    return pages
+
+def _prune_disk_cache():
+    # Removes the least recently used files once they exceed PDF_CACHE_MAX_MB
+    files = []
+    for path in PDF_CACHE_DIR.glob("pdf_*.json"):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= PDF_CACHE_MAX_MB * 1024 * 1024:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+
+def _save_cached(digest: str, pages: list):
+    _remember(digest, pages)
+    tmp_path = f"{_cache_path(digest)}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(pages, f, default=str)
+    os.replace(tmp_path, _cache_path(digest))
+    _prune_disk_cache()
+
+def _to_documents(pages: list, pdf_path) -> List[Document]:
+    # The same file may be cached under another path, so `source` is the current one
+    return [
+        Document(page_content=content, metadata={**metadata, "source": str(pdf_path)})
+        for content, metadata in pages
+    ]
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=PDF_PARSE_WORKERS)
+    return _pool
+
+def start_workers():
+    """
+    Starts the parsing processes now rather than on the first cache miss.
+    A long-running server calls this before it opens its sockets, so the
+    forked workers do not inherit them (and keep closed connections open).
+    """
+    # With the fork start method every worker is started on the first submit
+    _get_pool().submit(int).result()
 
 def load_pdf(pdf_path: str) -> list:
     """
-    Loads a PDF and returns a list of documents.
+    Loads a PDF and returns a list of documents (one per page). Pages are
+    cached on disk by file hash, so each distinct file is parsed once.
     """
     print(f"Loading PDF from: {pdf_path}")
-    loader = PyPDFLoader(str(pdf_path))
-    docs = loader.load()
-    
+    digest = file_sha256(pdf_path)
+    pages = _load_cached(digest)
+    if pages is None:
+        pages = _parse_pages(str(pdf_path))
+        _save_cached(digest, pages)
+    docs = _to_documents(pages, pdf_path)
+
     if not docs:
         print("Error: No documents found.")
         return []
-        
+
     return docs
 
+async def aload_pdf(pdf_path) -> list:
+    """
+    Async variant of `load_pdf`. Cache misses are parsed in a shared process
+    pool, so several PDFs loaded at once are parsed in parallel; concurrent
+    callers for the same file share a single parse.
+    """
+    print(f"Loading PDF from: {pdf_path}")
+    digest = await asyncio.to_thread(file_sha256, pdf_path)
+    pages = await asyncio.to_thread(_load_cached, digest)
+
+    if pages is None:
+        if digest not in _inflight:
+            async def parse():
+                try:
+                    loop = asyncio.get_running_loop()
+                    pages = await loop.run_in_executor(_get_pool(), _parse_pages, str(pdf_path))
+                    await asyncio.to_thread(_save_cached, digest, pages)
+                    return pages
+                finally:
+                    _inflight.pop(digest, None)
+            _inflight[digest] = asyncio.ensure_future(parse())
+        pages = await asyncio.shield(_inflight[digest])
+
+    docs = _to_documents(pages, pdf_path)
+    if not docs:
+        print("Error: No documents found.")
+    return docs
+
+def docs_to_text(docs: list) -> str:
+    """
+    Merges pages into a single string.
+    """
+    return "\n\n".join([d.page_content for d in docs])
+
 def load_pdf_as_text(pdf_path: str) -> str:
     """
     Loads a PDF and merges pages into a single string.
     """
-    docs = load_pdf(pdf_path)
-    return "\n\n".join([d.page_content for d in docs])
\ No newline at end of file
+    return docs_to_text(load_pdf(pdf_path))
+
+async def aload_pdf_as_text(pdf_path) -> str:
+    return docs_to_text(await aload_pdf(pdf_path))
@@ -0,0 +1,353 @@
+# Provider-wide rate limiting for LLM requests
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+import openai
+from langchain_openai import ChatOpenAI
+from src.config import LLM_PROVIDER_LIMITS, LLM_MAX_RETRIES
+from src.llm_cache import forget_rejected_outputs
+
+class _Waiter:
+    """A thread or coroutine queued for a request slot."""
+
+    def __init__(self, loop=None):
+        self.loop = loop
+        self.future = loop.create_future() if loop else None
+        self.event = None if loop else threading.Event()
+        self.granted = False
+        self.cancelled = False
+
+    def grant(self) -> bool:
+        if self.cancelled:
+            return False
+        self.granted = True
+        if self.loop:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+        else:
+            self.event.set()
+        return True
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+class ProviderLimiter:
+    """
+    Shared limiter for one API provider, usable from threads and event loops.
+
+    * Token buckets cap requests/minute and tokens/minute.
+    * Concurrency follows AIMD: the in-flight limit grows by one after a
+      full window of successful requests and halves on a 429 or timeout,
+      staying between 1 and `ceiling`.
+    * A throttled request also pauses new requests for a short backoff.
+    """
+
+    def __init__(self, rpm: int, tpm: int, ceiling: int, initial: int):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.ceiling = ceiling
+        self.max_in_flight = min(initial, ceiling)
+        self.in_flight = 0
+        self.stats = {"requests": 0, "throttled": 0, "errors": 0, "queue_wait_s": 0.0}
+        self._request_tokens = float(rpm)
+        self._token_tokens = float(tpm)
+        self._refilled_at = time.monotonic()
+        self._paused_until = 0.0
+        self._successes = 0
+        self._lock = threading.Lock()
+        self._waiters = deque()
+
+    # --- Token buckets ---
+    def _refill(self, now: float):
+        elapsed = now - self._refilled_at
+        self._request_tokens = min(self.rpm, self._request_tokens + elapsed * self.rpm / 60)
+        self._token_tokens = min(self.tpm, self._token_tokens + elapsed * self.tpm / 60)
+        self._refilled_at = now
+
+    def _rate_wait(self, tokens: int) -> float:
+        """Takes budget for one request and returns 0, or returns how long to wait."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._paused_until:
+                return self._paused_until - now
+            self._refill(now)
+            # A single request larger than the whole bucket may still go once the bucket is full
+            tokens = min(tokens, self.tpm)
+            if self._request_tokens >= 1 and self._token_tokens >= tokens:
+                self._request_tokens -= 1
+                self._token_tokens -= tokens
+                return 0.0
+            request_wait = max(0.0, (1 - self._request_tokens) * 60 / self.rpm)
+            token_wait = max(0.0, (tokens - self._token_tokens) * 60 / self.tpm)
+            return max(request_wait, token_wait, 0.01)
+
+    def record_usage(self, estimated: int, actual: int):
+        """Corrects the tokens/minute bucket once the real usage is known."""
+        with self._lock:
+            self._token_tokens -= actual - estimated
+
+    # --- Concurrency ---
+    def _try_acquire(self) -> bool:
+        if not self._waiters and self.in_flight < self.max_in_flight:
+            self.in_flight += 1
+            return True
+        return False
+
+    def _wake_waiters(self):
+        # Hand freed slots to the oldest waiters
+        while self._waiters and self.in_flight < self.max_in_flight:
+            if self._waiters.popleft().grant():
+                self.in_flight += 1
+
+    def acquire(self, tokens: int = 0) -> float:
+        """Waits for rate budget and a free slot; returns the seconds waited."""
+        start = time.monotonic()
+        while (wait := self._rate_wait(tokens)) > 0:
+            time.sleep(wait)
+        with self._lock:
+            if not self._try_acquire():
+                waiter = _Waiter()
+                self._waiters.append(waiter)
+            else:
+                waiter = None
+        if waiter:
+            waiter.event.wait()
+        return self._record_wait(time.monotonic() - start)
+
+    async def aacquire(self, tokens: int = 0) -> float:
+        start = time.monotonic()
+        while (wait := self._rate_wait(tokens)) > 0:
+            await asyncio.sleep(wait)
+        with self._lock:
+            if self._try_acquire():
+                waiter = None
+            else:
+                waiter = _Waiter(asyncio.get_running_loop())
+                self._waiters.append(waiter)
+        if waiter:
+            try:
+                await waiter.future
+            except asyncio.CancelledError:
+                with self._lock:
+                    waiter.cancelled = True
+                    granted = waiter.granted
+                if granted:
+                    self.release()
+                raise
+        return self._record_wait(time.monotonic() - start)
+
+    def _record_wait(self, seconds: float) -> float:
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["queue_wait_s"] += seconds
+        return seconds
+
+    def release(self, success: bool = True, throttled: bool = False):
+        with self._lock:
+            self.in_flight -= 1
+            if throttled:
+                # Multiplicative decrease
+                self.stats["throttled"] += 1
+                self._successes = 0
+                self.max_in_flight = max(1, self.max_in_flight // 2)
+            elif success:
+                # Additive increase after a full window of successes
+                self._successes += 1
+                if self._successes >= self.max_in_flight and self.max_in_flight < self.ceiling:
+                    self.max_in_flight += 1
+                    self._successes = 0
+            else:
+                self.stats["errors"] += 1
+            self._wake_waiters()
+
+    def backoff(self, attempt: int, error: Exception = None, pause: bool = True) -> float:
+        """
+        Returns the delay to wait before retrying. After a throttle
+        (`pause`) new requests are paused for as long; a transient server
+        error only delays its own retry.
+        """
+        delay = min(2 ** attempt, 30) + random.uniform(0, 1)
+        retry_after = getattr(getattr(error, "response", None), "headers", {}).get("retry-after")
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        if pause:
+            with self._lock:
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        return delay
+
+    def set_ceiling(self, ceiling: int):
+        with self._lock:
+            self.ceiling = ceiling
+            self.max_in_flight = min(self.max_in_flight, ceiling)
+            self._wake_waiters()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"in_flight": self.in_flight, "max_in_flight": self.max_in_flight,
+                    "ceiling": self.ceiling, "queued": len(self._waiters), **self.stats}
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_limiter(provider: str = "siliconflow") -> ProviderLimiter:
+    """
+    Returns the process-wide limiter of a provider configured in LLM_PROVIDER_LIMITS.
+    """
+    with _limiters_lock:
+        if provider not in _limiters:
+            _limiters[provider] = ProviderLimiter(**LLM_PROVIDER_LIMITS[provider])
+    return _limiters[provider]
+
+def configure_request_limiter(max_in_flight: int, provider: str = "siliconflow"):
+    """
+    Changes the cap on in-flight requests to a provider (e.g. for batch runs).
+    """
+    get_limiter(provider).set_ceiling(max_in_flight)
+
+def is_throttle_error(error: Exception) -> bool:
+    if isinstance(error, (openai.RateLimitError, openai.APITimeoutError, asyncio.TimeoutError, TimeoutError)):
+        return True
+    return getattr(error, "status_code", None) == 429
+
+def is_transient_error(error: Exception) -> bool:
+    # Dropped connections and 5xx responses: retried, but not a sign of overload
+    if isinstance(error, (openai.APIConnectionError, openai.InternalServerError)):
+        return True
+    return (getattr(error, "status_code", None) or 0) >= 500
+
+def _estimate_tokens(messages, max_tokens) -> int:
+    # ~4 characters per token, plus the completion budget
+    prompt_chars = sum(len(str(message.content)) for message in messages)
+    return prompt_chars // 4 + (max_tokens or 1000)
+
+def _total_tokens(result) -> int:
+    usage = (result.llm_output or {}).get("token_usage") or {}
+    return usage.get("total_tokens", 0)
+
+def _with_request_stats(result, queue_wait_s: float, retries: int):
+    # Read by the metrics callback (src/observability.py) from `llm_output`
+    result.llm_output = {**(result.llm_output or {}), "queue_wait_s": round(queue_wait_s, 3), "retries": retries}
+    return result
+
+class LimitedChatOpenAI(ChatOpenAI):
+    """
+    ChatOpenAI whose API requests go through the shared limiter of its
+    provider. 429s and timeouts are retried here (with backoff and a
+    smaller in-flight limit) instead of blindly by the OpenAI client;
+    connection errors and 5xx responses are retried with backoff only.
+    Cache hits never reach `_generate`, so they are not limited.
+
+    Streams hold their slot until the last chunk; a throttled stream is
+    only retried if it failed before yielding anything. With
+    `streaming=True`, ChatOpenAI's `_generate` delegates to `_stream`, so
+    only the stream takes the slot (one request never holds two slots).
+    """
+    provider: str = "siliconflow"
+    max_retries: int = 0
+
+    def with_structured_output(self, schema=None, **kwargs):
+        # A cached response that fails to parse would fail the same way on every retry
+        return forget_rejected_outputs(super().with_structured_output(schema, **kwargs))
+
+    def _generate(self, messages, *args, **kwargs):
+        if self.streaming:
+            return super()._generate(messages, *args, **kwargs)
+        limiter = get_limiter(self.provider)
+        estimate = _estimate_tokens(messages, self.max_tokens)
+        queue_wait = 0.0
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            queue_wait += limiter.acquire(estimate)
+            try:
+                result = super()._generate(messages, *args, **kwargs)
+            except Exception as e:
+                throttled = is_throttle_error(e)
+                limiter.release(success=False, throttled=throttled)
+                if not (throttled or is_transient_error(e)) or attempt == LLM_MAX_RETRIES:
+                    raise
+                time.sleep(limiter.backoff(attempt, e, pause=throttled))
+                continue
+            except BaseException:
+                # Interrupted: the slot must still be freed
+                limiter.release()
+                raise
+            limiter.release()
+            limiter.record_usage(estimate, _total_tokens(result) or estimate)
+            return _with_request_stats(result, queue_wait, attempt)
+
+    async def _agenerate(self, messages, *args, **kwargs):
+        if self.streaming:
+            return await super()._agenerate(messages, *args, **kwargs)
+        limiter = get_limiter(self.provider)
+        estimate = _estimate_tokens(messages, self.max_tokens)
+        queue_wait = 0.0
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            queue_wait += await limiter.aacquire(estimate)
+            try:
+                result = await super()._agenerate(messages, *args, **kwargs)
+            except Exception as e:
+                throttled = is_throttle_error(e)
+                limiter.release(success=False, throttled=throttled)
+                if not (throttled or is_transient_error(e)) or attempt == LLM_MAX_RETRIES:
+                    raise
+                await asyncio.sleep(limiter.backoff(attempt, e, pause=throttled))
+                continue
+            except BaseException:
+                # Cancelled (e.g. a sibling stage failed): the slot must still be freed
+                limiter.release()
+                raise
+            limiter.release()
+            limiter.record_usage(estimate, _total_tokens(result) or estimate)
+            return _with_request_stats(result, queue_wait, attempt)
+
+    def _stream(self, messages, *args, **kwargs):
+        limiter = get_limiter(self.provider)
+        estimate = _estimate_tokens(messages, self.max_tokens)
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            limiter.acquire(estimate)
+            started = False
+            try:
+                for chunk in super()._stream(messages, *args, **kwargs):
+                    started = True
+                    yield chunk
+            except GeneratorExit:
+                # The consumer stopped reading early
+                limiter.release()
+                raise
+            except Exception as e:
+                throttled = is_throttle_error(e)
+                limiter.release(success=False, throttled=throttled)
+                if started or not (throttled or is_transient_error(e)) or attempt == LLM_MAX_RETRIES:
+                    raise
+                time.sleep(limiter.backoff(attempt, e, pause=throttled))
+                continue
+            limiter.release()
+            return
+
+    async def _astream(self, messages, *args, **kwargs):
+        limiter = get_limiter(self.provider)
+        estimate = _estimate_tokens(messages, self.max_tokens)
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            await limiter.aacquire(estimate)
+            started = False
+            try:
+                async for chunk in super()._astream(messages, *args, **kwargs):
+                    started = True
+                    yield chunk
+            except (GeneratorExit, asyncio.CancelledError):
+                # The consumer stopped reading early or was cancelled
+                limiter.release()
+                raise
+            except Exception as e:
+                throttled = is_throttle_error(e)
+                limiter.release(success=False, throttled=throttled)
+                if started or not (throttled or is_transient_error(e)) or attempt == LLM_MAX_RETRIES:
+                    raise
+                await asyncio.sleep(limiter.backoff(attempt, e, pause=throttled))
+                continue
+            limiter.release()
+            return
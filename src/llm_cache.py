@@ -0,0 +1,167 @@
+# Disk-backed, content-addressed LLM response cache shared by every chain
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from contextvars import ContextVar
+from typing import Optional
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.load import dumps, loads
+from langchain_core.runnables import Runnable, RunnableLambda
+from src.config import LLM_CACHE_ENABLED, LLM_CACHE_PATH, LLM_CACHE_MAX_MB
+
+# Keys written by the cache in the current context, while a structured call is being parsed
+_written_keys = ContextVar("llm_cache_written_keys", default=None)
+
+class SQLiteLRUCache(BaseCache):
+    """
+    LangChain cache stored in a single SQLite file.
+
+    LangChain calls it with the serialized prompt messages and an
+    `llm_string` describing the model (name, temperature and any bound
+    tools / structured-output schema), so the key covers all of them.
+    Least recently used entries are evicted once the file holds more than
+    `max_bytes` of responses.
+    """
+
+    def __init__(self, path, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache (last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = self._key(prompt, llm_string)
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+        generations = [loads(generation, allowed_objects="all") for generation in json.loads(row[0])]
+        # Lets the metrics callback tell cache hits from API calls
+        for generation in generations:
+            generation.generation_info = {**(generation.generation_info or {}), "cache_hit": True}
+        return generations
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = self._key(prompt, llm_string)
+        value = json.dumps([dumps(generation) for generation in return_val])
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, value, len(value), time.time()),
+            )
+            self._evict()
+            self._conn.commit()
+        written = _written_keys.get()
+        if written is not None:
+            written.append(key)
+
+    def forget(self, keys) -> None:
+        with self._lock:
+            self._conn.executemany("DELETE FROM llm_cache WHERE key = ?", [(key,) for key in keys])
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute("SELECT key, size FROM llm_cache ORDER BY last_used").fetchall():
+            self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self, **kwargs) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size}
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_llm_cache(temperature: float = 0):
+    """
+    Returns the process-wide LLM cache, to be passed as `cache=` to chat
+    models. Returns False (never cache) when LLM_CACHE_ENABLED is off or
+    for a sampling model (temperature above 0), whose first answer would
+    otherwise be replayed forever.
+    """
+    global _cache
+    if not LLM_CACHE_ENABLED or temperature != 0:
+        return False
+    with _cache_lock:
+        if _cache is None:
+            _cache = SQLiteLRUCache(LLM_CACHE_PATH, LLM_CACHE_MAX_MB * 1024 * 1024)
+    return _cache
+
+def _rejected(output) -> bool:
+    # With include_raw=True parse errors are returned instead of raised
+    return isinstance(output, dict) and output.get("parsing_error") is not None
+
+def forget_rejected_outputs(structured: Runnable) -> Runnable:
+    """
+    Wraps a structured-output runnable (model | parser) so that responses
+    the parser rejects are removed from the LLM cache again, rather than
+    replayed on every retry.
+    """
+    def forget(written: list):
+        if written and _cache is not None:
+            _cache.forget(written)
+
+    def invoke(input, config):
+        written = []
+        token = _written_keys.set(written)
+        try:
+            output = structured.invoke(input, config)
+        except Exception:
+            forget(written)
+            raise
+        finally:
+            _written_keys.reset(token)
+        if _rejected(output):
+            forget(written)
+        return output
+
+    async def ainvoke(input, config):
+        written = []
+        token = _written_keys.set(written)
+        try:
+            output = await structured.ainvoke(input, config)
+        except Exception:
+            forget(written)
+            raise
+        finally:
+            _written_keys.reset(token)
+        if _rejected(output):
+            forget(written)
+        return output
+
+    return RunnableLambda(invoke, afunc=ainvoke, name=structured.get_name())
+
+def llm_cache_stats() -> dict:
+    """
+    Hit/miss counters of the shared cache (empty if it was never used).
+    """
+    return _cache.stats() if _cache is not None else {}
@@ -1,95 +1,356 @@
 # entry point: Orchestrates the pipeline
+import argparse
 import asyncio
 import json
 import logging
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Callable, NamedTuple, Optional, Tuple
 from src.config import (
-    ESSAY_PDF_PATH, 
-    QUESTION_PDF_PATH, 
+    ESSAY_PDF_PATH,
+    QUESTION_PDF_PATH,
     RUBRIC_PDF_PATH,
     FACTS_JSON_PATH,
     RUBRICS_JSON_PATH,
     FACT_CHECK_OUTPUT_PATH,
     LOGIC_OUTPUT_PATH,
     LANGUAGE_OUTPUT_PATH,
-    FINAL_REPORT_PATH
+    FINAL_REPORT_PATH,
+    STAGE_TIMINGS_PATH,
+    RUN_PROFILE_PATH,
+    CHECKPOINT_DIR
 )
-from src.ingestion.pdf_loader import load_pdf, load_pdf_as_text
-from src.ingestion.extractor import extract_facts_from_docs
-from src.evaluators.rubrics import extract_rubric_data
-from src.evaluators.logic import check_logic
-from src.evaluators.language import check_language
+from src.ingestion.pdf_loader import aload_pdf, docs_to_text
+from src.ingestion.extractor import aextract_facts_from_docs
+from src.ingestion.dedup import deduplicate_facts, fan_out_verdicts
+from src.evaluators.rubric_store import aget_rubric_data, aget_question_text
+from src.evaluators.logic import acheck_logic
+from src.evaluators.language import acheck_language
 from src.agents.factory import check_facts
-from src.output.llm_judge import generate_final_report
+from src.agents.tools import warm as warm_knowledge_base
+from src.output.llm_judge import astream_final_report
+from src.llm_cache import llm_cache_stats
+from src.models import pool_stats
 #from src.observability import get_langfuse_handler
+from src.observability import track_run, track_stage, print_run_summary
+from src.checkpoints import Checkpoints
 
-async def main():
-    print("🚀 Starting Essay Checker Agentic Pipeline...\n")
+# --- Paths ---
+class PipelinePaths(NamedTuple):
+    """Input PDFs and output files for grading one essay."""
+    essay_pdf: Path
+    question_pdf: Path
+    rubric_pdf: Path
+    facts_json: Path
+    rubrics_json: Path
+    fact_check_output: Path
+    logic_output: Path
+    language_output: Path
+    final_report: Path
+    stage_timings: Path
+    run_profile: Path
+    checkpoints: Path
 
-    # 0. Initialize Langfuse
-    #langfuse_handler = get_langfuse_handler()
-    #callbacks = [langfuse_handler] if langfuse_handler else []
+    @classmethod
+    def default(cls):
+        return cls(
+            ESSAY_PDF_PATH, QUESTION_PDF_PATH, RUBRIC_PDF_PATH,
+            FACTS_JSON_PATH, RUBRICS_JSON_PATH, FACT_CHECK_OUTPUT_PATH,
+            LOGIC_OUTPUT_PATH, LANGUAGE_OUTPUT_PATH, FINAL_REPORT_PATH,
+            STAGE_TIMINGS_PATH, RUN_PROFILE_PATH, CHECKPOINT_DIR,
+        )
+
+    @classmethod
+    def for_output_dir(cls, essay_pdf, question_pdf, rubric_pdf, output_dir):
+        """Same file names as the defaults, all placed under `output_dir`."""
+        output_dir = Path(output_dir)
+        defaults = cls.default()
+        return cls(
+            Path(essay_pdf), Path(question_pdf), Path(rubric_pdf),
+            *[output_dir / path.name for path in defaults[3:]],
+        )
+
+# --- Stage Graph ---
+class Stage(NamedTuple):
+    """
+    One node of the pipeline. `run` receives the outputs of the stages
+    named in `inputs` as keyword arguments; its return value is stored
+    under `name` for downstream stages.
+
+    Stages with an `output` are checkpointed: their result is reused while
+    their inputs, the files in `reads`, the source of the modules in
+    `code` and the settings in `config` are unchanged (see src/checkpoints.py).
+    """
+    name: str
+    inputs: Tuple[str, ...]
+    run: Callable[..., Awaitable]
+    # PipelinePaths field the stage writes; stages without one always run
+    output: Optional[str] = None
+    # PipelinePaths fields of input files whose bytes the stage depends on
+    reads: Tuple[str, ...] = ()
+    # Modules whose source changes invalidate the stage's checkpoint
+    code: Tuple[str, ...] = ()
+    # src.config settings whose values change the stage's output
+    config: Tuple[str, ...] = ()
+
+class StageResult(NamedTuple):
+    """
+    Returned by a stage that has extra metrics to record: `value` is the
+    stage output and `metrics` are added to the stage's timing entry.
+    """
+    value: object
+    metrics: dict
+
+async def _run_timed(stage: Stage, results: dict, t0: float, checkpoints: Checkpoints = None):
+    start = time.perf_counter()
+    started_at = datetime.now().isoformat(timespec="milliseconds")
+    entry, reused, output = None, False, None
+    if checkpoints is not None and stage.output:
+        entry = await asyncio.to_thread(checkpoints.entry_for, stage, results)
+        reused, output = checkpoints.load(stage, entry, results["paths"])
+    if not reused:
+        with track_stage(stage.name):
+            output = await stage.run(**{dep: results[dep] for dep in stage.inputs})
+    end = time.perf_counter()
+    timing = {
+        "stage": stage.name,
+        "inputs": list(stage.inputs),
+        "started_at": started_at,
+        "start_s": round(start - t0, 3),
+        "end_s": round(end - t0, 3),
+        "duration_s": round(end - start, 3),
+    }
+    metrics = {}
+    if isinstance(output, StageResult):
+        output, metrics = output.value, output.metrics
+        timing.update(metrics)
+    if reused:
+        timing["reused"] = True
+    elif entry is not None:
+        checkpoints.save(stage, entry, output, metrics)
+    return output, timing
+
+async def run_stage_graph(stages: list, initial: dict = None, checkpoints: Checkpoints = None):
+    """
+    Runs every stage as soon as all of its inputs are available, so
+    independent stages overlap. `initial` seeds values that stages can
+    take as inputs. With `checkpoints`, stages whose inputs and code are
+    unchanged since their last run are loaded instead of run.
+    Returns (results, timings).
+    """
+    pending = {stage.name: stage for stage in stages}
+    running = {}
+    results, timings = dict(initial or {}), []
+    t0 = time.perf_counter()
+
+    try:
+        while pending or running:
+            for name, stage in list(pending.items()):
+                if all(dep in results for dep in stage.inputs):
+                    del pending[name]
+                    running[asyncio.create_task(_run_timed(stage, results, t0, checkpoints))] = name
+
+            if not running:
+                raise RuntimeError(f"Unsatisfiable stage inputs: {sorted(pending)}")
+
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                name = running.pop(task)
+                results[name], timing = task.result()
+                timings.append(timing)
+    finally:
+        for task in running:
+            task.cancel()
+
+    return results, timings
+
+def failed_stages(results: dict, timings: list) -> list:
+    """
+    Names of the checkpointed stages that did not fully succeed: those
+    that returned None or flagged `failed` in their metrics (e.g. fact
+    checks that errored, or a report stream that broke off).
+    """
+    flagged = {t["stage"] for t in timings if t.get("failed")}
+    return [stage.name for stage in PIPELINE_STAGES
+            if stage.output and (results.get(stage.name) is None or stage.name in flagged)]
+
+def print_stage_timings(timings: list):
+    total = max((t["end_s"] for t in timings), default=0.0)
+    serial = sum(t["duration_s"] for t in timings)
+    print("\n⏱️ Stage timings (seconds from pipeline start):")
+    for t in sorted(timings, key=lambda t: t["start_s"]):
+        first_token = f", first token {t['ttft_s']:.2f}s" if t.get("ttft_s") is not None else ""
+        reused = ", reused" if t.get("reused") else ""
+        print(f"  {t['stage']:<16} {t['start_s']:>8.2f} → {t['end_s']:>8.2f}  ({t['duration_s']:.2f}s{first_token}{reused})")
+    print(f"  wall clock: {total:.2f}s | sum of stages: {serial:.2f}s")
+
+# --- Stages ---
+def _write_json(path, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
 
-    # 1. Load Documents
-    print("📄 Loading Documents...")
-    essay_docs = load_pdf(ESSAY_PDF_PATH)
-    essay_text = load_pdf_as_text(ESSAY_PDF_PATH)
-    question_text = load_pdf_as_text(QUESTION_PDF_PATH)
-    rubric_text = load_pdf_as_text(RUBRIC_PDF_PATH)
-    print(f"📄 Documents Loaded Successfully.")
+async def _load_essay_docs(paths):
+    # Parsed in a worker process, alongside the question and rubric PDFs
+    return await aload_pdf(paths.essay_pdf)
 
-    # 2. Extract Rubric Criteria
+async def _join_essay_text(essay_docs):
+    return docs_to_text(essay_docs)
+
+async def _load_question_text(paths):
+    return await aget_question_text(paths.question_pdf)
+
+async def _warm_knowledge_base():
+    # Opens Chroma in the background while the other stages run
+    await asyncio.to_thread(warm_knowledge_base)
+    # The indexed files' hashes, so fact checks are redone when the knowledge base changes
+    from src.database.vector_ops import load_manifest
+    manifest = load_manifest() or {"files": {}}
+    return {name: entry["sha256"] for name, entry in manifest["files"].items()}
+
+async def _extract_rubrics(paths):
     print("🎯 Extracting Rubric Criteria...")
-    rubric_data = extract_rubric_data(rubric_text)
-    with open(RUBRICS_JSON_PATH, "w", encoding="utf-8") as f:
-        json.dump(rubric_data, f, indent=2)
+    # Reused from the rubric store when this rubric PDF was seen before
+    rubric_data = await aget_rubric_data(paths.rubric_pdf)
+    _write_json(paths.rubrics_json, rubric_data)
     print(f"🎯 Rubric Criteria Extracted Successfully.")
+    return rubric_data
 
-    # 3. Logic & Relevance Check
+async def _analyze_logic(paths, essay_text, question_text):
     print("🧠 Analyzing Logic...")
-    logic_data = check_logic(essay_text, question_text)
-    with open(LOGIC_OUTPUT_PATH, "w", encoding="utf-8") as f:
-        json.dump(logic_data, f, indent=2)
+    stats = {"failed_sections": 0}
+    logic_data = await acheck_logic(essay_text, question_text, stats=stats)
+    _write_json(paths.logic_output, logic_data)
     print(f"🧠 Logic Analyzed Successfully.")
+    # A merge missing failed sections is used for this run but not checkpointed
+    return StageResult(logic_data, {"failed": stats["failed_sections"] > 0, **stats})
 
-    # 4. Language & Grammar Check
+async def _analyze_language(paths, essay_text):
     print("🗣️ Analyzing Language...")
-    language_data = check_language(essay_text)
-    with open(LANGUAGE_OUTPUT_PATH, "w", encoding="utf-8") as f:
-        json.dump(language_data, f, indent=2)
+    stats = {"failed_sections": 0}
+    language_data = await acheck_language(essay_text, stats=stats)
+    _write_json(paths.language_output, language_data)
     print(f"🗣️ Language Analyzed Successfully.")
+    return StageResult(language_data, {"failed": stats["failed_sections"] > 0, **stats})
 
-    # 5. Extract Facts & Run Agentic Fact Checker
+async def _extract_facts(paths, essay_docs):
     print("🤖 Extracting Facts...")
-    raw_facts = extract_facts_from_docs(essay_docs)
-    with open(FACTS_JSON_PATH, "w", encoding="utf-8") as f:
+    stats = {"failed_packs": 0}
+    raw_facts = await aextract_facts_from_docs(essay_docs, stats=stats)
+    with open(paths.facts_json, "w", encoding="utf-8") as f:
         for fact in raw_facts:
             f.write(json.dumps(fact) + "\n")
     print(f"🤖 Facts Extracted Successfully.")
-    
-    # Run Async Fact Checker
+    # Pages whose request failed are missing, so the facts are not checkpointed
+    return StageResult(raw_facts, {"failed": stats["failed_packs"] > 0, **stats})
+
+async def _deduplicate_facts(raw_facts):
+    fact_groups = deduplicate_facts(raw_facts)
+    print(f"🧹 {len(raw_facts)} facts grouped into {len(fact_groups['groups'])} ({fact_groups['removed']} near-duplicates removed).")
+    return fact_groups
+
+async def _check_facts(paths, raw_facts, fact_groups, kb_ready):
     print("🔃 Checking Facts...")
-    verified_facts = await check_facts(raw_facts)
-    with open(FACT_CHECK_OUTPUT_PATH, "w", encoding="utf-8") as f:
-        json.dump(verified_facts, f, indent=2)
+    # Verify one fact per near-duplicate group, then copy the verdict to the others
+    parsing = {}
+    verdicts = await check_facts(fact_groups["representatives"], stats=parsing)
+    verified_facts = fan_out_verdicts(raw_facts, fact_groups["groups"], verdicts)
+    _write_json(paths.fact_check_output, verified_facts)
+    # Facts that errored are retried on the next run instead of being checkpointed
+    errors = sum(1 for v in verdicts if v["summary_description"].startswith("Error during validation"))
     print(f"✅ All Facts Checked Successfully.")
+    return StageResult(verified_facts, {"failed": errors > 0, "failed_facts": errors, "fact_parsing": parsing})
 
-    # 6. Final Judge (Synthesize Report)
+async def _synthesize_report(paths, question_text, rubric_data, logic_data, verified_facts, language_data):
     print("🔃 Synthesizing Final Report...")
-    final_report = generate_final_report(
+    # Streamed straight into the report file, so it fills in as it is generated
+    final_report, stream_timing = await astream_final_report(
         #essay_content=essay_text,
         essay_question=question_text,
         rubric_data=rubric_data,
         logic_data=logic_data,
         fact_data=verified_facts,
-        language_data=language_data
+        language_data=language_data,
+        report_path=paths.final_report,
     )
-    print(f"✅ Final Report Synthesized Successfully.")
+    ttft = stream_timing.get("ttft_s")
+    first_token = f" (first token after {ttft:.2f}s)" if ttft is not None else ""
+    print(f"✅ Final Report Synthesized Successfully{first_token}.")
+    return StageResult(final_report, stream_timing)
+
+# Every stage can take `paths` (a PipelinePaths) as an input
+PIPELINE_STAGES = [
+    Stage("essay_docs", ("paths",), _load_essay_docs),
+    Stage("essay_text", ("essay_docs",), _join_essay_text),
+    Stage("question_text", ("paths",), _load_question_text),
+    Stage("kb_ready", (), _warm_knowledge_base),
+    Stage("rubric_data", ("paths",), _extract_rubrics,
+          output="rubrics_json", reads=("rubric_pdf",),
+          code=("src.evaluators.rubrics", "src.evaluators.rubric_store")),
+    Stage("logic_data", ("paths", "essay_text", "question_text"), _analyze_logic,
+          output="logic_output", code=("src.evaluators.logic", "src.evaluators.sections", "src.tokens"),
+          config=("ESSAY_SECTION_MAX_TOKENS",)),
+    Stage("language_data", ("paths", "essay_text"), _analyze_language,
+          output="language_output", code=("src.evaluators.language", "src.evaluators.sections", "src.tokens"),
+          config=("ESSAY_SECTION_MAX_TOKENS",)),
+    Stage("raw_facts", ("paths", "essay_docs"), _extract_facts,
+          output="facts_json", code=("src.ingestion.extractor", "src.ingestion.packer", "src.tokens"),
+          config=("FACT_PACK_TARGET_TOKENS", "FACT_PACK_MAX_TOKENS")),
+    Stage("fact_groups", ("raw_facts",), _deduplicate_facts),
+    Stage("verified_facts", ("paths", "raw_facts", "fact_groups", "kb_ready"), _check_facts,
+          output="fact_check_output",
+          code=("src.agents.factory", "src.agents.json_repair", "src.agents.tools", "src.agents.mcp_tools", "src.ingestion.dedup",
+                "src.tokens", "src.database.vector_ops", "src.database.bm25"),
+          config=("FACT_DEDUP_THRESHOLD", "KB_RETRIEVAL_MODE", "KB_TOP_K", "KB_SCORE_THRESHOLD", "KB_FUSION_CANDIDATES")),
+    Stage("final_report", ("paths", "question_text", "rubric_data", "logic_data", "verified_facts", "language_data"), _synthesize_report,
+          output="final_report", code=("src.output.llm_judge", "src.output.payload", "src.tokens"),
+          config=("JUDGE_PAYLOAD_TOKEN_BUDGET", "JUDGE_GRAMMAR_EXAMPLES_PER_TYPE")),
+]
+
+async def grade_essay(paths: PipelinePaths, reuse: bool = True, force=()):
+    """
+    Runs the whole pipeline for one essay and saves per-stage timings and
+    the run profile (latency, tokens and cost of every call).
+    Stages unchanged since the last run on these paths are reused from
+    their checkpoints unless `reuse` is False; stages named in `force`
+    always run. Returns (results, timings); the profile is in
+    results["run_profile"].
+    """
+    checkpoints = Checkpoints(paths.checkpoints, reuse=reuse, force=force)
+    with track_run(Path(paths.essay_pdf).name) as profile:
+        results, timings = await run_stage_graph(PIPELINE_STAGES, initial={"paths": paths}, checkpoints=checkpoints)
+    _write_json(paths.stage_timings, timings)
+    profile.write(paths.run_profile)
+    results["run_profile"] = profile
+    return results, timings
+
+async def main(reuse: bool = True, force=()):
+    print("🚀 Starting Essay Checker Agentic Pipeline...\n")
+
+    # 0. Initialize Langfuse
+    #langfuse_handler = get_langfuse_handler()
+    #callbacks = [langfuse_handler] if langfuse_handler else []
+
+    # 1. Run every stage as soon as its inputs are ready
+    results, timings = await grade_essay(PipelinePaths.default(), reuse=reuse, force=force)
+
+    # 2. Per-stage timings
+    print_stage_timings(timings)
+    print_run_summary(results["run_profile"])
+
+    cache_stats = llm_cache_stats()
+    if cache_stats:
+        print(f"💾 LLM cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses")
+    for pool in pool_stats()["pools"]:
+        print(f"🔌 {pool['base_url']}: {pool['async']['connections']} async / {pool['sync']['connections']} sync connections kept alive")
 
-    # 7. Save Report
-    with open(FINAL_REPORT_PATH, "w", encoding="utf-8") as f:
-        f.write(final_report)
-    
     print(f"\n✅ Pipeline Complete! Report saved to: {FINAL_REPORT_PATH}")
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    checkpointed = [stage.name for stage in PIPELINE_STAGES if stage.output]
+    parser = argparse.ArgumentParser(description="Grade the essay in data/raw.")
+    parser.add_argument("--fresh", action="store_true", help="Ignore saved stage checkpoints and rerun every stage")
+    parser.add_argument("--rerun", nargs="+", default=[], choices=checkpointed, metavar="STAGE",
+                        help=f"Rerun these stages (and whatever their new output invalidates): {', '.join(checkpointed)}")
+    args = parser.parse_args()
+    asyncio.run(main(reuse=not args.fresh, force=args.rerun))
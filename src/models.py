@@ -0,0 +1,115 @@
+# Shared LLM client registry with pooled HTTP connections
+import asyncio
+import threading
+import weakref
+import httpx
+from src.config import (
+    OPENAI_API_KEY,
+    SILICON_FLOW_BASE_URL,
+    LLM_MODEL,
+    LLM_POOL_MAX_CONNECTIONS,
+    LLM_POOL_MAX_KEEPALIVE,
+    LLM_POOL_KEEPALIVE_EXPIRY
+)
+from src.limits import LimitedChatOpenAI
+from src.llm_cache import get_llm_cache
+
+_lock = threading.Lock()
+_sync_clients = {}
+# httpx async connections belong to one event loop, so async clients (and
+# the models holding them) are shared per loop: {"clients": {base_url: client},
+# "models": {settings: model}} for each loop, and for callers outside any loop
+_per_loop = weakref.WeakKeyDictionary()
+_without_loop = {"clients": {}, "models": {}}
+
+def _loop_registry() -> dict:
+    # Call with _lock held
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return _without_loop
+    # Pooled connections can keep a finished loop alive, so closed loops are dropped explicitly
+    for closed in [other for other in _per_loop if other.is_closed()]:
+        del _per_loop[closed]
+    if loop not in _per_loop:
+        _per_loop[loop] = {"clients": {}, "models": {}}
+    return _per_loop[loop]
+
+def _pool_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=LLM_POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_POOL_MAX_KEEPALIVE,
+        keepalive_expiry=LLM_POOL_KEEPALIVE_EXPIRY,
+    )
+
+def get_http_clients(base_url: str = SILICON_FLOW_BASE_URL) -> tuple:
+    """
+    Returns the shared (sync, async) httpx clients for a base URL. Both keep
+    connections alive so TLS handshakes are paid once, not per call.
+    """
+    with _lock:
+        if base_url not in _sync_clients:
+            _sync_clients[base_url] = httpx.Client(limits=_pool_limits())
+        async_clients = _loop_registry()["clients"]
+        if base_url not in async_clients:
+            async_clients[base_url] = httpx.AsyncClient(limits=_pool_limits())
+        return _sync_clients[base_url], async_clients[base_url]
+
+def get_chat_model(temperature: float = 0, model: str = LLM_MODEL, **settings) -> LimitedChatOpenAI:
+    """
+    Returns a shared chat model for these settings. Every model goes through
+    the provider limiter and reuses pooled connections; deterministic ones
+    (temperature 0) also go through the LLM cache.
+    """
+    key = (model, temperature, tuple(sorted(settings.items())))
+    with _lock:
+        models = _loop_registry()["models"]
+        if key in models:
+            return models[key]
+
+    http_client, http_async_client = get_http_clients(SILICON_FLOW_BASE_URL)
+    llm = LimitedChatOpenAI(
+        model=model,
+        openai_api_key=OPENAI_API_KEY,
+        openai_api_base=SILICON_FLOW_BASE_URL,
+        cache=get_llm_cache(temperature),
+        temperature=temperature,
+        http_client=http_client,
+        http_async_client=http_async_client,
+        **settings
+    )
+    with _lock:
+        return models.setdefault(key, llm)
+
+def _pool_info(client) -> dict:
+    # httpx keeps its connection pool in the (private) httpcore transport
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    connections = list(getattr(pool, "connections", []))
+    idle = sum(1 for connection in connections if connection.is_idle())
+    return {"connections": len(connections), "idle": idle, "active": len(connections) - idle}
+
+def _merge_pool_info(infos: list) -> dict:
+    return {field: sum(info[field] for info in infos) for field in ("connections", "idle", "active")}
+
+def pool_stats() -> dict:
+    """
+    Number of shared models and the state of every connection pool.
+    """
+    with _lock:
+        registries = [_without_loop, *_per_loop.values()]
+        sync_clients = dict(_sync_clients)
+        async_clients = [(url, client) for registry in registries for url, client in registry["clients"].items()]
+        models = sum(len(registry["models"]) for registry in registries)
+    return {
+        "models": models,
+        "pools": [
+            {
+                "base_url": base_url,
+                "sync": _pool_info(client),
+                "async": _merge_pool_info(
+                    [_pool_info(c) for url, c in async_clients if url == base_url]
+                ),
+            }
+            for base_url, client in sync_clients.items()
+        ],
+    }
@@ -1,13 +1,222 @@
-from langfuse.langchain import CallbackHandler
-from src.config import LANGFUSE_PUBLIC_KEY, LANGFUSE_SECRET_KEY
+# Langfuse tracing and local run metrics (latency, tokens, cost)
+import json
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Optional
+from langchain_core.callbacks import BaseCallbackHandler
+from src.config import LANGFUSE_PUBLIC_KEY, LANGFUSE_SECRET_KEY, MODEL_PRICES_PER_MTOK, COST_CURRENCY
+
+_langfuse_handler = None
+_langfuse_checked = False
 
 def get_langfuse_handler():
     """
     Returns a configured Langfuse CallbackHandler.
     Returns None if keys are missing (to prevent crashing in dev).
     """
-    if not LANGFUSE_PUBLIC_KEY or not LANGFUSE_SECRET_KEY:
-        print("⚠️ Langfuse keys not found. Tracing disabled.")
-        return None
-        
-    return CallbackHandler()
\ No newline at end of file
+    global _langfuse_handler, _langfuse_checked
+    if not _langfuse_checked:
+        _langfuse_checked = True
+        if not LANGFUSE_PUBLIC_KEY or not LANGFUSE_SECRET_KEY:
+            print("⚠️ Langfuse keys not found. Tracing disabled.")
+        else:
+            from langfuse.langchain import CallbackHandler
+            _langfuse_handler = CallbackHandler()
+    return _langfuse_handler
+
+# --- Local metrics ---
+_current_run: ContextVar[Optional["RunProfile"]] = ContextVar("current_run", default=None)
+_current_stage: ContextVar[Optional[str]] = ContextVar("current_stage", default=None)
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    input_price, output_price = MODEL_PRICES_PER_MTOK.get(model, (0.0, 0.0))
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+class RunProfile:
+    """
+    Events recorded while grading one essay: one per stage and one per
+    LLM, embedding or tool call, each tagged with the stage it ran in.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started_at = datetime.now().isoformat(timespec="milliseconds")
+        self.t0 = time.perf_counter()
+        self.events = []
+        self._lock = threading.Lock()
+
+    def add(self, kind: str, name: str, stage: Optional[str], start: float, **fields):
+        event = {
+            "kind": kind,
+            "name": name,
+            "stage": stage,
+            "start_s": round(start - self.t0, 3),
+            "wall_s": round(time.perf_counter() - start, 3),
+            **fields,
+        }
+        if kind in ("llm", "embedding"):
+            event["cost"] = round(estimate_cost(name, event.get("prompt_tokens", 0), event.get("completion_tokens", 0)), 6)
+        with self._lock:
+            self.events.append(event)
+
+    def summary(self) -> dict:
+        """Totals per stage (and overall) of every recorded call."""
+        with self._lock:
+            events = list(self.events)
+        stages = {}
+        for event in events:
+            stage = stages.setdefault(event["stage"] or "-", {
+                "wall_s": 0.0, "calls": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                "cache_hits": 0, "retries": 0, "queue_wait_s": 0.0, "errors": 0, "cost": 0.0,
+            })
+            if event["kind"] == "stage":
+                stage["wall_s"] = event["wall_s"]
+                continue
+            stage["calls"] += 1
+            stage["prompt_tokens"] += event.get("prompt_tokens", 0)
+            stage["completion_tokens"] += event.get("completion_tokens", 0)
+            stage["cache_hits"] += event.get("cache_hits", int(event.get("cache_hit", False)))
+            stage["retries"] += event.get("retries", 0)
+            stage["queue_wait_s"] += event.get("queue_wait_s", 0.0)
+            stage["errors"] += int("error" in event)
+            stage["cost"] += event.get("cost", 0.0)
+        total = {key: sum(stage[key] for stage in stages.values()) for key in
+                 ("calls", "prompt_tokens", "completion_tokens", "cache_hits", "retries", "queue_wait_s", "errors", "cost")}
+        total["wall_s"] = round(time.perf_counter() - self.t0, 3)
+        for values in list(stages.values()) + [total]:
+            values["queue_wait_s"] = round(values["queue_wait_s"], 3)
+            values["cost"] = round(values["cost"], 6)
+        return {"run": self.name, "started_at": self.started_at, "currency": COST_CURRENCY,
+                "stages": stages, "total": total}
+
+    def write(self, path):
+        """
+        Writes the profile as JSONL: one line per event, then a summary line.
+        """
+        with self._lock:
+            events = list(self.events)
+        with open(path, "w", encoding="utf-8") as f:
+            for event in events:
+                f.write(json.dumps({"run": self.name, **event}) + "\n")
+            f.write(json.dumps({"kind": "summary", **self.summary()}) + "\n")
+
+@contextmanager
+def track_run(name: str):
+    """
+    Collects metrics for everything run inside the block (including tasks
+    and threads started from it) into a new RunProfile.
+    """
+    profile = RunProfile(name)
+    token = _current_run.set(profile)
+    try:
+        yield profile
+    finally:
+        _current_run.reset(token)
+
+@contextmanager
+def track_stage(name: str):
+    """
+    Tags calls made inside the block with the stage name and records the
+    stage's own wall time.
+    """
+    token = _current_stage.set(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _current_stage.reset(token)
+        profile = _current_run.get()
+        if profile is not None:
+            profile.add("stage", name, name, start)
+
+def record_call(kind: str, name: str, start: float, **fields):
+    """
+    Records a call that does not go through LangChain callbacks (e.g. embeddings).
+    `start` is the call's time.perf_counter() start.
+    """
+    profile = _current_run.get()
+    if profile is not None:
+        profile.add(kind, name, _current_stage.get(), start, **fields)
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """
+    LangChain callback recording wall time, tokens, cache hits, retries
+    and limiter queue wait of every LLM call, and wall time of every tool
+    call, into the RunProfile of the current run.
+    """
+    # Runs in the caller's context, so the current run and stage are visible
+    run_inline = True
+
+    def __init__(self):
+        self._starts = {}
+
+    def _start(self, run_id, kind: str, name: str):
+        profile = _current_run.get()
+        if profile is not None:
+            self._starts[run_id] = (profile, _current_stage.get(), kind, name, time.perf_counter())
+
+    def _end(self, run_id, **fields):
+        started = self._starts.pop(run_id, None)
+        if started is not None:
+            profile, stage, kind, name, start = started
+            profile.add(kind, name, stage, start, **fields)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        params = kwargs.get("invocation_params") or {}
+        self._start(run_id, "llm", params.get("model") or params.get("model_name") or (serialized or {}).get("name", "llm"))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        params = kwargs.get("invocation_params") or {}
+        self._start(run_id, "llm", params.get("model") or params.get("model_name") or (serialized or {}).get("name", "llm"))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        llm_output = response.llm_output or {}
+        generations = response.generations[0] if response.generations else []
+        generation = generations[0] if generations else None
+        cache_hit = bool(generation is not None and (generation.generation_info or {}).get("cache_hit"))
+        usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+        token_usage = llm_output.get("token_usage") or {}
+        self._end(
+            run_id,
+            # Cache hits are not billed
+            prompt_tokens=0 if cache_hit else usage.get("input_tokens", token_usage.get("prompt_tokens", 0)),
+            completion_tokens=0 if cache_hit else usage.get("output_tokens", token_usage.get("completion_tokens", 0)),
+            cache_hit=cache_hit,
+            retries=llm_output.get("retries", 0),
+            queue_wait_s=llm_output.get("queue_wait_s", 0.0),
+        )
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=str(error)[:200])
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self._start(run_id, "tool", (serialized or {}).get("name") or kwargs.get("name", "tool"))
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=str(error)[:200])
+
+_metrics_handler = MetricsCallbackHandler()
+
+def get_callbacks() -> list:
+    """
+    Callbacks for every chain and agent call: the local metrics handler,
+    plus Langfuse when it is configured.
+    """
+    langfuse_handler = get_langfuse_handler()
+    return [_metrics_handler] + ([langfuse_handler] if langfuse_handler else [])
+
+def print_run_summary(profile: RunProfile):
+    summary = profile.summary()
+    currency = summary["currency"]
+    print(f"\n📈 Run profile ({summary['run']}):")
+    print(f"  {'stage':<16} {'wall':>7} {'calls':>5} {'tok in':>8} {'tok out':>8} {'cached':>6} {'retry':>5} {'queue':>7} {'cost':>10}")
+    for name, stage in list(summary["stages"].items()) + [("total", summary["total"])]:
+        print(f"  {name:<16} {stage['wall_s']:>6.2f}s {stage['calls']:>5} {stage['prompt_tokens']:>8} "
+              f"{stage['completion_tokens']:>8} {stage['cache_hits']:>6} {stage['retries']:>5} "
+              f"{stage['queue_wait_s']:>6.2f}s {stage['cost']:>6.4f} {currency}")
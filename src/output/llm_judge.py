@@ -1,30 +1,16 @@
 # Final JSON aggregation and report generation
-import json
-from langchain_openai import ChatOpenAI
+import inspect
+import time
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from src.observability import get_langfuse_handler
+from src.observability import get_callbacks
 
-from src.config import OPENAI_API_KEY, SILICON_FLOW_BASE_URL
+from src.models import get_chat_model
+from src.output.payload import build_judge_payload
 
-def generate_final_report(
-    #essay_content: str,
-    essay_question: str,
-    rubric_data: dict,
-    logic_data: dict,
-    fact_data: list,
-    language_data: dict,
-    #callbacks=None
-    ):
-
-    callback = get_langfuse_handler()
-
-    llm = ChatOpenAI(
-        model="deepseek-ai/DeepSeek-V3",
-        openai_api_key=OPENAI_API_KEY,
-        openai_api_base=SILICON_FLOW_BASE_URL,
-        temperature=0.2 
-    )
+def _build_grading_chain():
+    # stream_usage: token counts for the streamed report (for the run profile)
+    llm = get_chat_model(temperature=0.2, stream_usage=True)
 
     system_prompt = """
     You are the **Lead Academic Examiner** for an advanced university course.
@@ -43,8 +29,8 @@ def generate_final_report(
     * **Step 2 (Map Evidence to Rubric):**
         * *Task Response:* Use `logic_analysis['relevance']` and `logic_analysis['argument_strength_score']`.
         * *Cohesion/Structure:* Use `logic_analysis['structure']['flow_score']` and `language_analysis['structure']['flow_issues']`.
-        * *Language/Style:* Use `language_analysis['grammar_issues']` count and `language_analysis['vocabulary']['score']`.
-        * *Evidence/Referencing:* Use `fact_checking_output` (look for incorrect citations) and `logic_analysis['identified_fallacies']`.
+        * *Language/Style:* Use `language_analysis['grammar_issue_count']` (broken down in `grammar_issues_by_type`) and `language_analysis['vocabulary']['score']`.
+        * *Evidence/Referencing:* Use `fact_checking_output['verdict_counts']` and its `facts` (look for incorrect citations) and `logic_analysis['identified_fallacies']`.
     * **Step 3 (Select Band):** For each criterion, find the Rubric Level where the `descriptor_points` best match your analysis.
 
     ### 3. OUTPUT RULES
@@ -74,19 +60,118 @@ def generate_final_report(
         """)
     ])
 
-    grading_chain = prompt_template | llm | StrOutputParser()
+    return prompt_template | llm | StrOutputParser()
+
+def _build_grading_inputs(essay_question, rubric_data, logic_data, fact_data, language_data):
+    # Compact JSON without fields the prompt never uses, trimmed to the token budget
+    payload = build_judge_payload(rubric_data, logic_data, fact_data, language_data)
+    print(f"🧮 Judge payload: {payload.pop('payload_tokens')} tokens")
+    return {
+        "essay_question": essay_question,
+        #"essay_content": essay_content,
+        **payload
+    }
+
+def generate_final_report(
+    #essay_content: str,
+    essay_question: str,
+    rubric_data: dict,
+    logic_data: dict,
+    fact_data: list,
+    language_data: dict,
+    #callbacks=None
+    ):
+
+    callbacks = get_callbacks()
+    grading_chain = _build_grading_chain()
 
     try:
-        report = grading_chain.invoke({
-            "essay_question": essay_question,
-            #"essay_content": essay_content,
-            "rubric_json": json.dumps(rubric_data, indent=2),
-            "logic_json": json.dumps(logic_data, indent=2),
-            "fact_json": json.dumps(fact_data, indent=2),
-            "language_json": json.dumps(language_data, indent=2)
-        }, config={"callbacks": [callback],
-                   "metadata": {"langfuse_tags": ["llm_judge"]},
-                   })
+        report = grading_chain.invoke(
+            _build_grading_inputs(essay_question, rubric_data, logic_data, fact_data, language_data),
+            config={"callbacks": callbacks,
+                    "metadata": {"langfuse_tags": ["llm_judge"]},
+                    })
         return report
     except Exception as e:
-        return f"Error generating report: {e}"
\ No newline at end of file
+        return f"Error generating report: {e}"
+
+async def agenerate_final_report(
+    essay_question: str,
+    rubric_data: dict,
+    logic_data: dict,
+    fact_data: list,
+    language_data: dict,
+    ):
+    """
+    Async variant of `generate_final_report`.
+    """
+    callbacks = get_callbacks()
+    grading_chain = _build_grading_chain()
+
+    try:
+        report = await grading_chain.ainvoke(
+            _build_grading_inputs(essay_question, rubric_data, logic_data, fact_data, language_data),
+            config={"callbacks": callbacks,
+                    "metadata": {"langfuse_tags": ["llm_judge"]},
+                    })
+        return report
+    except Exception as e:
+        return f"Error generating report: {e}"
+
+async def astream_final_report(
+    essay_question: str,
+    rubric_data: dict,
+    logic_data: dict,
+    fact_data: list,
+    language_data: dict,
+    report_path,
+    sink=None,
+    ):
+    """
+    Streaming variant of `agenerate_final_report`. The report is written to
+    `report_path` as it is generated (flushed after every chunk) and every
+    chunk is also passed to `sink`, a plain or async function taking the text.
+    Returns (report, timing) with the time to first token, the total time
+    and whether generation failed.
+    """
+    callbacks = get_callbacks()
+    grading_chain = _build_grading_chain()
+    parts = []
+    start = time.perf_counter()
+    first_token_s = None
+    failed = False
+
+    with open(report_path, "w", encoding="utf-8") as f:
+        async def emit(text: str):
+            f.write(text)
+            f.flush()
+            parts.append(text)
+            if sink is not None:
+                result = sink(text)
+                if inspect.isawaitable(result):
+                    await result
+
+        try:
+            async for chunk in grading_chain.astream(
+                _build_grading_inputs(essay_question, rubric_data, logic_data, fact_data, language_data),
+                config={"callbacks": callbacks,
+                        "metadata": {"langfuse_tags": ["llm_judge"]},
+                        }):
+                if not chunk:
+                    continue
+                if first_token_s is None:
+                    first_token_s = time.perf_counter() - start
+                await emit(chunk)
+        except Exception as e:
+            failed = True
+            # Keep whatever was already streamed and append the error
+            separator = "\n\n" if parts else ""
+            await emit(f"{separator}Error generating report: {e}")
+
+    timing = {
+        "ttft_s": round(first_token_s, 3) if first_token_s is not None else None,
+        "total_s": round(time.perf_counter() - start, 3),
+        "chunks": len(parts),
+        "failed": failed,
+    }
+    return "".join(parts), timing
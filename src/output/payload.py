@@ -0,0 +1,150 @@
+# Compact, token-budgeted input for the final report judge
+import json
+from collections import Counter
+from src.config import JUDGE_PAYLOAD_TOKEN_BUDGET, JUDGE_GRAMMAR_EXAMPLES_PER_TYPE
+from src.tokens import count_tokens
+
+# Facts the judge has to comment on come first, so trimming drops correct ones first
+VERDICT_ORDER = {"wrong": 0, "undetermined": 1, "correct": 2}
+
+def dumps_compact(data) -> str:
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+def _truncate(text, max_chars: int):
+    if not isinstance(text, str) or max_chars is None or len(text) <= max_chars:
+        return text
+    return text[:max_chars].rstrip() + "…"
+
+# Shown to the judge for intro / conclusion flags whose section could not be analyzed
+NOT_ASSESSED = "not assessed"
+
+def _compact_structure(structure: dict) -> dict:
+    if not structure:
+        return structure
+    flags = ("has_clear_intro", "has_clear_conclusion")
+    return {key: NOT_ASSESSED if key in flags and value is None else value for key, value in structure.items()}
+
+def compact_logic(logic_data: dict, max_chars: int = None) -> dict:
+    if not logic_data:
+        return logic_data
+    relevance = logic_data.get("relevance", {})
+    return {
+        "relevance": {
+            "is_off_topic": relevance.get("is_off_topic"),
+            "score": relevance.get("score"),
+            "thesis_alignment": _truncate(relevance.get("thesis_alignment"), max_chars),
+            "missing_key_points": relevance.get("missing_key_points", []),
+        },
+        "structure": _compact_structure(logic_data.get("structure")),
+        "identified_fallacies": [
+            {
+                "fallacy_type": fallacy.get("fallacy_type"),
+                "location_snippet": _truncate(fallacy.get("location_snippet"), max_chars),
+                "explanation": _truncate(fallacy.get("explanation"), max_chars),
+            }
+            for fallacy in logic_data.get("identified_fallacies", [])
+        ],
+        "argument_strength_score": logic_data.get("argument_strength_score"),
+        "summary_critique": _truncate(logic_data.get("summary_critique"), max_chars),
+    }
+
+def compact_language(language_data: dict, examples_per_type: int = JUDGE_GRAMMAR_EXAMPLES_PER_TYPE, max_chars: int = None) -> dict:
+    """
+    Grammar issues are counted by `error_type` (most frequent first) with
+    only the first `examples_per_type` examples kept; explanations are dropped.
+    """
+    if not language_data:
+        return language_data
+    issues = language_data.get("grammar_issues", [])
+    counts = Counter(issue.get("error_type", "other") for issue in issues)
+    by_type = []
+    for error_type, count in counts.most_common():
+        examples = [issue for issue in issues if issue.get("error_type", "other") == error_type][:examples_per_type]
+        by_type.append({
+            "error_type": error_type,
+            "count": count,
+            "examples": [
+                {"original_text": _truncate(issue.get("original_text"), max_chars),
+                 "correction": _truncate(issue.get("correction"), max_chars)}
+                for issue in examples
+            ],
+        })
+    vocabulary = language_data.get("vocabulary", {})
+    structure = language_data.get("structure", {})
+    return {
+        "grammar_issue_count": len(issues),
+        "grammar_issues_by_type": by_type,
+        "vocabulary": {
+            "score": vocabulary.get("score"),
+            "repetitive_words": vocabulary.get("repetitive_words", []),
+            "advanced_words_used": vocabulary.get("advanced_words_used", []),
+            "feedback": _truncate(vocabulary.get("feedback"), max_chars),
+        },
+        "structure": {
+            "sentence_variety_score": structure.get("sentence_variety_score"),
+            "flow_issues": [_truncate(issue, max_chars) for issue in structure.get("flow_issues", [])],
+            "feedback": _truncate(structure.get("feedback"), max_chars),
+        },
+        "overall_tone": language_data.get("overall_tone"),
+        "summary_critique": _truncate(language_data.get("summary_critique"), max_chars),
+    }
+
+def compact_facts(fact_data: list, max_facts: int = None, max_chars: int = None) -> dict:
+    """
+    Verdict counts plus the checked facts, wrong and undetermined first.
+    `summary_description` is only kept for facts that are not correct.
+    """
+    if fact_data is None:
+        return None
+    facts = sorted(fact_data, key=lambda fact: VERDICT_ORDER.get(fact.get("correctness_score"), 1))
+    compacted = []
+    for fact in facts[:max_facts]:
+        item = {
+            "statement": _truncate(fact.get("statement"), max_chars),
+            "correctness_score": fact.get("correctness_score"),
+            "source_document": fact.get("source_document", ""),
+            "page_number": fact.get("page_number"),
+        }
+        if fact.get("correctness_score") != "correct":
+            item["summary_description"] = _truncate(fact.get("summary_description"), max_chars)
+        compacted.append(item)
+    return {
+        "verdict_counts": dict(Counter(fact.get("correctness_score") for fact in fact_data)),
+        "facts": compacted,
+        "omitted_facts": len(facts) - len(compacted),
+    }
+
+# Progressively smaller settings, tried in order until the payload fits the budget
+TRIM_STEPS = [
+    {"examples_per_type": JUDGE_GRAMMAR_EXAMPLES_PER_TYPE, "max_chars": None, "max_facts": None},
+    {"examples_per_type": 1, "max_chars": None, "max_facts": None},
+    {"examples_per_type": 1, "max_chars": 300, "max_facts": None},
+    {"examples_per_type": 1, "max_chars": 160, "max_facts": 20},
+    {"examples_per_type": 0, "max_chars": 120, "max_facts": 10},
+    {"examples_per_type": 0, "max_chars": 80, "max_facts": 0},
+]
+
+def build_judge_payload(rubric_data, logic_data, fact_data, language_data, budget: int = JUDGE_PAYLOAD_TOKEN_BUDGET) -> dict:
+    """
+    Serializes the judge inputs compactly, trimming the logic, fact and
+    language reports step by step until they fit within `budget` tokens
+    (the rubric is always kept whole; if even the smallest step is over
+    budget, it is used anyway). Returns the JSON strings keyed by prompt
+    variable, plus "payload_tokens".
+    """
+    rubric_json = dumps_compact(rubric_data)
+    rubric_tokens = count_tokens(rubric_json)
+
+    for step in TRIM_STEPS:
+        payload = {
+            "rubric_json": rubric_json,
+            "logic_json": dumps_compact(compact_logic(logic_data, step["max_chars"])),
+            "fact_json": dumps_compact(compact_facts(fact_data, step["max_facts"], step["max_chars"])),
+            "language_json": dumps_compact(compact_language(language_data, step["examples_per_type"], step["max_chars"])),
+        }
+        tokens = rubric_tokens + sum(count_tokens(payload[key]) for key in ("logic_json", "fact_json", "language_json"))
+        if tokens <= budget:
+            break
+
+    payload["payload_tokens"] = tokens
+    return payload
@@ -0,0 +1,351 @@
+# Service entry point: grades submitted essays over HTTP with warm resources and a bounded job queue
+import argparse
+import asyncio
+import json
+import shutil
+import time
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime
+from pathlib import Path
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+from src.config import (
+    QUESTION_PDF_PATH,
+    RUBRIC_PDF_PATH,
+    SERVICE_OUTPUT_DIR,
+    SERVICE_WORKERS,
+    SERVICE_QUEUE_SIZE,
+    SERVICE_JOB_TTL_S,
+    MAX_CONCURRENT_LLM_REQUESTS,
+    COST_CURRENCY
+)
+from src.limits import configure_request_limiter, get_limiter
+from src.main import PipelinePaths, grade_essay, failed_stages
+from src.ingestion.pdf_loader import start_workers as start_pdf_workers
+from src.agents.tools import warm as warm_knowledge_base
+from src.agents.mcp_tools import get_web_tools, close_web_tools
+from src.llm_cache import llm_cache_stats
+from src.models import pool_stats
+
+# Seconds between checks of a report file that is still being written
+REPORT_POLL_S = 0.2
+
+class Job:
+    """One submitted essay and its grading state (queued, running, done or failed)."""
+
+    def __init__(self, job_id: str, name: str, paths: PipelinePaths):
+        self.id = job_id
+        self.name = name
+        self.paths = paths
+        self.status = "queued"
+        self.submitted_at = datetime.now().isoformat(timespec="seconds")
+        self.started_at = None
+        self.finished_at = None
+        # time.monotonic() when it finished, for expiry
+        self.finished = None
+        self.duration_s = None
+        self.error = None
+        self.cost = None
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "essay": self.name,
+            "status": self.status,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "duration_s": self.duration_s,
+            "error": self.error,
+            "cost": self.cost,
+        }
+
+def _write_uploads(job_dir: Path, essay: bytes, question: bytes = None, rubric: bytes = None) -> tuple:
+    # Returns the (essay, question, rubric) PDF paths, defaults for those not uploaded
+    job_dir.mkdir(parents=True, exist_ok=True)
+    essay_pdf = job_dir / "essay.pdf"
+    essay_pdf.write_bytes(essay)
+    question_pdf, rubric_pdf = QUESTION_PDF_PATH, RUBRIC_PDF_PATH
+    if question is not None:
+        question_pdf = job_dir / "question.pdf"
+        question_pdf.write_bytes(question)
+    if rubric is not None:
+        rubric_pdf = job_dir / "rubric.pdf"
+        rubric_pdf.write_bytes(rubric)
+    return essay_pdf, question_pdf, rubric_pdf
+
+class GradingService:
+    """
+    Grades essays in a pool of `workers` tasks fed by a queue holding at
+    most `queue_size` waiting jobs. Everything runs on one event loop, so
+    the retriever, the pooled LLM clients and the MCP session are set up
+    once and shared by every job. Finished jobs are forgotten `job_ttl_s`
+    seconds after they finish; the metrics keep counting them.
+    """
+
+    def __init__(self, output_dir=SERVICE_OUTPUT_DIR, workers: int = SERVICE_WORKERS,
+                 queue_size: int = SERVICE_QUEUE_SIZE, max_llm_requests: int = MAX_CONCURRENT_LLM_REQUESTS,
+                 job_ttl_s: float = SERVICE_JOB_TTL_S):
+        self.output_dir = Path(output_dir)
+        self.workers = workers
+        self.max_llm_requests = max_llm_requests
+        self.job_ttl_s = job_ttl_s
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.jobs = {}
+        self._reserved = 0
+        # Totals over finished jobs, including expired ones
+        self._finished = {"done": 0, "failed": 0}
+        self._graded_s = 0.0
+        self._cost = 0.0
+        self._tasks = []
+        self._busy = 0
+        # Seconds spent grading by finished jobs, and start times of running ones
+        self._busy_s = 0.0
+        self._running_since = {}
+        self._started = time.perf_counter()
+
+    async def start(self):
+        """Warms the shared resources and starts the workers."""
+        configure_request_limiter(self.max_llm_requests)
+        # Before uvicorn opens its socket, which the forked parsers would otherwise inherit
+        start_pdf_workers()
+        await asyncio.to_thread(warm_knowledge_base)
+        try:
+            await get_web_tools()
+        except Exception as e:
+            # Retried by the first fact check
+            print(f"⚠️ MCP tools unavailable at start-up: {e}")
+        self._started = time.perf_counter()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        print(f"🚀 Grading service ready: {self.workers} workers, queue of {self.queue.maxsize}.")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await close_web_tools()
+
+    async def submit(self, name: str, essay: bytes, question: bytes = None, rubric: bytes = None) -> Job:
+        """
+        Saves the uploaded PDFs and queues the job. Raises asyncio.QueueFull
+        when the queue is full, before anything is written. The default
+        question and rubric are used for the ones not uploaded.
+        """
+        self._expire()
+        # Submissions still writing their files hold a place in the queue
+        if self.queue.qsize() + self._reserved >= self.queue.maxsize > 0:
+            raise asyncio.QueueFull
+        self._reserved += 1
+        job_id = uuid.uuid4().hex[:12]
+        job_dir = self.output_dir / job_id
+        try:
+            essay_pdf, question_pdf, rubric_pdf = await asyncio.to_thread(_write_uploads, job_dir, essay, question, rubric)
+        except BaseException:
+            await asyncio.to_thread(shutil.rmtree, job_dir, ignore_errors=True)
+            raise
+        finally:
+            self._reserved -= 1
+
+        job = Job(job_id, name, PipelinePaths.for_output_dir(essay_pdf, question_pdf, rubric_pdf, job_dir))
+        self.queue.put_nowait(job)
+        self.jobs[job_id] = job
+        return job
+
+    def _expire(self):
+        # Forgets finished jobs past their TTL; their output folders stay on disk
+        cutoff = time.monotonic() - self.job_ttl_s
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.finished is not None and job.finished < cutoff]:
+            del self.jobs[job_id]
+
+    async def _work(self):
+        while True:
+            job = await self.queue.get()
+            try:
+                await self._grade(job)
+            finally:
+                self.queue.task_done()
+
+    async def _grade(self, job: Job):
+        job.status = "running"
+        job.started_at = datetime.now().isoformat(timespec="seconds")
+        start = time.perf_counter()
+        self._busy += 1
+        self._running_since[job.id] = start
+        try:
+            results, timings = await grade_essay(job.paths)
+            job.cost = results["run_profile"].summary()["total"]["cost"]
+            # Includes a report stream that broke off, which leaves a partial report
+            failed = failed_stages(results, timings)
+            if failed:
+                raise RuntimeError(f"stages failed: {', '.join(failed)}")
+            job.status = "done"
+            print(f"✅ Graded {job.name} (job {job.id})")
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            print(f"❌ Error grading {job.name} (job {job.id}): {e}")
+        finally:
+            end = time.perf_counter()
+            job.duration_s = round(end - start, 3)
+            job.finished_at = datetime.now().isoformat(timespec="seconds")
+            job.finished = time.monotonic()
+            # Not when the service is stopped mid-job
+            if job.status in self._finished:
+                self._finished[job.status] += 1
+            if job.status == "done":
+                self._graded_s += job.duration_s
+            self._cost += job.cost or 0.0
+            self._busy -= 1
+            self._busy_s += end - self._running_since.pop(job.id)
+
+    def metrics(self) -> dict:
+        self._expire()
+        now = time.perf_counter()
+        uptime = now - self._started
+        busy_s = self._busy_s + sum(now - start for start in self._running_since.values())
+        statuses = {status: count for status, count in self._finished.items() if count}
+        for job in self.jobs.values():
+            if job.finished is None:
+                statuses[job.status] = statuses.get(job.status, 0) + 1
+        done = self._finished["done"]
+        return {
+            "uptime_s": round(uptime, 3),
+            "queue": {"depth": self.queue.qsize(), "capacity": self.queue.maxsize},
+            "workers": {
+                "total": self.workers,
+                "busy": self._busy,
+                # Share of worker time spent grading since start-up
+                "utilization": round(busy_s / (self.workers * uptime), 3) if uptime > 0 else 0.0,
+            },
+            "jobs": statuses,
+            "mean_grading_s": round(self._graded_s / done, 3) if done else None,
+            "cost": {"total": round(self._cost, 6), "currency": COST_CURRENCY},
+            "llm_limiter": get_limiter().snapshot(),
+            "llm_cache": llm_cache_stats(),
+            "connection_pools": pool_stats()["pools"],
+        }
+
+# --- HTTP API ---
+def _job_or_404(service: GradingService, request: Request):
+    job = service.jobs.get(request.path_params["job_id"])
+    if job is None:
+        return None, JSONResponse({"error": "unknown job"}, status_code=404)
+    return job, None
+
+def _read_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def build_app(service: GradingService) -> Starlette:
+    """
+    Routes:
+      POST /jobs                 multipart form: `essay` PDF, optional `question` and `rubric` PDFs
+      GET  /jobs/{id}            job status
+      GET  /jobs/{id}/result     report and analyses of a finished job
+      GET  /jobs/{id}/report     the report streamed as it is written
+      GET  /metrics              queue depth, worker utilization, LLM limiter and caches
+    """
+
+    async def submit(request: Request):
+        form = await request.form()
+        essay = form.get("essay")
+        if essay is None or not hasattr(essay, "read"):
+            return JSONResponse({"error": "an `essay` PDF file is required"}, status_code=400)
+        uploads = {}
+        for field in ("question", "rubric"):
+            upload = form.get(field)
+            uploads[field] = await upload.read() if hasattr(upload, "read") else None
+        try:
+            job = await service.submit(essay.filename or "essay.pdf", await essay.read(), **uploads)
+        except asyncio.QueueFull:
+            return JSONResponse({"error": "grading queue is full, retry later"}, status_code=503,
+                                headers={"Retry-After": "30"})
+        return JSONResponse({**job.to_dict(), "queue_position": service.queue.qsize()}, status_code=202)
+
+    async def status(request: Request):
+        job, error = _job_or_404(service, request)
+        return error or JSONResponse(job.to_dict())
+
+    async def result(request: Request):
+        job, error = _job_or_404(service, request)
+        if error:
+            return error
+        if job.status != "done":
+            return JSONResponse(job.to_dict(), status_code=409)
+        paths = job.paths
+        report = await asyncio.to_thread(Path(paths.final_report).read_text, encoding="utf-8")
+        outputs = await asyncio.gather(*[
+            asyncio.to_thread(_read_json, path)
+            for path in (paths.rubrics_json, paths.logic_output, paths.language_output, paths.fact_check_output)
+        ])
+        return JSONResponse({
+            **job.to_dict(),
+            "report": report,
+            **dict(zip(("rubrics", "logic", "language", "facts"), outputs)),
+        })
+
+    async def report(request: Request):
+        job, error = _job_or_404(service, request)
+        if error:
+            return error
+        if job.status == "failed":
+            return JSONResponse(job.to_dict(), status_code=409)
+
+        async def chunks():
+            # Follows the report file, which the judge flushes after every chunk
+            report_path = Path(job.paths.final_report)
+            position = 0
+            while True:
+                finished = job.status in ("done", "failed")
+                if report_path.exists():
+                    with open(report_path, "r", encoding="utf-8") as f:
+                        f.seek(position)
+                        text = f.read()
+                        position = f.tell()
+                    if text:
+                        yield text
+                if finished:
+                    return
+                await asyncio.sleep(REPORT_POLL_S)
+
+        return StreamingResponse(chunks(), media_type="text/markdown; charset=utf-8")
+
+    async def metrics(request: Request):
+        return JSONResponse(service.metrics())
+
+    @asynccontextmanager
+    async def lifespan(app):
+        await service.start()
+        try:
+            yield
+        finally:
+            await service.stop()
+
+    return Starlette(routes=[
+        Route("/jobs", submit, methods=["POST"]),
+        Route("/jobs/{job_id}", status, methods=["GET"]),
+        Route("/jobs/{job_id}/result", result, methods=["GET"]),
+        Route("/jobs/{job_id}/report", report, methods=["GET"]),
+        Route("/metrics", metrics, methods=["GET"]),
+    ], lifespan=lifespan)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the essay grading service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=SERVICE_WORKERS, help="Essays graded at the same time")
+    parser.add_argument("--queue-size", type=int, default=SERVICE_QUEUE_SIZE, help="Submissions allowed to wait before new ones are rejected")
+    parser.add_argument("--max-llm-requests", type=int, default=MAX_CONCURRENT_LLM_REQUESTS, help="Global cap on in-flight LLM requests")
+    parser.add_argument("--output-dir", default=SERVICE_OUTPUT_DIR, help="Where per-job folders are written")
+    parser.add_argument("--job-ttl", type=float, default=SERVICE_JOB_TTL_S, help="Seconds a finished job's status stays available")
+    args = parser.parse_args()
+
+    service = GradingService(args.output_dir, args.workers, args.queue_size, args.max_llm_requests, args.job_ttl)
+    uvicorn.run(build_app(service), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# Token counting helpers (tiktoken)
+import re
+from functools import lru_cache
+from typing import List
+import tiktoken
+
+# DeepSeek ships its own tokenizer; cl100k_base is close enough for budgeting
+TOKEN_ENCODING = "cl100k_base"
+# Characters per token of the fallback estimate (as in src/limits.py)
+CHARS_PER_TOKEN = 4
+
+class ApproximateEncoding:
+    """
+    Stand-in for a tiktoken encoding when the real one cannot be loaded:
+    every CHARS_PER_TOKEN characters count as one token, and decoding a
+    slice of the "tokens" gives back that slice of the text.
+    """
+    name = "approximate"
+
+    def encode(self, text: str, disallowed_special=()) -> List[str]:
+        return [text[i:i + CHARS_PER_TOKEN] for i in range(0, len(text), CHARS_PER_TOKEN)]
+
+    def decode(self, tokens: List[str]) -> str:
+        return "".join(tokens)
+
+@lru_cache(maxsize=1)
+def get_encoding():
+    # tiktoken downloads the BPE file on first use (cached in TIKTOKEN_CACHE_DIR),
+    # which fails without network access, e.g. in the offline benchmark
+    try:
+        return tiktoken.get_encoding(TOKEN_ENCODING)
+    except Exception as e:
+        print(f"⚠️ Token encoding {TOKEN_ENCODING} unavailable ({type(e).__name__}), "
+              f"estimating {CHARS_PER_TOKEN} characters per token.")
+        return ApproximateEncoding()
+
+def count_tokens(text: str) -> int:
+    """
+    Returns the approximate number of tokens in `text`.
+    """
+    return len(get_encoding().encode(text, disallowed_special=()))
+
+def split_by_tokens(text: str, max_tokens: int) -> List[str]:
+    """
+    Splits text into pieces of at most `max_tokens`, preferring paragraph
+    and sentence boundaries and only cutting mid-sentence when a single
+    sentence is itself too long.
+    """
+    if count_tokens(text) <= max_tokens:
+        return [text]
+
+    units = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        if count_tokens(paragraph) <= max_tokens:
+            units.append(paragraph)
+            continue
+        for sentence in re.split(r"(?<=[.!?])\s+", paragraph):
+            if count_tokens(sentence) <= max_tokens:
+                units.append(sentence)
+            else:
+                tokens = get_encoding().encode(sentence, disallowed_special=())
+                units.extend(
+                    get_encoding().decode(tokens[i:i + max_tokens])
+                    for i in range(0, len(tokens), max_tokens)
+                )
+
+    pieces, current, current_tokens = [], [], 0
+    for unit in units:
+        unit_tokens = count_tokens(unit)
+        if current and current_tokens + unit_tokens > max_tokens:
+            pieces.append("\n\n".join(current))
+            current, current_tokens = [], 0
+        current.append(unit)
+        current_tokens += unit_tokens
+    if current:
+        pieces.append("\n\n".join(current))
+
+    return [piece for piece in pieces if piece.strip()]
@@ -0,0 +1,4 @@
+# src.config needs an API key at import time; tests never call the real API
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
@@ -0,0 +1,43 @@
+import json
+from types import SimpleNamespace
+from src.config import KB_DENSE_TIMEOUT_S
+from src.database import bm25
+from src.database.bm25 import BM25Index, tokenize
+from src.database.vector_ops import KnowledgeBaseRetriever
+
+def test_numbers_match_with_or_without_thousands_separators():
+    assert tokenize("1,000 troops in 1,250,000") == ["1000", "troops", "in", "1250000"]
+    assert tokenize("grew 3.5 percent") == ["grew", "3.5", "percent"]
+
+    index = BM25Index()
+    index.add(["a", "b"], ["The army had 1,000 troops.", "The navy had 40 ships."])
+    assert [chunk_id for chunk_id, _ in index.search("1000 troops", 1)] == ["a"]
+    # Removing a chunk drops its normalized terms too
+    index.remove(["a"])
+    assert "1000" not in index.postings
+
+def test_index_saved_with_another_tokenizer_is_rebuilt(tmp_path):
+    path = tmp_path / "bm25_index.json"
+    index = BM25Index()
+    index.add(["a"], ["1,000 troops"])
+    index.save(path)
+    assert BM25Index.load(path).ids() == {"a"}
+
+    data = json.loads(path.read_text())
+    data["tokenizer"] = bm25.TOKENIZER_VERSION - 1
+    path.write_text(json.dumps(data))
+    assert BM25Index.load(path) is None
+
+def test_hybrid_search_falls_back_to_bm25_when_the_embedding_call_fails():
+    index = BM25Index()
+    index.add(["a"], ["The army had 1,000 troops."])
+    retriever = KnowledgeBaseRetriever(SimpleNamespace(embeddings=None), index, mode="hybrid", k=1)
+    # Query embeddings give up after the timeout instead of retrying
+    assert retriever.query_embeddings.underlying.request_timeout == KB_DENSE_TIMEOUT_S
+    assert retriever.query_embeddings.underlying.max_retries == 0
+
+    def timed_out(queries):
+        raise TimeoutError("embedding request timed out")
+
+    retriever.query_embeddings = SimpleNamespace(embed_documents=timed_out)
+    assert retriever.search("1000 troops") == ["The army had 1,000 troops."]
@@ -0,0 +1,33 @@
+from src.ingestion.dedup import cluster_facts, deduplicate_facts, fan_out_verdicts
+
+def _facts(*statements):
+    return [{"statement": statement} for statement in statements]
+
+def test_identical_statements_are_grouped():
+    facts = _facts("The Treaty of Versailles was signed in 1919.", "the treaty of versailles was signed in 1919")
+    assert cluster_facts(facts) == [[0, 1]]
+
+def test_negated_statements_are_not_grouped():
+    facts = _facts(
+        "The Treaty of Versailles was signed in 1919 by Germany and the Allies.",
+        "The Treaty of Versailles was not signed in 1919 by Germany and the Allies.",
+        "The Treaty of Versailles wasn't signed in 1919 by Germany and the Allies.",
+    )
+    assert cluster_facts(facts, threshold=0.5) == [[0], [1], [2]]
+
+def test_swapped_subjects_are_not_grouped():
+    facts = _facts("Paris is the capital city of France.", "France is the capital city of Paris.")
+    assert cluster_facts(facts) == [[0], [1]]
+
+def test_different_numbers_are_not_grouped():
+    facts = _facts("The war ended in 1918 after four years.", "The war ended in 1919 after four years.")
+    assert cluster_facts(facts, threshold=0.0) == [[0], [1]]
+
+def test_verdicts_fan_out_to_group_members():
+    facts = _facts("The steam engine spread in 1780.", "The steam engine spread in 1780", "Penicillin was found in 1928.")
+    grouped = deduplicate_facts(facts)
+    assert grouped["removed"] == 1
+    verdicts = [{"correctness_score": "correct"}, {"correctness_score": "wrong"}]
+    results = fan_out_verdicts(facts, grouped["groups"], verdicts)
+    assert [r["correctness_score"] for r in results] == ["correct", "correct", "wrong"]
+    assert results[1]["statement"] == "The steam engine spread in 1780"
@@ -0,0 +1,33 @@
+import multiprocessing
+from src.database.embedding_cache import EmbeddingCache
+
+def _fill(directory, worker):
+    cache = EmbeddingCache(directory, 500)
+    for batch in range(10):
+        cache.put_many({f"{worker}-{batch}-{i}": [float(worker * 1000 + batch * 100 + i)] * 4 for i in range(20)})
+
+def test_processes_sharing_the_cache_get_distinct_rows(tmp_path):
+    processes = [multiprocessing.Process(target=_fill, args=(tmp_path, worker)) for worker in range(3)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    cache = EmbeddingCache(tmp_path, 500)
+    rows = cache._conn.execute("SELECT key, row FROM vectors").fetchall()
+    assert len({row for _, row in rows}) == len(rows)
+    for key, row in rows:
+        worker, batch, i = map(int, key.split("-"))
+        assert cache._vectors[row][0] == worker * 1000 + batch * 100 + i
+
+def test_mismatched_vector_file_resets_the_cache(tmp_path):
+    cache = EmbeddingCache(tmp_path, 100)
+    cache.put_many({"a": [1.0, 2.0]})
+    cache._vectors.flush()
+    with open(tmp_path / "vectors.f32", "ab") as f:
+        f.write(b"\0" * 3)
+
+    reopened = EmbeddingCache(tmp_path, 100)
+    assert reopened.get_many(["a"]) == {}
+    reopened.put_many({"b": [3.0, 4.0, 5.0]})
+    assert reopened.get_many(["b"]) == {"b": [3.0, 4.0, 5.0]}
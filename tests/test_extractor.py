@@ -0,0 +1,32 @@
+import asyncio
+from langchain_core.documents import Document
+from src import main
+from src.ingestion import extractor
+from src.ingestion.extractor import FactExtraction, aextract_facts_from_docs
+
+class _Chain:
+    async def ainvoke(self, inputs, config=None):
+        if "fails" in inputs["text"]:
+            raise RuntimeError("provider down")
+        return FactExtraction(facts=[])
+
+def _packs(docs):
+    return [Document(page_content=doc.page_content, metadata={"pages": [i + 1]}) for i, doc in enumerate(docs)]
+
+def test_failed_packs_are_counted(monkeypatch):
+    monkeypatch.setattr(extractor, "_build_extraction_chain", _Chain)
+    monkeypatch.setattr(extractor, "pack_pages", _packs)
+    docs = [Document(page_content=text) for text in ("works", "fails", "fails too")]
+
+    stats = {}
+    assert asyncio.run(aextract_facts_from_docs(docs, callbacks=[], stats=stats)) == []
+    assert stats == {"failed_packs": 2}
+
+def test_fact_stage_with_failed_packs_is_not_checkpointed(monkeypatch, tmp_path):
+    monkeypatch.setattr(extractor, "_build_extraction_chain", _Chain)
+    monkeypatch.setattr(extractor, "pack_pages", _packs)
+    paths = main.PipelinePaths.for_output_dir("e.pdf", "q.pdf", "r.pdf", tmp_path)
+
+    result = asyncio.run(main._extract_facts(paths, [Document(page_content="fails")]))
+    assert result.value == []
+    assert result.metrics == {"failed": True, "failed_packs": 1}
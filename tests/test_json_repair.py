@@ -0,0 +1,30 @@
+from src.agents.json_repair import repair_json
+
+def test_valid_json_is_returned_unchanged():
+    assert repair_json('{"statement": "None of the True believers left", "correct": true}') == {
+        "statement": "None of the True believers left", "correct": True,
+    }
+
+def test_python_literals_in_values_are_kept():
+    text = '{"statement": "None of the True believers left, False!", "verified": True, "source": None,}'
+    assert repair_json(text) == {
+        "statement": "None of the True believers left, False!", "verified": True, "source": None,
+    }
+
+def test_trailing_comma_inside_a_value_is_kept():
+    assert repair_json('{"quote": "a, ]", "pages": [1, 2,],}') == {"quote": "a, ]", "pages": [1, 2]}
+
+def test_smart_quotes_inside_values_are_kept():
+    text = '```json\n{"statement": "He called it “the end” of an era", "score": "wrong",}\n```'
+    assert repair_json(text) == {"statement": "He called it “the end” of an era", "score": "wrong"}
+
+def test_smart_quoted_strings_are_repaired():
+    text = 'Here you go: {“statement”: “The treaty said "no"”, “verified”: False}'
+    assert repair_json(text) == {"statement": 'The treaty said "no"', "verified": False}
+
+def test_python_style_dict():
+    text = "{'statement': 'None of it was True', 'verified': None, 'note': 'it\\'s fine'}"
+    assert repair_json(text) == {"statement": "None of it was True", "verified": None, "note": "it's fine"}
+
+def test_unparseable_text():
+    assert repair_json("no json here") is None
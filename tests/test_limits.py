@@ -0,0 +1,104 @@
+import asyncio
+import httpx
+import openai
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_openai import ChatOpenAI
+from src import limits
+from src.limits import LimitedChatOpenAI, ProviderLimiter
+
+def test_cancelled_requests_release_their_slots(monkeypatch):
+    limiter = ProviderLimiter(rpm=1000, tpm=10_000_000, ceiling=3, initial=3)
+    monkeypatch.setitem(limits._limiters, "siliconflow", limiter)
+
+    async def never_answers(self, messages, *args, **kwargs):
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(ChatOpenAI, "_agenerate", never_answers)
+    model = LimitedChatOpenAI(model="test", api_key="test")
+
+    async def run():
+        calls = [asyncio.create_task(model.ainvoke([HumanMessage("hi")])) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        assert limiter.snapshot()["in_flight"] == 3
+        for call in calls:
+            call.cancel()
+        await asyncio.gather(*calls, return_exceptions=True)
+        assert limiter.snapshot()["in_flight"] == 0
+        # A new request gets a slot straight away
+        await asyncio.wait_for(limiter.aacquire(), timeout=1)
+
+    asyncio.run(run())
+
+def test_concurrency_grows_to_the_ceiling_and_halves_on_throttle():
+    limiter = ProviderLimiter(rpm=1000, tpm=10_000_000, ceiling=3, initial=1)
+    for _ in range(10):
+        limiter.acquire()
+        limiter.release()
+    assert limiter.max_in_flight == 3
+
+    limiter.acquire()
+    limiter.release(success=False, throttled=True)
+    assert limiter.max_in_flight == 1
+    limiter.acquire()
+    limiter.release(success=False, throttled=True)
+    assert limiter.max_in_flight == 1
+
+def test_request_bucket_caps_requests_per_minute():
+    limiter = ProviderLimiter(rpm=2, tpm=10_000_000, ceiling=3, initial=3)
+    assert limiter._rate_wait(0) == 0
+    assert limiter._rate_wait(0) == 0
+    # The third request waits for a refill of about 60 / rpm seconds
+    assert 25 < limiter._rate_wait(0) <= 30
+
+def test_token_bucket_caps_tokens_per_minute():
+    limiter = ProviderLimiter(rpm=1000, tpm=100, ceiling=3, initial=3)
+    assert limiter._rate_wait(60) == 0
+    assert limiter._rate_wait(60) > 0
+    # Actual usage below the estimate gives the budget back
+    limiter.record_usage(estimated=60, actual=10)
+    assert limiter._rate_wait(60) == 0
+
+def _failing_then_answering(monkeypatch, error):
+    calls = []
+
+    async def generate(self, messages, *args, **kwargs):
+        calls.append(1)
+        if len(calls) == 1:
+            raise error
+        return ChatResult(generations=[ChatGeneration(message=AIMessage("ok"))])
+
+    monkeypatch.setattr(ChatOpenAI, "_agenerate", generate)
+    return calls
+
+def _server_error(status: int):
+    response = httpx.Response(status, request=httpx.Request("POST", "http://test"))
+    return openai.InternalServerError("server error", response=response, body=None)
+
+def test_transient_errors_are_retried_without_shrinking_concurrency(monkeypatch):
+    limiter = ProviderLimiter(rpm=1000, tpm=10_000_000, ceiling=4, initial=4)
+    monkeypatch.setitem(limits._limiters, "siliconflow", limiter)
+    pauses = []
+    monkeypatch.setattr(limiter, "backoff", lambda attempt, error=None, pause=True: pauses.append(pause) or 0)
+    model = LimitedChatOpenAI(model="test", api_key="test")
+
+    for error in (_server_error(502), openai.APIConnectionError(request=httpx.Request("POST", "http://test"))):
+        calls = _failing_then_answering(monkeypatch, error)
+        assert asyncio.run(model.ainvoke([HumanMessage("hi")])).content == "ok"
+        assert len(calls) == 2
+    assert pauses == [False, False]
+    assert limiter.max_in_flight == 4
+
+def test_throttles_are_retried_with_a_smaller_limit(monkeypatch):
+    limiter = ProviderLimiter(rpm=1000, tpm=10_000_000, ceiling=4, initial=4)
+    monkeypatch.setitem(limits._limiters, "siliconflow", limiter)
+    pauses = []
+    monkeypatch.setattr(limiter, "backoff", lambda attempt, error=None, pause=True: pauses.append(pause) or 0)
+    response = httpx.Response(429, request=httpx.Request("POST", "http://test"))
+    calls = _failing_then_answering(monkeypatch, openai.RateLimitError("slow down", response=response, body=None))
+
+    model = LimitedChatOpenAI(model="test", api_key="test")
+    assert asyncio.run(model.ainvoke([HumanMessage("hi")])).content == "ok"
+    assert len(calls) == 2
+    assert pauses == [True]
+    assert limiter.max_in_flight == 2
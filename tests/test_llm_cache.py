@@ -0,0 +1,41 @@
+import asyncio
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_openai import ChatOpenAI
+from pydantic import BaseModel
+from src import llm_cache
+from src.limits import LimitedChatOpenAI
+from src.llm_cache import SQLiteLRUCache
+
+class Verdict(BaseModel):
+    score: int
+
+def _model(monkeypatch, tmp_path, content: str):
+    cache = SQLiteLRUCache(tmp_path / "llm_cache.sqlite3", 1 << 20)
+    monkeypatch.setattr(llm_cache, "_cache", cache)
+
+    async def generate(self, messages, *args, **kwargs):
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content))])
+
+    monkeypatch.setattr(ChatOpenAI, "_agenerate", generate)
+    return cache, LimitedChatOpenAI(model="test", api_key="test", cache=cache)
+
+def test_rejected_structured_output_is_not_kept(monkeypatch, tmp_path):
+    cache, model = _model(monkeypatch, tmp_path, "not json")
+    structured = model.with_structured_output(Verdict, method="json_mode")
+    with pytest.raises(Exception):
+        asyncio.run(structured.ainvoke([HumanMessage("grade")]))
+    assert cache.stats()["entries"] == 0
+
+    raw = model.with_structured_output(Verdict, method="json_mode", include_raw=True)
+    assert asyncio.run(raw.ainvoke([HumanMessage("grade")]))["parsing_error"] is not None
+    assert cache.stats()["entries"] == 0
+
+def test_parsed_structured_output_is_cached(monkeypatch, tmp_path):
+    cache, model = _model(monkeypatch, tmp_path, '{"score": 7}')
+    structured = model.with_structured_output(Verdict, method="json_mode")
+    assert asyncio.run(structured.ainvoke([HumanMessage("grade")])) == Verdict(score=7)
+    assert structured.invoke([HumanMessage("grade")]) == Verdict(score=7)
+    stats = cache.stats()
+    assert (stats["entries"], stats["hits"]) == (1, 1)
@@ -0,0 +1,39 @@
+from src.evaluators.logic import LogicAnalysisResult, _merge_logic
+from src.evaluators import sections
+from src.evaluators.sections import successful_sections
+from src.output.payload import compact_logic
+
+def _section(intro: bool, conclusion: bool) -> dict:
+    return {
+        "relevance": {"is_off_topic": False, "score": 7, "thesis_alignment": "ok", "missing_key_points": []},
+        "structure": {"has_clear_intro": intro, "has_clear_conclusion": conclusion, "flow_score": 6, "structural_weaknesses": []},
+        "identified_fallacies": [],
+        "argument_strength_score": 6,
+        "summary_critique": "fine",
+    }
+
+def test_intro_and_conclusion_come_from_the_first_and_last_sections():
+    merged = _merge_logic([_section(True, False), _section(False, True)], [1, 1], [0, 2], 3, None)
+    assert merged["structure"]["has_clear_intro"] is True
+    assert merged["structure"]["has_clear_conclusion"] is True
+
+def test_failed_first_or_last_section_leaves_the_flag_unknown():
+    merged = _merge_logic([_section(True, True)], [1], [1], 3, None)
+    assert merged["structure"]["has_clear_intro"] is None
+    assert merged["structure"]["has_clear_conclusion"] is None
+    # Still the schema the judge payload is built from
+    LogicAnalysisResult.model_validate(merged)
+    structure = compact_logic(merged)["structure"]
+    assert structure["has_clear_intro"] == structure["has_clear_conclusion"] == "not assessed"
+
+def test_failed_sections_are_counted(monkeypatch):
+    monkeypatch.setattr(sections, "count_tokens", lambda text: len(text.split()))
+
+    class Result:
+        def model_dump(self):
+            return {}
+
+    stats = {}
+    results, _, indices = successful_sections(["a b", "c", "d e f"], [Result(), RuntimeError("x"), Result()], "logic analysis", stats)
+    assert indices == [0, 2]
+    assert stats == {"failed_sections": 1}
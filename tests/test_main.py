@@ -0,0 +1,26 @@
+import asyncio
+from types import SimpleNamespace
+from src import main
+from src.main import PIPELINE_STAGES, failed_stages
+
+def _run(**overrides):
+    results = {stage.name: {} for stage in PIPELINE_STAGES}
+    results.update(overrides)
+    return results, [{"stage": stage.name} for stage in PIPELINE_STAGES]
+
+def test_complete_run_has_no_failed_stages():
+    assert failed_stages(*_run()) == []
+
+def test_stages_returning_none_or_flagged_failed_are_reported():
+    results, timings = _run(logic_data=None, language_data=None)
+    next(t for t in timings if t["stage"] == "verified_facts")["failed"] = True
+    assert failed_stages(results, timings) == ["logic_data", "language_data", "verified_facts"]
+
+def test_report_without_a_first_token_time_is_printed_without_one(monkeypatch, capsys):
+    async def stream(**kwargs):
+        return "report", {"ttft_s": None}
+
+    monkeypatch.setattr(main, "astream_final_report", stream)
+    result = asyncio.run(main._synthesize_report(SimpleNamespace(final_report=None), "", {}, {}, [], {}))
+    assert result.value == "report"
+    assert "✅ Final Report Synthesized Successfully." in capsys.readouterr().out
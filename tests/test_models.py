@@ -0,0 +1,30 @@
+import asyncio
+import gc
+from langchain_core.caches import InMemoryCache
+from src import llm_cache, models
+from src.models import get_chat_model
+
+def test_models_are_shared_per_loop_and_dropped_with_it():
+    async def two_calls():
+        return get_chat_model(temperature=0), get_chat_model(temperature=0)
+
+    first, same = asyncio.run(two_calls())
+    assert first is same
+    second, _ = asyncio.run(two_calls())
+    assert second is not first
+
+    asyncio.run(asyncio.sleep(0))
+    gc.collect()
+    # Only the loop that is running now is registered
+    async def registered():
+        get_chat_model(temperature=0)
+        return len(models._per_loop)
+
+    assert asyncio.run(registered()) == 1
+
+def test_only_deterministic_models_use_the_cache(monkeypatch):
+    cache = InMemoryCache()
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_ENABLED", True)
+    monkeypatch.setattr(llm_cache, "_cache", cache)
+    assert get_chat_model(temperature=0, max_tokens=11).cache is cache
+    assert get_chat_model(temperature=0.2, max_tokens=11).cache is False
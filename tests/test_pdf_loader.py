@@ -0,0 +1,28 @@
+import os
+from src.ingestion import pdf_loader
+
+def test_memory_cache_keeps_only_recent_pdfs(tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf_loader, "PDF_CACHE_DIR", tmp_path)
+    monkeypatch.setattr(pdf_loader, "PDF_MEMORY_CACHE_ENTRIES", 2)
+    monkeypatch.setattr(pdf_loader, "_pages", pdf_loader.OrderedDict())
+    for digest in ("a", "b"):
+        pdf_loader._save_cached(digest, [(digest, {})])
+    pdf_loader._load_cached("a")
+    pdf_loader._save_cached("c", [("c", {})])
+
+    assert list(pdf_loader._pages) == ["a", "c"]
+    # Still on disk
+    assert pdf_loader._load_cached("b") == [("b", {})]
+
+def test_disk_cache_drops_least_recently_used_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf_loader, "PDF_CACHE_DIR", tmp_path)
+    monkeypatch.setattr(pdf_loader, "PDF_CACHE_MAX_MB", 1)
+    monkeypatch.setattr(pdf_loader, "_pages", pdf_loader.OrderedDict())
+    page = [("x" * 400_000, {})]
+    for age, digest in enumerate(("old", "used", "new")):
+        pdf_loader._save_cached(digest, page)
+        os.utime(tmp_path / f"pdf_{digest}.json", (age, age))
+    os.utime(tmp_path / "pdf_used.json")
+    pdf_loader._save_cached("newest", page)
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["pdf_newest.json", "pdf_used.json"]
@@ -0,0 +1,69 @@
+import asyncio
+import pytest
+from src import service as service_module
+from src.main import PIPELINE_STAGES
+from src.service import GradingService
+
+def test_full_queue_rejects_before_writing(tmp_path):
+    async def run():
+        service = GradingService(tmp_path, workers=1, queue_size=1)
+        await service.submit("a.pdf", b"%PDF")
+        with pytest.raises(asyncio.QueueFull):
+            await service.submit("b.pdf", b"%PDF")
+        return service
+
+    service = asyncio.run(run())
+    assert len(list(tmp_path.iterdir())) == 1
+    assert len(service.jobs) == 1
+
+def test_concurrent_submissions_cannot_overfill_the_queue(tmp_path):
+    async def run():
+        service = GradingService(tmp_path, workers=1, queue_size=2)
+        outcomes = await asyncio.gather(*[service.submit(f"{i}.pdf", b"%PDF") for i in range(4)], return_exceptions=True)
+        return service, outcomes
+
+    service, outcomes = asyncio.run(run())
+    assert sum(isinstance(outcome, asyncio.QueueFull) for outcome in outcomes) == 2
+    assert service.queue.qsize() == 2
+    assert len(list(tmp_path.iterdir())) == 2
+
+class _Profile:
+    def summary(self):
+        return {"total": {"cost": 0.5}}
+
+def _fake_grade_essay(**overrides):
+    async def grade_essay(paths):
+        results = {stage.name: {} for stage in PIPELINE_STAGES}
+        results.update(overrides, run_profile=_Profile())
+        return results, [{"stage": stage.name} for stage in PIPELINE_STAGES]
+    return grade_essay
+
+def test_finished_jobs_expire_but_stay_in_metrics(tmp_path, monkeypatch):
+    monkeypatch.setattr(service_module, "grade_essay", _fake_grade_essay())
+
+    async def run():
+        service = GradingService(tmp_path, workers=1, queue_size=5, job_ttl_s=60)
+        old, recent = await service.submit("a.pdf", b"%PDF"), await service.submit("b.pdf", b"%PDF")
+        for _ in range(2):
+            await service._grade(service.queue.get_nowait())
+        old.finished -= 120
+        return service, recent
+
+    service, recent = asyncio.run(run())
+    metrics = service.metrics()
+    assert list(service.jobs) == [recent.id]
+    assert metrics["jobs"] == {"done": 2}
+    assert metrics["cost"]["total"] == 1.0
+
+def test_job_with_a_failed_stage_is_failed(tmp_path, monkeypatch):
+    monkeypatch.setattr(service_module, "grade_essay", _fake_grade_essay(language_data=None))
+
+    async def run():
+        service = GradingService(tmp_path, workers=1, queue_size=5)
+        job = await service.submit("a.pdf", b"%PDF")
+        await service._grade(service.queue.get_nowait())
+        return job
+
+    job = asyncio.run(run())
+    assert job.status == "failed"
+    assert job.error == "stages failed: language_data"
@@ -0,0 +1,18 @@
+import tiktoken
+from src import tokens
+
+def test_falls_back_to_a_character_estimate_without_the_encoding(monkeypatch):
+    def unavailable(name):
+        raise ConnectionError("offline")
+
+    monkeypatch.setattr(tiktoken, "get_encoding", unavailable)
+    tokens.get_encoding.cache_clear()
+    try:
+        assert tokens.get_encoding().name == "approximate"
+        assert tokens.count_tokens("x" * 10) == 3
+        text = "First sentence here. " * 20
+        pieces = tokens.split_by_tokens(text, 30)
+        assert len(pieces) > 1
+        assert "".join(pieces).count("First sentence here.") == 20
+    finally:
+        tokens.get_encoding.cache_clear()